@@ -13,3 +13,6 @@ sys.path.insert( 0, path )
 from c_cost_funcs import applySphereCost
 from c_cost_funcs import applyRadiusCost
 from c_cost_funcs import applyCircleCost
+from c_cost_funcs import applyCircleCostBatch
+from c_cost_funcs import applyExtractionCost
+from c_cost_funcs import applySkeletonCost
@@ -37,6 +37,7 @@ def getLib( path ):
         
 import os
 import lib_path
+import c_progress
 __run_lib_path = lib_path.lib_folder
 __run_lib_name = __run_lib_path +"/" +lib_name 
 try:
@@ -52,7 +53,7 @@ except:
         raise( RuntimeError( "Cannot load or compile {0}".format( lib_name ) ) )
 
 
-def applySphereCost( inp_arr, min_occ, min_sphere_occ, max_sphere_r, dim_facs, num_threads = 4 ):
+def applySphereCost( inp_arr, min_occ, min_sphere_occ, max_sphere_r, dim_facs, num_threads = 0, method="sphere" ):
     """
     Given a 3D volume returns the estimated radius by fitting growing spheres at each position
 
@@ -61,13 +62,19 @@ def applySphereCost( inp_arr, min_occ, min_sphere_occ, max_sphere_r, dim_facs, n
     :param min_sphere_occ: Float, minimum percent of sphere occupied to count
     :param max_sphere_r: Int, largest sphere tested
     :param dim_facs: 3-tuple, ratio of voxel edge length
-    :param num_threads: Int, max number of threads used
+    :param num_threads: Int, max number of threads used, 0 uses all cores
+    :param method: String, "sphere" grows spheres from radius 1,
+                   "edt" takes radii up to the distance to the background from a euclidean distance transform
+                   and only grows larger spheres. Same result, fully occupied spheres (min_sphere_occ=1.0) need no fitting
     :return: np.array, Estimated radius per voxel
     """
+    methods = { "sphere": __cost_run_lib.applySphereCost, "edt": __cost_run_lib.applyDistanceCost }
+    if method not in methods:
+        raise( RuntimeError( "Unknown sphere cost method {0}, use one of {1}".format( method, list( methods ) ) ) )
     out_arr = np.ones( inp_arr.shape, dtype=np.float32 )
     print( inp_arr.max() )
     inp_arr = inp_arr.astype( np.float32 ) /inp_arr.max()
-    __cost_run_lib.applySphereCost( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+    methods[method]( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                out_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                ctypes.c_int( inp_arr.shape[2] ),
                                ctypes.c_int( inp_arr.shape[1] ),
@@ -76,8 +83,10 @@ def applySphereCost( inp_arr, min_occ, min_sphere_occ, max_sphere_r, dim_facs, n
                                ctypes.c_double( min_sphere_occ ),
                                ctypes.c_int( max_sphere_r ),
                                dim_facs.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                               ctypes.c_int( num_threads )
+                               ctypes.c_int( num_threads ),
+                               c_progress.getHandle()
                               )
+    c_progress.checkCancelled()
     return out_arr
 
 
@@ -93,26 +102,43 @@ def applyCircleCost( inp_arr, min_occ, min_sphere_occ, max_sphere_r, dim_facs ):
     :param dim_facs: 3-tuple, ratio of voxel edge length
     :return: np.array, Map of largest fitted circle radius per voxel
     """
+    return applyCircleCostBatch( inp_arr[np.newaxis], min_occ, min_sphere_occ, max_sphere_r, dim_facs )[0]
+
+
+def applyCircleCostBatch( inp_arr, min_occ, min_sphere_occ, max_sphere_r, dim_facs, num_threads = 0 ):
+    """
+    Fits circles in a stack of 2D slices in one call, every slice on its own
+
+    :param inp_arr: np.array, 3D Volume, slices along the first axis
+    :param min_occ: Float, minimum intensity to count voxel as occupied, relative to the maximum of its slice
+    :param min_sphere_occ: Float, minimum percent of sphere occupied to count
+    :param max_sphere_r: Int, largest sphere tested
+    :param dim_facs: 3-tuple, ratio of voxel edge length
+    :param num_threads: Int, max number of threads used, 0 uses all cores
+    :return: np.array, Map of largest fitted circle radius per voxel and slice
+    """
     out_arr = np.ones( inp_arr.shape, dtype=np.float32 )
-    inp_arr = inp_arr.astype( np.float32 ) /inp_arr.max()
-    print(inp_arr.shape)
-    #print(inp_arr.max())
+    # Each slice is normalized on its own, as fitting the slices one by one does. Empty slices stay zero
+    slice_max = inp_arr.max( axis=(1,2), keepdims=True ).astype( np.float32 )
+    inp_arr = np.ascontiguousarray( inp_arr.astype( np.float32 ) /np.where( slice_max > 0, slice_max, 1.0 ) )
     __cost_run_lib.applyCircleCost( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                out_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               ctypes.c_int( inp_arr.shape[2] ),
                                ctypes.c_int( inp_arr.shape[1] ),
                                ctypes.c_int( inp_arr.shape[0] ),
-                               ctypes.c_int( 1 ),
                                ctypes.c_double( min_occ ),
                                ctypes.c_double( min_sphere_occ ),
                                ctypes.c_int( max_sphere_r ),
                                dim_facs.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                               ctypes.c_int( 1 )
+                               ctypes.c_int( num_threads ),
+                               c_progress.getHandle()
                               )
+    c_progress.checkCancelled()
     return out_arr
 
 
 
-def applyRadiusCost( inp_arr, mask_size, num_threads = 4 ):
+def applyRadiusCost( inp_arr, mask_size, num_threads = 0 ):
     """
     Given a 3D radius map, compute the relative radius at each position.
     1.0 if highest radius in mask area.
@@ -120,7 +146,7 @@ def applyRadiusCost( inp_arr, mask_size, num_threads = 4 ):
 
     :param inp_arr: np.array, 3D radius map
     :param mask_size: Int, amount of voxel per side and dimension to compare to
-    :param num_threads: Int, max number of threads used
+    :param num_threads: Int, max number of threads used, 0 uses all cores
     :return: np.array, Comparative normalized radius cost
     """
     out_arr = np.zeros( inp_arr.shape, dtype=np.float32 )
@@ -131,7 +157,73 @@ def applyRadiusCost( inp_arr, mask_size, num_threads = 4 ):
                                ctypes.c_int( inp_arr.shape[1] ),
                                ctypes.c_int( inp_arr.shape[0] ),
                                ctypes.c_int( mask_size ),
-                               ctypes.c_int( num_threads )
+                               ctypes.c_int( num_threads ),
+                               c_progress.getHandle()
+                              )
+    c_progress.checkCancelled()
+    return out_arr
+
+
+
+def applyExtractionCost( inp_arr, rad_arr, rad_weight, offset, gap_threshold=0.0, num_threads = 0 ):
+    """
+    Path cost of the volume extraction in one pass, inputs stay unchanged.
+    Normalized input plus weighted normalized radius, inverted, offset and normalized to a maximum of 1.
+
+    :param inp_arr: np.array, 3D Volume
+    :param rad_arr: np.array, 3D radius map
+    :param rad_weight: Float, weight of the radius against the intensity
+    :param offset: Float, added to all costs before normalization
+    :param gap_threshold: Float, costs not below are multiplied by 10, 0 disables
+    :param num_threads: Int, max number of threads used, 0 uses all cores
+    :return: np.array, float32 cost map
+    """
+    inp_arr = np.ascontiguousarray( inp_arr, dtype=np.float32 )
+    rad_arr = np.ascontiguousarray( rad_arr, dtype=np.float32 )
+    out_arr = np.empty( inp_arr.shape, dtype=np.float32 )
+    __cost_run_lib.applyExtractionCost( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               rad_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               out_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               ctypes.c_int( inp_arr.shape[2] ),
+                               ctypes.c_int( inp_arr.shape[1] ),
+                               ctypes.c_int( inp_arr.shape[0] ),
+                               ctypes.c_float( rad_weight ),
+                               ctypes.c_float( offset ),
+                               ctypes.c_float( gap_threshold ),
+                               ctypes.c_int( num_threads ),
+                               c_progress.getHandle()
                               )
+    c_progress.checkCancelled()
     return out_arr
 
+
+def applySkeletonCost( inp_arr, rad_arr, min_int, int_bonus, cutoff, num_threads = 0 ):
+    """
+    Path cost of the skeletonization in one pass.
+    Radius plus a bonus where the intensity exceeds min_int, normalized, inverted, cutoff added where not positive.
+
+    :param inp_arr: np.array, 3D Volume
+    :param rad_arr: np.array, 3D relative radius map
+    :param min_int: Float, minimum intensity to get the bonus
+    :param int_bonus: Float, added to the radius of voxels above min_int
+    :param cutoff: Float, added to the cost of voxels without radius or bonus
+    :param num_threads: Int, max number of threads used, 0 uses all cores
+    :return: np.array, float32 cost map
+    """
+    inp_arr = np.ascontiguousarray( inp_arr, dtype=np.float32 )
+    rad_arr = np.ascontiguousarray( rad_arr, dtype=np.float32 )
+    out_arr = np.empty( inp_arr.shape, dtype=np.float32 )
+    __cost_run_lib.applySkeletonCost( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               rad_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               out_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                               ctypes.c_int( inp_arr.shape[2] ),
+                               ctypes.c_int( inp_arr.shape[1] ),
+                               ctypes.c_int( inp_arr.shape[0] ),
+                               ctypes.c_double( min_int ),
+                               ctypes.c_double( int_bonus ),
+                               ctypes.c_double( cutoff ),
+                               ctypes.c_int( num_threads ),
+                               c_progress.getHandle()
+                              )
+    c_progress.checkCancelled()
+    return out_arr
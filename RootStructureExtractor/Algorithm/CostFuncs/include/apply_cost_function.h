@@ -8,87 +8,202 @@
 
 #include "utils.h"
 #include "volume.h"
-#include <thread>
+#include "progress.h"
+#include "tile_scheduler.h"
+#include "sphere_mask.h"
+#include "distance_transform.h"
+
+/**
+ * Bounding box per z slice of the voxels a kernel has to evaluate.
+ * The remaining voxels have a known result, which is written in bulk.
+ */
+class SliceBoxes
+{
+public:
+  struct Box
+  {
+    int x_min, x_max, y_min, y_max; // Max exclusive
+  };
+
+  SliceBoxes() = default;
+
+  /// Boxes of the voxels fulfilling is_candidate, grown by extent voxels per axis
+  template<class _Pred>
+  SliceBoxes( const Volume& vol, const utils::Coordinate& extent, _Pred is_candidate )
+  {
+    const utils::Coordinate& shape = vol.getShape();
+    std::vector<Box> raw( shape[2], Box{ shape[0], 0, shape[1], 0 } );
+    for( int z=0; z < shape[2] ; ++z )
+    {
+      Box& box = raw[z];
+      const float* data = &vol( 0,0,z );
+      for( int y=0; y < shape[1] ; ++y, data += shape[0] )
+        for( int x=0; x < shape[0] ; ++x )
+          if( is_candidate( data[x] ) )
+          {
+            box.x_min = std::min( box.x_min, x ); box.x_max = std::max( box.x_max, x+1 );
+            box.y_min = std::min( box.y_min, y ); box.y_max = std::max( box.y_max, y+1 );
+          }
+    }
+    m_boxes.assign( shape[2], Box{ shape[0], 0, shape[1], 0 } );
+    for( int z=0; z < shape[2] ; ++z )
+    {
+      Box& box = m_boxes[z];
+      for( int z_it=std::max( 0, z -extent[2] ); z_it < std::min( shape[2], z +extent[2] +1 ) ; ++z_it )
+      {
+        if( raw[z_it].x_min >= raw[z_it].x_max )
+          continue;
+        box.x_min = std::min( box.x_min, std::max( 0, raw[z_it].x_min -extent[0] ) );
+        box.x_max = std::max( box.x_max, std::min( shape[0], raw[z_it].x_max +extent[0] ) );
+        box.y_min = std::min( box.y_min, std::max( 0, raw[z_it].y_min -extent[1] ) );
+        box.y_max = std::max( box.y_max, std::min( shape[1], raw[z_it].y_max +extent[1] ) );
+      }
+      if( box.x_min >= box.x_max || box.y_min >= box.y_max )
+        box = Box{ 0, 0, 0, 0 };
+    }
+  }
+
+  inline const Box& operator[]( const int z ) const { return m_boxes[z]; }
+
+  /// Box of slice z within the tile, empty boxes are all zero
+  inline Box clip( const int z, const utils::Tile& tile ) const
+  {
+    const Box& box = m_boxes[z];
+    const Box clipped{ std::max( box.x_min, tile.mins[0] ), std::min( box.x_max, tile.maxs[0] ),
+                       std::max( box.y_min, tile.mins[1] ), std::min( box.y_max, tile.maxs[1] ) };
+    if( clipped.x_min >= clipped.x_max || clipped.y_min >= clipped.y_max )
+      return Box{ 0, 0, 0, 0 };
+    return clipped;
+  }
+
+  /// Writes val to the voxels of the tile outside the boxes of their slices
+  inline void fillOutside( Volume& vol, const utils::Tile& tile, const float val ) const
+  {
+    for( int z=tile.mins[2]; z < tile.maxs[2] ; ++z )
+    {
+      const Box box = clip( z, tile );
+      for( int y=tile.mins[1]; y < tile.maxs[1] ; ++y )
+      {
+        float* row = &vol( 0,y,z );
+        if( y < box.y_min || y >= box.y_max )
+          std::fill( row +tile.mins[0], row +tile.maxs[0], val );
+        else
+        {
+          std::fill( row +tile.mins[0], row +box.x_min, val );
+          std::fill( row +box.x_max, row +tile.maxs[0], val );
+        }
+      }
+    }
+  }
+
+private:
+  std::vector<Box> m_boxes;
+};
+
 
 class SphereFitCost
 {
 public:
   SphereFitCost( const Volume& input, Volume& output );
   //~SphereFitCost() { for( size_t it=0; it < m_spheres.size() ; ++it ) delete m_spheres[it]; }
+  /// Fitting runs on a utils::TileScheduler, max_threads < 1 uses all hardware threads
   void applySphereCost( const double min_occ, const double sphere_min_occ,
                         const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
-                        const int max_threads=4 );
+                        const int max_threads=0 );
+  /**
+   * Same result as applySphereCost, radii up to the distance to the closest background voxel
+   * are taken from a DistanceTransform, only larger spheres are fitted.
+   */
+  void applyDistanceCost( const double min_occ, const double sphere_min_occ,
+                          const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
+                          const int max_threads=0 );
+  /// Circles stay within their z slice, so every slice of the input is fitted on its own
   void applyCircleCost( const double min_occ, const double sphere_min_occ,
                         const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
-                        const int max_threads=4 );
-  void createSphereMask( Volume& output, const size_t radius, const utils::CoordinateF& dim_facs );
-  void createCircleMask( Volume& output, const size_t radius, const utils::CoordinateF& dim_facs, const size_t& dim=2 );
+                        const int max_threads=0 );
+  /// Report progress to a utils::ProgressHandle, fitting throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress_handle = progress; }
 
 private:
   //void createSphereMask( Volume& output, const size_t radius );
-  void applyCost( const double min_occ, const double sphere_min_occ,
-                  const utils::CoordinateF& dim_facs, const int max_threads=4 );
-  void fitSpheresThread( const double min_occ, const double sphere_min_occ );
-  void fitCirclesThread( const double min_occ, const double circle_min_occ );
+  void applyCost( const char* step, const int max_threads );
+  void fitTile( const utils::Tile& tile );
 
-  inline double fitSphere( const size_t sph_it, const double min_occ, const utils::Coordinate& str_ptr,
-                           const utils::Coordinate& mins, const utils::Coordinate& maxs ) const
+  /// Largest radius up to m_max_rad whose sphere lies within sqrd_dist of its center
+  inline int insideRadius( const float sqrd_dist ) const
   {
-    //std::cout << sph_it << ": " << std::endl;
-    int mask_x = str_ptr[0]; int mask_y = str_ptr[1]; int mask_z = str_ptr[2];
-    float occ_val = 0.f;
-    for( size_t z=mins[2]; z < maxs[2] ; ++z )
-    {
-      for( size_t y=mins[1]; y < maxs[1] ; ++y )
-      {
-        for( size_t x=mins[0]; x < maxs[0] ; ++x )
-        {
-          if( m_input(x,y,z) >= min_occ )
-          {
-            //std::cout << "(" << mask_x << "," << mask_y << "," << mask_z << " = " << m_spheres[sph_it](mask_x, mask_y, mask_z) << ") ";
-            occ_val += m_spheres[sph_it](mask_x, mask_y, mask_z);
-            //std::cout << occ_val << std::endl;
-          }
-          ++mask_x;
-        }
-        mask_x = str_ptr[0];
-        ++mask_y;
-      }
-      mask_y = str_ptr[1];
-      ++mask_z;
-    }
-    //if(occ_val>0.0) std::cout << " = "  << occ_val << std::endl;
-    return occ_val;
+    int rad = std::min( int( std::ceil( std::sqrt( sqrd_dist ) ) ), m_max_rad +1 );
+    while( rad > 0 && double( rad ) *rad >= sqrd_dist )
+      --rad;
+    while( rad < m_max_rad && double( rad +1 ) *( rad +1 ) < sqrd_dist )
+      ++rad;
+    return std::min( rad, m_max_rad );
   }
 
+  /// Mask voxels of a radius which are not part of the next smaller radius
+  struct Shell
+  {
+    std::vector<utils::Coordinate> offsets;
+    std::vector<std::ptrdiff_t> idx_offsets;
+    utils::Coordinate extent;
+  };
+
+  void createShells( const std::vector<SphereMaskPtr>& masks, const double min_occ, const double sphere_min_occ );
+  int fitRadius( const utils::Coordinate& pos ) const;
 
-  inline double fitCircle( const size_t sph_it, const double min_occ, const utils::Coordinate& str_ptr,
-                           const utils::Coordinate& mins, const utils::Coordinate& maxs )
+  /**
+   * Adds the occupied voxels of shell sph_it around pos to occ_num.
+   * Returns false as soon as the sphere cannot reach the minimum occupation anymore.
+   */
+  inline bool addShell( const size_t sph_it, const utils::Coordinate& pos, size_t& occ_num ) const
   {
-    int mask_x = str_ptr[0]; int mask_y = str_ptr[1]; int mask_z = 0;
-    float occ_val = 0.f;
-    for( size_t y=mins[1] ; y < maxs[1] ; ++y )
+    const Shell& shell = m_shells[sph_it];
+    const size_t min_num = m_min_nums[sph_it];
+    size_t open = shell.offsets.size();
+    const utils::Coordinate& shape = m_input.getShape();
+    if( pos[0] >= shell.extent[0] && pos[0] +shell.extent[0] < shape[0] &&
+        pos[1] >= shell.extent[1] && pos[1] +shell.extent[1] < shape[1] &&
+        pos[2] >= shell.extent[2] && pos[2] +shell.extent[2] < shape[2] )
     {
-      for( size_t x=mins[0] ; x < maxs[0] ; ++x )
+      const float* center = &m_input( pos );
+      for( const std::ptrdiff_t& off : shell.idx_offsets )
       {
-        //std::cout << x << "," << y << ":" << m_input(x,y,size_t(0)) << "; " << mask_x << "," << mask_y << ":" << m_spheres[sph_it](mask_x, mask_y, mask_z) << std::endl;
-        if( m_input(x,y,size_t(0) ) >= min_occ )
-        {
-          occ_val += m_spheres[sph_it](mask_x, mask_y, mask_z);
-        }
-        ++mask_x;
+        --open;
+        if( center[off] >= m_min_occ )
+          ++occ_num;
+        else if( occ_num +open < min_num )
+          return false;
       }
-      mask_x = str_ptr[0];
-      ++mask_y;
     }
-    return occ_val;
+    else
+    {
+      for( const utils::Coordinate& off : shell.offsets )
+      {
+        --open;
+        const int x = pos[0] +off[0], y = pos[1] +off[1], z = pos[2] +off[2];
+        if( x >= 0 && x < shape[0] && y >= 0 && y < shape[1] && z >= 0 && z < shape[2] && m_input( x,y,z ) >= m_min_occ )
+          ++occ_num;
+        else if( occ_num +open < min_num )
+          return false;
+      }
+    }
+    return occ_num >= min_num;
   }
 
 
   const Volume &m_input;
   Volume &m_output;
-  std::vector<Volume> m_spheres;
   std::vector<float> m_sphere_sums;
+  std::vector<Shell> m_shells;
+  SliceBoxes m_boxes;
+  /// Occupied voxels needed per radius
+  std::vector<size_t> m_min_nums;
+  double m_min_occ;
+  /// Output holds the squared distances to the background before fitting
+  bool m_seeded = false;
+  int m_max_rad = 0;
+  void* m_progress_handle = nullptr;
+  utils::Progress* m_progress = nullptr;
 };
 
 
@@ -99,15 +214,49 @@ class RadiusConvolutionCost
 public:
   RadiusConvolutionCost( const Volume& input, Volume& output );
 
-  void apply( const int& mask_size, const size_t& max_threads=4 );
+  /// Runs on slabs of whole slices, so the histograms keep sliding, max_threads < 1 uses all hardware threads
+  void apply( const int& mask_size, const int max_threads=0 );
+  /// Report progress to a utils::ProgressHandle, apply throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress_handle = progress; }
 private:
-  void threadRunner();
+  /**
+   * Sliding histograms over the radius levels of one thread.
+   * Planes hold the z window per voxel of a slice, columns add the y window per x,
+   * window adds the x window for the current voxel.
+   */
+  struct RankState
+  {
+    std::vector<uint16_t> planes;
+    std::vector<uint32_t> columns, window;
+    int z = -1;
+  };
+
+  void convolveTile( const utils::Tile& tile, RankState& state );
   float maskLocalRadius( const int& x, const int& y,const int& z );
+  bool quantize( const size_t max_levels );
+  void updatePlanes( const int z, RankState& state ) const;
+  void rankSlice( const int z, RankState& state );
+
+  /// Adds or subtracts a histogram of the levels
+  template<typename _TpA, typename _TpB>
+  inline void addHistogram( _TpA* target, const _TpB* source, const bool subtract=false ) const
+  {
+    if( subtract )
+      for( size_t it=0; it < m_num_levels ; ++it ) target[it] -= source[it];
+    else
+      for( size_t it=0; it < m_num_levels ; ++it ) target[it] += source[it];
+  }
 
   const Volume &m_input;
   Volume &m_output;
   int m_mask_size;
   float m_mask_num_el;
+  SliceBoxes m_boxes;
+  /// Rank of each voxel among the distinct input values, empty for brute force counting
+  std::vector<uint8_t> m_levels;
+  size_t m_num_levels = 0;
+  void* m_progress_handle = nullptr;
+  utils::Progress* m_progress = nullptr;
 };
 
 
@@ -0,0 +1,80 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef COST_MAP_H__
+#define COST_MAP_H__
+
+#include "utils.h"
+#include "volume.h"
+#include "progress.h"
+#include "tile_scheduler.h"
+#include <algorithm>
+#include <limits>
+#include <vector>
+
+/**
+ * Final path cost maps of volume extraction and skeletonization.
+ * Normalizations need the extrema of intermediate maps, those are found by reductions over the inputs,
+ * so the only full volume written is the output.
+ */
+class CostMap
+{
+public:
+  CostMap( const Volume& input, const Volume& radius, Volume& output );
+
+  /**
+   * Same as VolumeExtraction.costFunction in float arithmetic:
+   * c = input/max +rad_weight *radius/max, cost = ( 1 -c/max(c) +offset ) normalized to a maximum of 1,
+   * costs not below gap_threshold are multiplied by 10 if gap_threshold > 0.
+   */
+  void applyExtraction( const float rad_weight, const float offset, const float gap_threshold, const int max_threads=0 );
+  /**
+   * Same as Skeletonization.costFunction in double arithmetic:
+   * c = radius +( input > min_int ? int_bonus : 0 ) normalized to a maximum of 1,
+   * cost = 1 -c, plus cutoff where c is not positive.
+   */
+  void applySkeleton( const double min_int, const double int_bonus, const double cutoff, const int max_threads=0 );
+  /// Report progress to a utils::ProgressHandle, apply throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress_handle = progress; }
+
+private:
+  /// Calls func( begin, end, thread_id ) for ranges of voxel indices, covering whole slices
+  template<class _Func>
+  void forSlabs( utils::TileScheduler& scheduler, utils::Progress& progress, _Func func )
+  {
+    const size_t slice_size = size_t( m_input.getShape()[0] ) *m_input.getShape()[1];
+    scheduler.run( [&]( const utils::Tile& tile, const size_t t_id )
+    {
+      func( tile.mins[2] *slice_size, tile.maxs[2] *slice_size, t_id );
+      return progress.add();
+    } );
+    progress.check();
+  }
+
+  /// Minimum and maximum of val( it ) over all voxels
+  template<typename _Tp, class _Func>
+  void extrema( utils::TileScheduler& scheduler, utils::Progress& progress, _Func val, _Tp& min_val, _Tp& max_val )
+  {
+    std::vector<_Tp> mins( scheduler.numThreads(), std::numeric_limits<_Tp>::infinity() );
+    std::vector<_Tp> maxs( scheduler.numThreads(), -std::numeric_limits<_Tp>::infinity() );
+    forSlabs( scheduler, progress, [&]( const size_t begin, const size_t end, const size_t t_id )
+    {
+      for( size_t it=begin; it < end ; ++it )
+      {
+        const _Tp cur = val( it );
+        mins[t_id] = std::min( mins[t_id], cur );
+        maxs[t_id] = std::max( maxs[t_id], cur );
+      }
+    } );
+    min_val = *std::min_element( mins.begin(), mins.end() );
+    max_val = *std::max_element( maxs.begin(), maxs.end() );
+  }
+
+  const Volume &m_input, &m_radius;
+  Volume &m_output;
+  void* m_progress_handle = nullptr;
+};
+
+#endif // COST_MAP_H__
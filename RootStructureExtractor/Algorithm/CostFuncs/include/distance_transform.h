@@ -0,0 +1,63 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef DISTANCE_TRANSFORM_H__
+#define DISTANCE_TRANSFORM_H__
+
+#include "utils.h"
+#include "volume.h"
+#include "progress.h"
+#include "tile_scheduler.h"
+
+/**
+ * Exact anisotropic euclidean distance transform.
+ * Separable lower envelope of parabolas (Felzenszwalb & Huttenlocher), one pass per axis,
+ * so the runtime is linear in the number of voxels and independent of the distances.
+ * Writes the squared distance of every voxel to the closest background voxel,
+ * background being below min_occ or outside the volume, voxel edges scaled by dim_facs.
+ */
+class DistanceTransform
+{
+public:
+  DistanceTransform( const Volume& input, Volume& output );
+  /// max_threads < 1 uses all hardware threads
+  void apply( const double min_occ, const utils::CoordinateF& dim_facs, const int max_threads=0 );
+  /// Report progress to a utils::ProgressHandle, apply throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress_handle = progress; }
+
+private:
+  /// Per thread buffers of the lower envelope
+  struct LineBuffer
+  {
+    LineBuffer( const size_t max_len ) : f( max_len +2 ), z( max_len +3 ), v( max_len +2 ) {}
+    std::vector<double> f, z;
+    std::vector<int> v;
+  };
+
+  void transformSlices( const utils::Tile& tile, LineBuffer& buf );
+  void transformColumns( const utils::Tile& tile, LineBuffer& buf );
+  void transformLine( float* line, const size_t stride, const int len, const float dim_fac, LineBuffer& buf ) const;
+
+  /// Squared physical length of dist voxels along an axis, same arithmetic as Coordinate::getSqrdDistance
+  static inline double sqrdLength( const int dist, const float dim_fac )
+  {
+    return std::pow( dist *dim_fac, 2 );
+  }
+
+  /// Position where the parabola of site q falls below the one of site p < q
+  static inline double intersection( const std::vector<double>& f, const int q, const int p, const double sqrd_fac )
+  {
+    return ( ( f[q] +sqrd_fac *q *q ) -( f[p] +sqrd_fac *p *p ) ) /( 2.0 *sqrd_fac *( q -p ) );
+  }
+
+  const Volume &m_input;
+  Volume &m_output;
+  float m_min_occ;
+  utils::CoordinateF m_dim_facs;
+  void* m_progress_handle = nullptr;
+  utils::Progress* m_progress = nullptr;
+};
+
+#endif // DISTANCE_TRANSFORM_H__
@@ -3,9 +3,9 @@
  *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
  */
 
+#include <algorithm>
 #include <vector>
 #include <iostream>
-#include <thread>
 
 #include "apply_cost_function.h"
 
@@ -14,205 +14,129 @@ SphereFitCost::SphereFitCost( const Volume& input, Volume& output )
 {
 }
 
-inline int strPt( const int st, const int rad ) { return -std::min( 0, st-rad ); } //TODO fix incorrect start comp
-
-void SphereFitCost::fitSpheresThread( const double min_occ, const double sphere_min_occ )
+void SphereFitCost::fitTile( const utils::Tile& tile )
 {
-  int z = m_output.multithreadAccess();
-  utils::Coordinate shape = m_input.getShape();
-  while( z != -1 )
+  m_boxes.fillOutside( m_output, tile, 0.f );
+  for( int z=tile.mins[2]; z < tile.maxs[2] ; ++z )
   {
-    //if ( shape[1] %z == 0 )
-    std::cout << z << "/" << shape[2] << "\r";
-    int num_spheres = m_spheres.size();
-    int sphere_it = 1; // Use as running variable -> next element r_new : r_old -1 =< r_new => r_old +1
-    size_t cut_x_1 = num_spheres, cut_y_1 = num_spheres;
-    size_t cut_x_2 = shape[0] -num_spheres, cut_y_2 = shape[1] -num_spheres;
-    std::vector<int> z_mins, z_maxs, z_starts;
-    for( int it=0; it < m_spheres.size() ; ++it )
-    {
-      z_mins.push_back( std::max( 0, z -it ) );
-      z_maxs.push_back( std::min( z +it +1, shape[2] ) ); // TODO CORRECT START COMPUTATION!!!
-      z_starts.push_back( strPt( z, it ) );
-    }
-    for( int y=0; y < shape[1] ; ++y )
-    {
-      std::vector<int> y_mins, y_maxs, y_starts;
-      for( int it=0; it < m_spheres.size() ; ++it )
-      {
-        y_mins.push_back( std::max( 0, y -it ) );
-        y_maxs.push_back( std::min( y +it +1, shape[1] ) ); // TODO CORRECT START COMPUTATION!!!
-        y_starts.push_back( strPt( y, it ) );
-      }
-      for( int x=0; x < shape[0] ; ++x )
-      {
-        double occ = 1.0;
-        while( sphere_it < m_spheres.size() )
-        {
-          utils::Coordinate mins( std::max( 0, x -sphere_it ), y_mins[sphere_it], z_mins[sphere_it] );
-          utils::Coordinate maxs( std::min( x +sphere_it +1, shape[0] ), y_maxs[sphere_it], z_maxs[sphere_it] );
-          utils::Coordinate str_pt( strPt( x, sphere_it ), y_starts[sphere_it], z_starts[sphere_it] );
-          occ = fitSphere( sphere_it, min_occ, str_pt, mins, maxs ) /m_sphere_sums[sphere_it];
-          if( occ < sphere_min_occ )
-            break;
-          //std::cout << sphere_it << ":" << occ << "<-" << m_sphere_sums[sphere_it] << std::endl;
-          ++sphere_it;
-        }
-        m_output( x,y,z ) = sphere_it-1;
-        sphere_it = 1;
-      }
-    }
-    z = m_output.multithreadAccess();
+    const SliceBoxes::Box box = m_boxes.clip( z, tile );
+    for( int y=box.y_min; y < box.y_max && !m_progress->cancelled() ; ++y )
+      for( int x=box.x_min; x < box.x_max ; ++x )
+        m_output( x,y,z ) = fitRadius( utils::Coordinate( x,y,z ) );
   }
 }
 
 
-void SphereFitCost::fitCirclesThread( const double min_occ, const double sphere_min_occ )
+int SphereFitCost::fitRadius( const utils::Coordinate& pos ) const
 {
-  utils::Coordinate shape = m_input.getShape();
-  //std::cout << "Enter " << shape << std::endl;
-  int num_spheres = m_spheres.size();
-  int sphere_it = 1; // Use as running variable -> next element r_new : r_old -1 =< r_new => r_old +1
-  size_t cut_x_1 = num_spheres, cut_y_1 = num_spheres;
-  size_t cut_x_2 = shape[0] -num_spheres, cut_y_2 = shape[1] -num_spheres;
-  for( int y=0; y < shape[1] ; ++y )
+  size_t sphere_it = 1; // Next radius to test, the previous one is counted in occ_num
+  size_t occ_num = m_input( pos ) >= m_min_occ ? 1 : 0;
+  // Spheres within the distance to the background are fully occupied
+  if( m_seeded )
   {
-    std::vector<int> y_mins, y_maxs, y_starts;
-    for( int it=0; it < m_spheres.size() ; ++it )
-    {
-      y_mins.push_back( std::max( 0, y -it ) );
-      y_maxs.push_back( std::min( y +it +1, shape[1] ) ); // TODO CORRECT START COMPUTATION!!!
-      y_starts.push_back( strPt( y, it ) );
-    }
-    for( int x=0; x < shape[0] ; ++x )
-    {
-      double occ = 1.0;
-      while( sphere_it < m_spheres.size() )
-      {
-        utils::Coordinate mins( std::max( 0, x -sphere_it ), y_mins[sphere_it], 0 );
-        utils::Coordinate maxs( std::min( x +sphere_it +1, shape[0] ), y_maxs[sphere_it], 1 );
-        utils::Coordinate str_pt( strPt( x, sphere_it ), y_starts[sphere_it], 0 );
-        //if(m_input(x,y,0) > 0.0)std::cout << "int:" << x << "," << y << ":" << m_input(x,y,int(0)) << std::endl;
-        occ = fitCircle( sphere_it, min_occ, str_pt, mins, maxs ) /m_sphere_sums[sphere_it];
-        if( occ < sphere_min_occ )
-          break;
-        //std::cout << sphere_it << ":" << occ << "<-" << m_sphere_sums[sphere_it] << std::endl;
-        ++sphere_it;
-      }
-      m_output( x,y,0 ) = sphere_it-1;
-      sphere_it = 1;
-    }
+    sphere_it = insideRadius( m_output( pos ) ) +1;
+    if( sphere_it >= m_shells.size() )
+      return int( sphere_it ) -1;
+    if( sphere_it > 1 )
+      occ_num = m_sphere_sums[sphere_it-1];
   }
+  while( sphere_it < m_shells.size() && addShell( sphere_it, pos, occ_num ) )
+    ++sphere_it;
+  return int( sphere_it ) -1;
 }
 
 
-void SphereFitCost::applySphereCost( const double min_occ, const double sphere_min_occ,
-                                     const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
-                                     const int max_threads )
+/**
+ * Splits the masks into shells, so growing a sphere only visits the voxels added by the new radius.
+ */
+void SphereFitCost::createShells( const std::vector<SphereMaskPtr>& masks, const double min_occ, const double sphere_min_occ )
 {
-  m_spheres.reserve( sphere_max_rad+1 );
-  for( size_t r_it=0; r_it <= sphere_max_rad ; ++r_it )
+  m_min_occ = min_occ;
+  const utils::Coordinate& shape = m_input.getShape();
+  for( size_t r_it=0; r_it < masks.size() ; ++r_it )
   {
-    Volume sphere;
-    createSphereMask( sphere, r_it, dim_facs );
-    m_sphere_sums.push_back( sphere.sum() );
-    m_spheres.push_back( std::move( sphere ) );
+    Shell shell;
+    shell.extent = utils::Coordinate( 0,0,0 );
+    masks[r_it]->forEach( [&]( const utils::Coordinate& off )
+    {
+      for( size_t ax=0; ax < 3 ; ++ax )
+        shell.extent[ax] = std::max( shell.extent[ax], std::abs( off[ax] ) );
+      if( r_it > 0 && masks[r_it-1]->contains( off ) )
+        return;
+      shell.offsets.push_back( off );
+      shell.idx_offsets.push_back( ( std::ptrdiff_t( off[2] ) *shape[1] +off[1] ) *shape[0] +off[0] );
+    } );
+    // Smallest count with count/sum >= sphere_min_occ, as compared by the full sphere fit
+    const double sum = masks[r_it]->size();
+    size_t min_num = size_t( std::max( 0.0, std::ceil( sphere_min_occ *sum ) ) );
+    while( min_num > 0 && double( min_num-1 ) /sum >= sphere_min_occ )
+      --min_num;
+    while( double( min_num ) /sum < sphere_min_occ && min_num <= sum )
+      ++min_num;
+    m_sphere_sums.push_back( sum );
+    m_min_nums.push_back( min_num );
+    m_shells.push_back( std::move( shell ) );
   }
-  applyCost( min_occ, sphere_min_occ, dim_facs, max_threads );
 }
 
 
-void SphereFitCost::applyCircleCost( const double min_occ, const double sphere_min_occ,
+void SphereFitCost::applySphereCost( const double min_occ, const double sphere_min_occ,
                                      const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
                                      const int max_threads )
 {
-  m_spheres.reserve( sphere_max_rad+1 );
-  for( size_t r_it=0; r_it <= sphere_max_rad ; ++r_it )
-  {
-    Volume sphere;
-    createCircleMask( sphere, r_it, dim_facs );
-    //std::cout << sphere << std::endl;
-    m_sphere_sums.push_back( sphere.sum() );
-    m_spheres.push_back( std::move( sphere ) );
-  }
-  fitCirclesThread( min_occ, sphere_min_occ );
+  createShells( SphereMask::getRange( sphere_max_rad, dim_facs ), min_occ, sphere_min_occ );
+  applyCost( "Sphere fitting", max_threads );
 }
 
 
-void SphereFitCost::applyCost( const double min_occ, const double sphere_min_occ,
-                               const utils::CoordinateF& dim_facs, const int max_threads )
+void SphereFitCost::applyDistanceCost( const double min_occ, const double sphere_min_occ,
+                                       const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
+                                       const int max_threads )
 {
-  std::vector<std::thread> fitting_threads;
-  for( size_t t_it=0; t_it < max_threads ; ++t_it )
-    fitting_threads.push_back( std::thread( &SphereFitCost::fitSpheresThread, this, min_occ, sphere_min_occ ) );
-  for( size_t t_it=0; t_it < max_threads ; ++t_it )
-    fitting_threads[t_it].join();
-
-  std::cout << std::endl;
+  DistanceTransform transform( m_input, m_output );
+  transform.setProgress( m_progress_handle );
+  transform.apply( min_occ, dim_facs, max_threads );
+  m_seeded = true;
+  m_max_rad = sphere_min_occ > 1.0 ? 0 : sphere_max_rad;
+  // Spheres reaching the background can only pass with some tolerance, or if the mask box cuts them off
+  const float min_fac = std::min( std::min( dim_facs[0], dim_facs[1] ), dim_facs[2] );
+  std::vector<SphereMaskPtr> masks;
+  if( sphere_min_occ < 1.0 || min_fac < 1.f )
+    masks = SphereMask::getRange( sphere_max_rad, dim_facs );
+  createShells( masks, min_occ, sphere_min_occ );
+  applyCost( "Sphere fitting", max_threads );
 }
 
 
-void SphereFitCost::createSphereMask( Volume& output, const size_t radius, const utils::CoordinateF& dim_facs )
+void SphereFitCost::applyCircleCost( const double min_occ, const double sphere_min_occ,
+                                     const size_t sphere_max_rad, const utils::CoordinateF& dim_facs,
+                                     const int max_threads )
 {
-  size_t diameter = radius *2 +1;
-  if( diameter == 0 )
-  {
-    output = std::move( Volume( 1,1,1 ) );
-    output( 0,0,0 ) = 1;
-    return;
-  }
-  output = Volume( diameter, diameter, diameter );
-  const utils::Coordinate center( radius, radius, radius );
-  const double sqrd_rad = std::pow( radius, 2 );
-  for( size_t x_it=0; x_it < radius +1; ++x_it )
-    for( size_t y_it=0; y_it < radius +1; ++y_it )
-      for( size_t z_it=0; z_it < radius +1; ++z_it )
-        if( center.getSqrdDistance( utils::Coordinate( x_it, y_it, z_it ), dim_facs ) <= sqrd_rad )
-        {
-          const size_t c_x = diameter -x_it -1;
-          const size_t c_y = diameter -y_it -1;
-          const size_t c_z = diameter -z_it -1;
-          output( x_it, y_it, z_it ) = 1.0;
-          output( x_it, y_it, c_z ) = 1.0;
-          output( x_it, c_y, z_it ) = 1.0;
-          output( x_it, c_y, c_z ) = 1.0;
-          output( c_x, y_it, z_it ) = 1.0;
-          output( c_x, y_it, c_z ) = 1.0;
-          output( c_x, c_y, z_it ) = 1.0;
-          output( c_x, c_y, c_z ) = 1.0;
-        }
+  createShells( SphereMask::getRange( sphere_max_rad, dim_facs, 2 ), min_occ, sphere_min_occ );
+  applyCost( "Circle fitting", max_threads );
 }
 
 
-void SphereFitCost::createCircleMask( Volume& output, const size_t radius, const utils::CoordinateF& dim_facs, const size_t& dim )
+void SphereFitCost::applyCost( const char* step, const int max_threads )
 {
-  size_t diameter = radius *2 +1;
-  if( diameter == 0 )
-  {
-    output = std::move( Volume( 1,1,1 ) );
-    output( 0,0,0 ) = 1;
-    return;
-  }
-  output = Volume( diameter, diameter, 1 );
-  const utils::Coordinate center( radius, radius, 0 );
-  const double sqrd_rad = std::pow( radius, 2 );
-  for( size_t x_it=0; x_it < radius +1; ++x_it )
-    for( size_t y_it=0; y_it < radius +1; ++y_it )
-      if( center.getSqrdDistance( utils::Coordinate( x_it, y_it, 0 ), dim_facs ) <= sqrd_rad )
-      {
-        const size_t c_x = diameter -x_it -1;
-        const size_t c_y = diameter -y_it -1;
-        output( x_it, y_it, size_t(0) ) = 1.0;
-        output( x_it, c_y, size_t(0) ) = 1.0;
-        output( c_x, y_it, size_t(0) ) = 1.0;
-        output( c_x, c_y, size_t(0) ) = 1.0;
-      }
+  // Without any occupied voxel in the radius 1 sphere a voxel gets radius 0
+  const bool skip_empty = m_shells.size() <= 1 || m_min_nums[1] > 0;
+  const utils::Coordinate extent = m_shells.size() > 1 ? m_shells[1].extent : utils::Coordinate( 0,0,0 );
+  m_boxes = SliceBoxes( m_input, extent, [&]( const float& val ){ return !skip_empty || val >= m_min_occ; } );
+  // Small tiles, so dense parts of the volume spread over all threads
+  utils::TileScheduler scheduler( m_input.getShape(), utils::Coordinate( 16,16,16 ), max_threads );
+  utils::Progress progress( m_progress_handle, step, scheduler.numTiles() );
+  m_progress = &progress;
+  scheduler.run( [this]( const utils::Tile& tile, const size_t ){ fitTile( tile ); return m_progress->add(); } );
+  m_progress = nullptr;
+  progress.check();
+  progress.finish();
 }
 
 
 extern "C" int applySphereCost( float* input, float* output, int x_dim, int y_dim, int z_dim,
                                 double min_occ, double min_sphere_occ, int sphere_max_rad,
-                                float* dim_facs, int num_threads )
+                                float* dim_facs, int num_threads, void* progress )
 {
   std::cout << "MinOcc=" << min_occ << " minSphereOcc=" << min_sphere_occ << std::endl;
   utils::Coordinate shape( x_dim, y_dim, z_dim );
@@ -220,14 +144,42 @@ extern "C" int applySphereCost( float* input, float* output, int x_dim, int y_di
   //std::cout << input_arr << std::endl;
   std::cout << input_arr.getShape() << "->"<< output_arr.getShape() << std::endl;
   SphereFitCost cost( input_arr, output_arr );
-  cost.applySphereCost( min_occ, min_sphere_occ, sphere_max_rad, utils::CoordinateF( dim_facs ), num_threads );
+  cost.setProgress( progress );
+  try
+  {
+    cost.applySphereCost( min_occ, min_sphere_occ, sphere_max_rad, utils::CoordinateF( dim_facs ), num_threads );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
+  return 0;
+}
+
+
+extern "C" int applyDistanceCost( float* input, float* output, int x_dim, int y_dim, int z_dim,
+                                  double min_occ, double min_sphere_occ, int sphere_max_rad,
+                                  float* dim_facs, int num_threads, void* progress )
+{
+  utils::Coordinate shape( x_dim, y_dim, z_dim );
+  Volume input_arr( input, shape ), output_arr( output, shape );
+  SphereFitCost cost( input_arr, output_arr );
+  cost.setProgress( progress );
+  try
+  {
+    cost.applyDistanceCost( min_occ, min_sphere_occ, sphere_max_rad, utils::CoordinateF( dim_facs ), num_threads );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
   return 0;
 }
 
 
 extern "C" int applyCircleCost( float* input, float* output, int x_dim, int y_dim, int z_dim,
                                 double min_occ, double min_sphere_occ, int sphere_max_rad,
-                                float* dim_facs, int num_threads )
+                                float* dim_facs, int num_threads, void* progress )
 {
   std::cout << "MinOcc=" << min_occ << " minSphereOcc=" << min_sphere_occ << std::endl;
   utils::Coordinate shape( x_dim, y_dim, z_dim );
@@ -236,7 +188,15 @@ extern "C" int applyCircleCost( float* input, float* output, int x_dim, int y_di
   std::cout << input_arr.getShape() << "->"<< output_arr.getShape() << std::endl;
   std::cout << "Max " << input_arr.max() << std::endl;
   SphereFitCost cost( input_arr, output_arr );
-  cost.applyCircleCost( min_occ, min_sphere_occ, sphere_max_rad, utils::CoordinateF( dim_facs ), num_threads );
+  cost.setProgress( progress );
+  try
+  {
+    cost.applyCircleCost( min_occ, min_sphere_occ, sphere_max_rad, utils::CoordinateF( dim_facs ), num_threads );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
   return 0;
 }
 
@@ -247,32 +207,161 @@ RadiusConvolutionCost::RadiusConvolutionCost( const Volume& input, Volume& outpu
 : m_input( input ), m_output( output ) {}
 
 
-void RadiusConvolutionCost::apply( const int& mask_size, const size_t& max_threads )
+void RadiusConvolutionCost::apply( const int& mask_size, const int max_threads )
 {
   m_mask_size = mask_size;
   m_mask_num_el = std::pow( m_mask_size*2+1, 3 );
-  m_output.resetAccess();
-  std::vector<std::thread> threads;
-  for( size_t t_iz=0; t_iz < max_threads ; ++t_iz )
-    threads.push_back( std::thread( &RadiusConvolutionCost::threadRunner, this ) );
-  for( size_t t_it=0; t_it < max_threads ; ++t_it )
-    threads[t_it].join();
+  // Voxels at the smallest radius have no smaller neighbor
+  const float min_val = m_input.min();
+  m_boxes = SliceBoxes( m_input, utils::Coordinate( 0,0,0 ), [min_val]( const float& val ){ return val > min_val; } );
+  // Sliding histograms cost about three passes over the levels per voxel, brute force a pass over the mask
+  if( !quantize( std::pow( 2*m_mask_size, 3 ) /3 ) )
+  {
+    m_levels.clear();
+    m_num_levels = 0;
+  }
+  // A few slices per tile, rebuilding the plane histograms costs about a slice per mask voxel in z
+  const utils::Coordinate& shape = m_input.getShape();
+  utils::TileScheduler scheduler( shape, utils::Coordinate( shape[0], shape[1], 4 ), max_threads );
+  std::vector<RankState> states( scheduler.numThreads() );
+  utils::Progress progress( m_progress_handle, "Radius convolution", scheduler.numTiles() );
+  m_progress = &progress;
+  scheduler.run( [&]( const utils::Tile& tile, const size_t t_id ){ convolveTile( tile, states[t_id] ); return progress.add(); } );
+  m_progress = nullptr;
+  progress.check();
+  progress.finish();
 }
 
 
-void RadiusConvolutionCost::threadRunner()
+void RadiusConvolutionCost::convolveTile( const utils::Tile& tile, RankState& state )
 {
-  int z = m_output.multithreadAccess();
-  while( z != -1 )
+  m_boxes.fillOutside( m_output, tile, 0.f );
+  for( int z=tile.mins[2]; z < tile.maxs[2] ; ++z )
   {
-    for( int y=0; y < m_output.getShape()[1]; ++y )
+    if( m_num_levels > 0 )
+    {
+      rankSlice( z, state );
+      continue;
+    }
+    const SliceBoxes::Box& box = m_boxes[z];
+    for( int y=box.y_min; y < box.y_max && !m_progress->cancelled() ; ++y )
     {
-      for( int x=0; x < m_output.getShape()[0]; ++x )
+      for( int x=box.x_min; x < box.x_max; ++x )
       {
         m_output( x,y,z ) = maskLocalRadius( x,y,z );
       }
     }
-    z = m_output.multithreadAccessOffset( m_mask_size );
+  }
+}
+
+
+/**
+ * Maps each voxel to the rank of its value among the distinct values of the input.
+ * Counting smaller ranks equals counting smaller values, so the rank filter stays exact.
+ * Fails if there are more than max_levels distinct values.
+ */
+bool RadiusConvolutionCost::quantize( const size_t max_levels )
+{
+  const size_t num_elems = m_input.getSize();
+  std::vector<float> values;
+  for( size_t it=0; it < num_elems ; ++it )
+  {
+    const float& val = m_input[it];
+    auto pos = std::lower_bound( values.begin(), values.end(), val );
+    if( pos != values.end() && *pos == val )
+      continue;
+    if( values.size() >= std::min( max_levels, size_t( 256 ) ) )
+      return false;
+    values.insert( pos, val );
+  }
+  m_num_levels = values.size();
+  m_levels.resize( num_elems );
+  for( size_t it=0; it < num_elems ; ++it )
+    m_levels[it] = std::lower_bound( values.begin(), values.end(), m_input[it] ) -values.begin();
+  return true;
+}
+
+
+/// Moves the z window of the plane histograms to slice z, rebuilds them unless z follows the last slice
+void RadiusConvolutionCost::updatePlanes( const int z, RankState& state ) const
+{
+  const utils::Coordinate& shape = m_input.getShape();
+  const size_t slice_size = size_t( shape[0] ) *shape[1];
+  auto addSlice = [&]( const int z_it, const int step )
+  {
+    const uint8_t* levels = &m_levels[z_it *slice_size];
+    uint16_t* planes = state.planes.data();
+    for( size_t it=0; it < slice_size ; ++it, planes += m_num_levels )
+      planes[levels[it]] += step;
+  };
+  if( state.z >= 0 && z == state.z +1 )
+  {
+    if( z -1 -m_mask_size >= 0 )
+      addSlice( z -1 -m_mask_size, -1 );
+    if( z +m_mask_size -1 < shape[2] )
+      addSlice( z +m_mask_size -1, 1 );
+  }
+  else
+  {
+    state.planes.assign( slice_size *m_num_levels, 0 );
+    for( int z_it=std::max( 0, z -m_mask_size ); z_it < std::min( shape[2], z +m_mask_size ) ; ++z_it )
+      addSlice( z_it, 1 );
+  }
+  state.z = z;
+}
+
+
+/// Same as maskLocalRadius for the box of slice z, window histograms slide along x and y
+void RadiusConvolutionCost::rankSlice( const int z, RankState& state )
+{
+  const utils::Coordinate& shape = m_input.getShape();
+  const SliceBoxes::Box& box = m_boxes[z];
+  updatePlanes( z, state );
+  if( box.x_min >= box.x_max )
+    return;
+  const int m = m_mask_size;
+  const size_t slice_size = size_t( shape[0] ) *shape[1];
+  const uint8_t* levels = &m_levels[z *slice_size];
+  const int x_begin = std::max( 0, box.x_min -m ), x_end = std::min( shape[0], box.x_max -1 +m );
+  state.columns.assign( size_t( shape[0] ) *m_num_levels, 0 );
+  state.window.resize( m_num_levels );
+  auto plane = [&]( const int x, const int y ) { return &state.planes[( size_t( y ) *shape[0] +x ) *m_num_levels]; };
+  auto column = [&]( const int x ) { return &state.columns[size_t( x ) *m_num_levels]; };
+  const int z_num = std::min( shape[2], z +m ) -std::max( 0, z -m );
+  for( int y=box.y_min; y < box.y_max && !m_progress->cancelled() ; ++y )
+  {
+    for( int x=x_begin; x < x_end ; ++x )
+    {
+      if( y == box.y_min )
+        for( int y_it=std::max( 0, y -m ); y_it < std::min( shape[1], y +m ) ; ++y_it )
+          addHistogram( column( x ), plane( x, y_it ) );
+      else
+      {
+        if( y -1 -m >= 0 )
+          addHistogram( column( x ), plane( x, y -1 -m ), true );
+        if( y +m -1 < shape[1] )
+          addHistogram( column( x ), plane( x, y +m -1 ) );
+      }
+    }
+    const int yz_num = ( std::min( shape[1], y +m ) -std::max( 0, y -m ) ) *z_num;
+    std::fill( state.window.begin(), state.window.end(), 0 );
+    for( int x_it=std::max( 0, box.x_min -m ); x_it < std::min( shape[0], box.x_min +m ) ; ++x_it )
+      addHistogram( state.window.data(), column( x_it ) );
+    for( int x=box.x_min; x < box.x_max ; ++x )
+    {
+      if( x > box.x_min )
+      {
+        if( x -1 -m >= 0 )
+          addHistogram( state.window.data(), column( x -1 -m ), true );
+        if( x +m -1 < shape[0] )
+          addHistogram( state.window.data(), column( x +m -1 ) );
+      }
+      uint32_t sum = 0;
+      for( size_t l_it=0; l_it < levels[size_t( y ) *shape[0] +x] ; ++l_it )
+        sum += state.window[l_it];
+      const int num_elems = ( std::min( shape[0], x +m ) -std::max( 0, x -m ) ) *yz_num;
+      m_output( x,y,z ) = float( sum ) /num_elems;
+    }
   }
 }
 
@@ -296,14 +385,22 @@ float RadiusConvolutionCost::maskLocalRadius( const int& x,
 
 
 extern "C" int applyRadiusCost( float* input, float* output, int x_dim, int y_dim, int z_dim,
-                                int mask_size, int num_threads )
+                                int mask_size, int num_threads, void* progress )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim );
   Volume input_arr( input, shape ), output_arr( output, shape );
   //std::cout << input_arr << std::endl;
   std::cout << input_arr.getSize() << "->"<< output_arr.getSize() << std::endl;
   RadiusConvolutionCost cost( input_arr, output_arr );
-  cost.apply( mask_size, num_threads );
+  cost.setProgress( progress );
+  try
+  {
+    cost.apply( mask_size, num_threads );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
   return 0;
 }
 
@@ -0,0 +1,103 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#include "cost_map.h"
+
+CostMap::CostMap( const Volume& input, const Volume& radius, Volume& output )
+: m_input( input ), m_radius( radius ), m_output( output )
+{
+}
+
+
+void CostMap::applyExtraction( const float rad_weight, const float offset, const float gap_threshold, const int max_threads )
+{
+  const utils::Coordinate& shape = m_input.getShape();
+  utils::TileScheduler scheduler( shape, utils::Coordinate( shape[0], shape[1], 4 ), max_threads );
+  utils::Progress progress( m_progress_handle, "Extraction cost", 3 *scheduler.numTiles() );
+  std::vector<float> inp_maxs( scheduler.numThreads(), -std::numeric_limits<float>::infinity() ), rad_maxs( inp_maxs );
+  forSlabs( scheduler, progress, [&]( const size_t begin, const size_t end, const size_t t_id )
+  {
+    for( size_t it=begin; it < end ; ++it )
+    {
+      inp_maxs[t_id] = std::max( inp_maxs[t_id], m_input[it] );
+      rad_maxs[t_id] = std::max( rad_maxs[t_id], m_radius[it] );
+    }
+  } );
+  const float inp_max = *std::max_element( inp_maxs.begin(), inp_maxs.end() );
+  const float rad_max = *std::max_element( rad_maxs.begin(), rad_maxs.end() );
+  auto combined = [&]( const size_t it ){ return m_input[it] /inp_max +rad_weight *( m_radius[it] /rad_max ); };
+  float cmb_min, cmb_max;
+  extrema( scheduler, progress, combined, cmb_min, cmb_max );
+  // Inverting is monotone, so the largest cost belongs to the smallest combined value
+  auto invert = [&]( const float cmb ){ return ( cmb /cmb_max -1.f ) *-1.f +offset; };
+  const float cost_max = invert( cmb_min );
+  forSlabs( scheduler, progress, [&]( const size_t begin, const size_t end, const size_t )
+  {
+    for( size_t it=begin; it < end ; ++it )
+    {
+      const float cost = invert( combined( it ) ) /cost_max;
+      m_output[it] = gap_threshold > 0.f && !( cost < gap_threshold ) ? cost *10.f : cost;
+    }
+  } );
+  progress.finish();
+}
+
+
+void CostMap::applySkeleton( const double min_int, const double int_bonus, const double cutoff, const int max_threads )
+{
+  const utils::Coordinate& shape = m_input.getShape();
+  utils::TileScheduler scheduler( shape, utils::Coordinate( shape[0], shape[1], 4 ), max_threads );
+  utils::Progress progress( m_progress_handle, "Skeleton cost", 2 *scheduler.numTiles() );
+  auto combined = [&]( const size_t it ){ return double( m_radius[it] ) +( m_input[it] > min_int ? int_bonus : 0.0 ); };
+  double cmb_min, cmb_max;
+  extrema( scheduler, progress, combined, cmb_min, cmb_max );
+  forSlabs( scheduler, progress, [&]( const size_t begin, const size_t end, const size_t )
+  {
+    for( size_t it=begin; it < end ; ++it )
+    {
+      const double cmb = combined( it ) /cmb_max;
+      m_output[it] = cmb *-1.0 +1.0 +( cmb > 0.0 ? 0.0 : cutoff );
+    }
+  } );
+  progress.finish();
+}
+
+
+extern "C" int applyExtractionCost( float* input, float* radius, float* output, int x_dim, int y_dim, int z_dim,
+                                    float rad_weight, float offset, float gap_threshold, int num_threads, void* progress )
+{
+  utils::Coordinate shape( x_dim, y_dim, z_dim );
+  Volume input_arr( input, shape ), radius_arr( radius, shape ), output_arr( output, shape );
+  CostMap cost( input_arr, radius_arr, output_arr );
+  cost.setProgress( progress );
+  try
+  {
+    cost.applyExtraction( rad_weight, offset, gap_threshold, num_threads );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
+  return 0;
+}
+
+
+extern "C" int applySkeletonCost( float* input, float* radius, float* output, int x_dim, int y_dim, int z_dim,
+                                  double min_int, double int_bonus, double cutoff, int num_threads, void* progress )
+{
+  utils::Coordinate shape( x_dim, y_dim, z_dim );
+  Volume input_arr( input, shape ), radius_arr( radius, shape ), output_arr( output, shape );
+  CostMap cost( input_arr, radius_arr, output_arr );
+  cost.setProgress( progress );
+  try
+  {
+    cost.applySkeleton( min_int, int_bonus, cutoff, num_threads );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
+  return 0;
+}
@@ -0,0 +1,113 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#include <limits>
+#include <vector>
+
+#include "distance_transform.h"
+
+DistanceTransform::DistanceTransform( const Volume& input, Volume& output )
+: m_input( input ), m_output( output )
+{
+}
+
+
+void DistanceTransform::apply( const double min_occ, const utils::CoordinateF& dim_facs, const int max_threads )
+{
+  m_min_occ = min_occ;
+  m_dim_facs = dim_facs;
+  const utils::Coordinate& shape = m_input.getShape();
+  // x and y passes stay within a z slice, the z pass runs along columns of all slices
+  utils::TileScheduler slices( shape, utils::Coordinate( shape[0], shape[1], 1 ), max_threads );
+  utils::TileScheduler columns( shape, utils::Coordinate( shape[0], 1, shape[2] ), max_threads );
+  utils::Progress progress( m_progress_handle, "Distance transform", slices.numTiles() +columns.numTiles() );
+  m_progress = &progress;
+  std::vector<LineBuffer> bufs( slices.numThreads(), LineBuffer( std::max( shape[0], shape[1] ) ) );
+  slices.run( [&]( const utils::Tile& tile, const size_t t_id ){ transformSlices( tile, bufs[t_id] ); return progress.add(); } );
+  progress.check();
+  bufs.assign( columns.numThreads(), LineBuffer( shape[2] ) );
+  columns.run( [&]( const utils::Tile& tile, const size_t t_id ){ transformColumns( tile, bufs[t_id] ); return progress.add(); } );
+  progress.check();
+  m_progress = nullptr;
+  progress.finish();
+}
+
+
+void DistanceTransform::transformSlices( const utils::Tile& tile, LineBuffer& buf )
+{
+  const utils::Coordinate& shape = m_input.getShape();
+  const size_t slice_size = size_t( shape[0] ) *shape[1];
+  for( int z=tile.mins[2]; z < tile.maxs[2] ; ++z )
+  {
+    const float* input = m_input.getData() +z *slice_size;
+    float* output = m_output.getData() +z *slice_size;
+    for( size_t it=0; it < slice_size ; ++it )
+      output[it] = input[it] >= m_min_occ ? std::numeric_limits<float>::infinity() : 0.f;
+    for( int y=0; y < shape[1] ; ++y )
+      transformLine( output +y *shape[0], 1, shape[0], m_dim_facs[0], buf );
+    for( int x=0; x < shape[0] ; ++x )
+      transformLine( output +x, shape[0], shape[1], m_dim_facs[1], buf );
+  }
+}
+
+
+void DistanceTransform::transformColumns( const utils::Tile& tile, LineBuffer& buf )
+{
+  const utils::Coordinate& shape = m_input.getShape();
+  const size_t slice_size = size_t( shape[0] ) *shape[1];
+  for( int y=tile.mins[1]; y < tile.maxs[1] ; ++y )
+  {
+    float* row = m_output.getData() +y *shape[0];
+    for( int x=tile.mins[0]; x < tile.maxs[0] ; ++x )
+      transformLine( row +x, slice_size, shape[2], m_dim_facs[2], buf );
+  }
+}
+
+
+/**
+ * In place 1D transform g(p) = min_q f(q) +(dim_fac*(p-q))^2 of a strided line.
+ * The volume border is modelled by background sites at -1 and len.
+ */
+void DistanceTransform::transformLine( float* line, const size_t stride, const int len,
+                                       const float dim_fac, LineBuffer& buf ) const
+{
+  // Site i of the buffer is position i-1 of the line
+  const int num_sites = len +2;
+  std::vector<double> &f = buf.f, &z = buf.z;
+  std::vector<int> &v = buf.v;
+  f[0] = 0.0;
+  for( int it=0; it < len ; ++it )
+    f[it+1] = line[it *stride];
+  f[num_sites-1] = 0.0;
+
+  const double sqrd_fac = double( dim_fac ) *dim_fac;
+  int k = 0;
+  v[0] = 0;
+  z[0] = -std::numeric_limits<double>::infinity();
+  z[1] = std::numeric_limits<double>::infinity();
+  for( int q=1; q < num_sites ; ++q )
+  {
+    if( std::isinf( f[q] ) )
+      continue;
+    double s = intersection( f, q, v[k], sqrd_fac );
+    while( s <= z[k] )
+    {
+      --k;
+      s = intersection( f, q, v[k], sqrd_fac );
+    }
+    ++k;
+    v[k] = q;
+    z[k] = s;
+    z[k+1] = std::numeric_limits<double>::infinity();
+  }
+
+  k = 0;
+  for( int q=1; q < num_sites-1 ; ++q )
+  {
+    while( z[k+1] < q )
+      ++k;
+    line[( q-1 ) *stride] = f[v[k]] +sqrdLength( q -v[k], dim_fac );
+  }
+}
@@ -38,6 +38,7 @@ def getLib( path ):
         
 import os
 import lib_path
+import c_progress
 __run_lib_path = lib_path.lib_folder
 __run_lib_name = __run_lib_path +"/" +lib_name 
 try:
@@ -53,31 +54,39 @@ except:
         raise( RuntimeError( "Cannot load or compile {0}".format( lib_name ) ) )
     
 
-def extractGraph( inp_arr, cost_map_1, cost_map_2, pred_map_1, pred_map_2, start_pt, int_threshold, cost_cutoff, save_grp, path="" ):
+def extractGraph( inp_arr, cost_map_1, cost_map_2, pred_map_1, pred_map_2, start_pt, int_threshold, cost_cutoff, save_grp, path="",
+                  settled=None ):
     """
     Given a 3D input array, path cost maps and predecessor maps return a graph.
     Given minimum intensity to be included and maximum path cost a per voxel graph.
 
     :param inp_arr: np.array, 3D intensity map
     :param cost_map_1: np.array, 3D primary cost map
-    :param cost_map_2: np.array, 3D secondary cost map
-    :param pred_map_1: np.array, 3D primary predecessor map
-    :param pred_map_2: np.array, 3D secondary predecessor map
+    :param cost_map_2: np.array, 3D secondary cost map or None
+    :param pred_map_1: np.array, 3D primary predecessor map, converted to np.int8
+    :param pred_map_2: np.array, 3D secondary predecessor map or None, converted to np.int8
     :param start_pt: 3-tuple, 3D start position
     :param int_threshold: Float, minimum intensity to count as set voxel
     :param cost_cutoff: Float, maximum path cost to include in graph
     :param save_grp: UNUSED
     :param path: UNUSED
+    :param settled: np.array, linear indices of the voxels reached by the shortest path, as returned with return_settled.
+                    Only these are visited instead of the whole volume, has to hold every voxel below cost_cutoff
     :return: c-pointer to graph object, np.array, array with all voxel in graph are set.
     """
     graph_ptr = ctypes.c_void_p()
     out_arr = np.zeros_like( inp_arr, dtype=np.float32 )
+    pred_map_1 = np.ascontiguousarray( pred_map_1, dtype=np.int8 )
+    if pred_map_2 is not None:
+        pred_map_2 = np.ascontiguousarray( pred_map_2, dtype=np.int8 )
     c_path = path.encode( "utf-8" )
+    if settled is not None:
+        settled = np.ascontiguousarray( settled, dtype=np.int64 )
     graph_ptr = __sp_run_lib.extractGraph( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        cost_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       cost_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
-                                       pred_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       None if cost_map_2 is None else cost_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                       None if pred_map_2 is None else pred_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
                                        out_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        ctypes.c_int( inp_arr.shape[2] ),
                                        ctypes.c_int( inp_arr.shape[1] ),
@@ -86,8 +95,12 @@ def extractGraph( inp_arr, cost_map_1, cost_map_2, pred_map_1, pred_map_2, start
                                        ctypes.c_double( int_threshold ),
                                        ctypes.c_double( cost_cutoff ),
                                        ctypes.c_bool( save_grp ),
-                                       ctypes.c_char_p( c_path )
+                                       ctypes.c_char_p( c_path ),
+                                       None if settled is None else settled.ctypes.data_as( ctypes.POINTER( ctypes.c_int64 ) ),
+                                       ctypes.c_int64( 0 if settled is None else settled.size ),
+                                       c_progress.getHandle()
                                       )
+    c_progress.checkCancelled()
     return graph_ptr, out_arr
 
 
@@ -98,7 +111,7 @@ def extractSkeleton( cmb_map, radius_map, pred_map_1, start_pt, dim_mult, min_cm
 
     :param cmb_map: np.array, Map of comparative radius for quench point detection
     :param radius_map: np.array, Per position radius estimate
-    :param pred_map_1: np.array, Per position predecessor map
+    :param pred_map_1: np.array, Per position predecessor map, converted to np.int8
     :param start_pt: 3-tuple, starting position
     :param dim_mult: 3-tuple, ratio of voxel edge-length
     :param min_cmb: Int, minimum value to count as quench point
@@ -113,9 +126,8 @@ def extractSkeleton( cmb_map, radius_map, pred_map_1, start_pt, dim_mult, min_cm
     """
     graph_ptr = ctypes.c_void_p()
     print("{},{}".format(pred_map_1.min(), pred_map_1.max()))
+    pred_map_1 = np.ascontiguousarray( pred_map_1, dtype=np.int8 )
     out_arr = np.zeros( cmb_map.shape, dtype=np.float32 )
-    pred_map_2 = np.zeros( pred_map_1.shape, dtype=np.int32 )
-    cost_map_2 = np.zeros( pred_map_1.shape, dtype=np.float32 )
     #np.save( "test_preds", pred_map_1 )
     __sp_run_lib.extractSkeleton.restype = ctypes.c_void_p
     c_path = path.encode( "utf-8" )
@@ -127,9 +139,9 @@ def extractSkeleton( cmb_map, radius_map, pred_map_1, start_pt, dim_mult, min_cm
     print( old_graph_ptr )
     graph_ptr = __sp_run_lib.extractSkeleton( cmb_map.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        radius_map.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       cost_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
-                                       pred_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       None,
+                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                       None,
                                        out_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        ctypes.c_int( cmb_map.shape[2] ),
                                        ctypes.c_int( cmb_map.shape[1] ),
@@ -143,8 +155,10 @@ def extractSkeleton( cmb_map, radius_map, pred_map_1, start_pt, dim_mult, min_cm
                                        ctypes.c_double( qp_min_dist ),
                                        ctypes.c_char_p( c_path ),
                                        ctypes.cast( old_graph_ptr, ctypes.c_void_p ),
-                                       ctypes.c_bool( seed_qps )
+                                       ctypes.c_bool( seed_qps ),
+                                       c_progress.getHandle()
                                       )
+    c_progress.checkCancelled()
     #np.save( "pointers", out_arr )
     return graph_ptr, out_arr
 
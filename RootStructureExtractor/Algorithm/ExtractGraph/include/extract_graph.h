@@ -8,9 +8,11 @@
 
 #include "root_graph.h"
 #include "hash_table.h"
+#include "index_map.h"
 #include "volume.h"
 #include "neighborhood.h"
 #include "sphere_mask.h"
+#include "progress.h"
 
 #define TYPE_NOT_COMPARABLE
 
@@ -58,12 +60,18 @@ public:
   typedef utils::RootGraph Graph;
 
   GraphExtractor( const Volume& input, const Volume& cost_map_1, const Volume& cost_map_2,
-                  const VolumeI& pred_map_1, const VolumeI& pred_map_2, Volume& out_arr );
+                  const VolumeI8& pred_map_1, const VolumeI8& pred_map_2, Volume& out_arr );
   ~GraphExtractor() { delete m_neighbor; }
 
+  /**
+   * Graph of all voxels above int_threshold with path cost below cost_cutoff, connected along their predecessors.
+   * If settled is given, only these num_settled linear indices are visited, instead of the whole volume.
+   * These have to include every voxel below cost_cutoff, as the settle order of the shortest path does.
+   */
   Graph* extractGraph( const utils::Coordinate& start_pos,
                        const double& int_threshold,
-                       const double& cost_cutoff );
+                       const double& cost_cutoff,
+                       const int64_t* settled=nullptr, const size_t num_settled=0 );
 
   Graph* curveSkeletonization( const utils::Coordinate& start_pos,
                                Cutoff& z_cutoff,
@@ -76,6 +84,8 @@ public:
   std::string toXml();
   utils::xml::Element* nodeToXml( const Graph::NodePtr node );
   inline void deleteGraph() { delete m_graph; }
+  /// Report progress to a utils::ProgressHandle, extraction throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress = progress; }
 
 private:
   void findNodesByInt( const double& threshold );
@@ -85,16 +95,24 @@ private:
   Graph::NodePtr addGraphNode( const utils::Coordinate& pos, const bool connect=false, const float& rad=1.f );
   Graph::NodePtr addGraphNode( const utils::Coordinate& pos, const float& rad, const double& dil_sum, const size_t& branch_id );
   void fillRadius( const Graph::NodePtr& node, const utils::Coordinate& pos, const size_t& rad, const size_t& small_rad );
-  void fillOutput( const utils::Coordinate& pos, const utils::Coordinate& sp_pos );
-  void fillPosition( const Graph::NodePtr& node, const utils::Coordinate& pos, const utils::Coordinate& sp_pos );
   void getPathRadius( const utils::Coordinate& pos, Path& path );
   void getPathRadiusNode( const utils::Coordinate& pos, size_t& it, Path& path );
+  /// Graph node owning the voxel, nullptr if none
+  inline Graph::NodePtr getNode( const utils::Coordinate& pos ) const
+  {
+    return m_nodes_in_graph.get( m_output.getIndex( pos[0], pos[1], pos[2] ) );
+  }
+  inline void setNode( const utils::Coordinate& pos, const Graph::NodePtr node )
+  {
+    m_nodes_in_graph[m_output.getIndex( pos[0], pos[1], pos[2] )] = node;
+  }
 
 
   const Volume &m_input, &m_cost_map_1, &m_cost_map_2;
-  const VolumeI &m_pred_map_1, &m_pred_map_2;
+  const VolumeI8 &m_pred_map_1, &m_pred_map_2;
   Volume& m_output;
-  VolumeBase<void*> m_nodes_in_graph;
+  /// Owning node by voxel index, only voxels near the graph are stored
+  utils::IndexMap<Graph::NodePtr> m_nodes_in_graph;
   Graph* m_graph;
   utils::Coordinate m_shape;
   int m_num_elems;
@@ -104,8 +122,11 @@ private:
   int m_id = 0;
   utils::CoordinateF m_mults;
   utils::NeighborhoodBase* m_neighbor;
-  std::vector<Volume> m_spheres;
+  std::vector<SphereMaskPtr> m_spheres;
+  /// Voxels walked by addGraphNode, kept to reuse the allocation
+  std::vector<utils::Coordinate> m_chain;
   size_t m_branch_iter = 0;
+  void* m_progress = nullptr;
 };
 
 #endif // EXTRACT_GRAPH_H__
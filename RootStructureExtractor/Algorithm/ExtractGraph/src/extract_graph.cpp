@@ -4,6 +4,7 @@
  */
 
 #include "extract_graph.h"
+#include <queue>
 
 inline std::ostream& operator<<( std::ostream& _ostr, const VolumeBase<void*>& _obj )
 {
@@ -12,12 +13,11 @@ inline std::ostream& operator<<( std::ostream& _ostr, const VolumeBase<void*>& _
 
 
 GraphExtractor::GraphExtractor( const Volume& input, const Volume& cost_map_1, const Volume& cost_map_2,
-                                const VolumeI& pred_map_1, const VolumeI& pred_map_2, Volume& output )
+                                const VolumeI8& pred_map_1, const VolumeI8& pred_map_2, Volume& output )
                               : m_input( input ),
                                 m_cost_map_1( cost_map_1 ), m_cost_map_2( cost_map_2 ),
                                 m_pred_map_1( pred_map_1 ), m_pred_map_2( pred_map_2 ),
-                                m_output( output ),
-                                m_nodes_in_graph( VolumeBase<void*>( input.getShape(), nullptr ) )
+                                m_output( output )
 {
   m_shape = m_input.getShape();
   m_num_elems = m_shape[0] *m_shape[1] *m_shape[2];
@@ -26,28 +26,40 @@ GraphExtractor::GraphExtractor( const Volume& input, const Volume& cost_map_1, c
 
 GraphExtractor::Graph* GraphExtractor::extractGraph( const utils::Coordinate& start_pos,
                                                      const double& int_threshold,
-                                                     const double& cost_cutoff )
+                                                     const double& cost_cutoff,
+                                                     const int64_t* settled, const size_t num_settled )
 {
   std::cout << "Enter" << std::endl;
   GraphExtractor::Graph::NodePtr root = new GraphExtractor::Graph::Node( start_pos );
   m_graph = new Graph( root );
   std::cout << "Got new Graph" << std::endl;
-  m_nodes_in_graph( start_pos ) = root;
+  setNode( start_pos, root );
   m_output( start_pos ) = 1.0;
   m_cost_cutoff = cost_cutoff;
   m_int_threshold = int_threshold;
-  size_t run_it = 0, step_s = m_num_elems/100;
+  size_t run_it = 0;
   std::cout << "Initialized" << std::endl;
+  if( settled != nullptr )
+  {
+    // Predecessors are settled first, so every walk ends after one step
+    utils::Progress progress( m_progress, "Graph extraction", num_settled );
+    for( size_t s_it=0; s_it < num_settled ; ++s_it )
+    {
+      addGraphNode( m_output.fromIndex( settled[s_it] ) );
+      progress.update( s_it+1 );
+    }
+    progress.finish();
+    return m_graph;
+  }
+  utils::Progress progress( m_progress, "Graph extraction", m_num_elems );
   for( size_t z=0; z < m_shape[2] ; ++z )
     for( size_t y=0; y < m_shape[1] ; ++y )
       for( size_t x=0; x < m_shape[0] ; ++x )
       {
         addGraphNode( utils::Coordinate( x,y,z ) );
-        ++run_it;
-        if( run_it % step_s == 0 )
-          std::cout << run_it << "/" << m_num_elems << "\r";
+        progress.update( ++run_it );
       }
-  std::cout << m_num_elems << "/" << m_num_elems << std::endl;
+  progress.finish();
   return m_graph;
 }
 
@@ -67,25 +79,33 @@ utils::Coordinate GraphExtractor::getPredecessor( const utils::Coordinate& pos )
   }
 }
 
+/**
+ * Walks the predecessors from pos to the first voxel already in the graph,
+ * then inserts the walked voxels from there on. Voxels after the first need no intensity to connect.
+ */
 GraphExtractor::Graph::NodePtr GraphExtractor::addGraphNode( const utils::Coordinate& pos, bool connect, const float& rad )
 {
-  if( m_nodes_in_graph( pos ) != nullptr )
-    return reinterpret_cast<Graph::NodePtr>( m_nodes_in_graph( pos ) );
-  else{
-    if( m_cost_map_1( pos ) < m_cost_cutoff && ( m_input( pos ) >= m_int_threshold || connect ) )
-    {
-      utils::Coordinate pred_pos = m_neighbor->operator()( pos, m_pred_map_1( pos ) );
-      if( pos != pred_pos )
-      {
-        m_output( pos ) = 1.0;
-        GraphExtractor::Graph::NodePtr pred = addGraphNode( pred_pos, true );
-        GraphExtractor::Graph::NodePtr this_node = pred->insert( pos, rad, 0 );
-        m_nodes_in_graph( pos ) = reinterpret_cast<void*>( this_node );
-        return this_node;
-      }
-    }
+  m_chain.clear();
+  utils::Coordinate cur_pos = pos;
+  while( getNode( cur_pos ) == nullptr )
+  {
+    if( !( m_cost_map_1( cur_pos ) < m_cost_cutoff && ( m_input( cur_pos ) >= m_int_threshold || connect ) ) )
+      return nullptr;
+    const utils::Coordinate pred_pos = m_neighbor->operator()( cur_pos, m_pred_map_1( cur_pos ) );
+    if( cur_pos == pred_pos )
+      return nullptr;
+    m_output( cur_pos ) = 1.0;
+    m_chain.push_back( cur_pos );
+    cur_pos = pred_pos;
+    connect = true;
   }
-  return nullptr;
+  GraphExtractor::Graph::NodePtr node = getNode( cur_pos );
+  for( size_t c_it=m_chain.size(); c_it-- > 0 ; )
+  {
+    node = node->insert( m_chain[c_it], c_it == 0 ? rad : 1.f, 0 );
+    setNode( m_chain[c_it], node );
+  }
+  return node;
 }
 
 
@@ -103,18 +123,12 @@ GraphExtractor::Graph* GraphExtractor::curveSkeletonization( const utils::Coordi
   m_min_dist = qp_min_dist *qp_min_dist;
   double dil_mult = 1+ (dil_sum/100);
   float rad_max = std::ceil( m_cost_map_1.max() *dil_mult +1 );
-  m_spheres.reserve( rad_max +1 );
-  for( size_t rad=0; rad <= rad_max ; ++rad )
-  {
-    Volume sphere;
-    sphereMask( sphere, rad, dim_mults );
-    m_spheres.push_back( std::move( sphere ) );
-  }
+  m_spheres = SphereMask::getRange( rad_max, dim_mults );
   if( old_graph == nullptr || seed_from_graph )
   {
     GraphExtractor::Graph::NodePtr root = new GraphExtractor::Graph::Node( start_pos );
     m_graph = new Graph( root );
-    m_nodes_in_graph( start_pos ) = root;
+    setNode( start_pos, root );
     m_output( start_pos ) = 1.0;
   }
   else
@@ -162,128 +176,72 @@ GraphExtractor::Graph* GraphExtractor::curveSkeletonization( const utils::Coordi
         }
   }
   std::cout << "qp " << quench_points.size() << ", qp_d " << quench_sqrd_dists.size() << std::endl;
-  float max_val = -1;
-  utils::Coordinate max_pos;
-  while( true )
+  // Farthest point first, earlier points first on ties. Covered points are dropped once they reach the top,
+  // a point never becomes valid again, so each is popped once
+  std::vector<std::pair<double, int64_t>> heap_vals;
+  heap_vals.reserve( quench_points.size() );
+  for( size_t qp_it=0; qp_it < quench_points.size() ; ++qp_it )
+    heap_vals.push_back( std::make_pair( quench_sqrd_dists[qp_it], -int64_t( qp_it ) ) );
+  std::priority_queue<std::pair<double, int64_t>> quench_heap( std::less<std::pair<double, int64_t>>(), std::move( heap_vals ) );
+  utils::Progress progress( m_progress, "Quench points", quench_points.size() );
+  size_t num_done = 0;
+  while( !quench_heap.empty() )
   {
-    for( size_t qp_it=0; qp_it < quench_points.size() ; ++qp_it )
-    {
-      if( m_output( quench_points[qp_it] ) != 0 || m_pred_map_1(quench_points[qp_it]) == 0 )
-        quench_sqrd_dists[qp_it] = -1;
-      else if( quench_sqrd_dists[qp_it] > max_val )
-      {
-        max_val = quench_sqrd_dists[qp_it];
-        max_pos = quench_points[qp_it];
-        //TODO remember second longest when dist first ~= second
-      }
-    }
-    if( max_val == -1 ) break;
-    max_val = -1;
+    const utils::Coordinate& max_pos = quench_points[-quench_heap.top().second];
+    quench_heap.pop();
+    progress.update( ++num_done );
+    if( m_output( max_pos ) != 0 || m_pred_map_1( max_pos ) == 0 )
+      continue;
     std::cout << "Branch " << ++ct << ": " << max_pos << " Rad: " << m_cost_map_1(max_pos) << std::endl;
     Graph::NodePtr end_node = addGraphNode( max_pos, m_cost_map_1( max_pos ), dil_mult, ++m_branch_iter );
   }
+  progress.finish();
   return m_graph;
 }
 
 
+/// Same walk as above, every inserted node gets its cost as radius and dilates the output
 GraphExtractor::Graph::NodePtr GraphExtractor::addGraphNode( const utils::Coordinate& pos, const float& rad, const double& dil_sum, const size_t& branch_id )
 {
-  //std::cout << "NewNode: " << pos << std::endl;
-  if( m_nodes_in_graph( pos ) != nullptr )
-    return reinterpret_cast<Graph::NodePtr>( m_nodes_in_graph( pos ) );
-  else{
-    utils::Coordinate pred_pos = m_neighbor->operator()( pos, m_pred_map_1( pos ) );
-    if( pos != pred_pos )
-    {
-      m_output( pos ) = 1.0;
-      GraphExtractor::Graph::NodePtr pred = addGraphNode( pred_pos, m_cost_map_1( pred_pos ), dil_sum, branch_id );
-      //std::cout << pred << std::endl;
-      GraphExtractor::Graph::NodePtr this_node = pred->insert( pos, rad, branch_id );
-      //std::cout << "Connected" << std::endl;
-      fillRadius( this_node, pos, std::ceil( rad*dil_sum ), rad ); // TODO needs enhancement -> guided dilation?
-      m_nodes_in_graph( pos ) = reinterpret_cast<void*>( this_node );
-      return this_node;
-    }
+  m_chain.clear();
+  utils::Coordinate cur_pos = pos;
+  while( getNode( cur_pos ) == nullptr )
+  {
+    const utils::Coordinate pred_pos = m_neighbor->operator()( cur_pos, m_pred_map_1( cur_pos ) );
+    if( cur_pos == pred_pos )
+      return nullptr;
+    m_output( cur_pos ) = 1.0;
+    m_chain.push_back( cur_pos );
+    cur_pos = pred_pos;
+  }
+  GraphExtractor::Graph::NodePtr node = getNode( cur_pos );
+  for( size_t c_it=m_chain.size(); c_it-- > 0 ; )
+  {
+    const utils::Coordinate& node_pos = m_chain[c_it];
+    const float node_rad = c_it == 0 ? rad : m_cost_map_1( node_pos );
+    node = node->insert( node_pos, node_rad, branch_id );
+    fillRadius( node, node_pos, std::ceil( node_rad*dil_sum ), node_rad ); // TODO needs enhancement -> guided dilation?
+    setNode( node_pos, node );
   }
-  return nullptr;
+  return node;
 }
 
 
+/// Dilates the output by radius and assigns voxels within small_radius to node, both clipped to the volume
 void GraphExtractor::fillRadius( const Graph::NodePtr& node, const utils::Coordinate& pos,
                                  const size_t& radius, const size_t& small_radius )
 {
-  int min_it = std::min( pos.min() -int(radius), (m_output.getShape()-(pos+radius+1)).min() );
-  size_t small_rad = small_radius, rad = radius;;
-  if( min_it < 0 )
+  const utils::Coordinate& shape = m_output.getShape();
+  const size_t max_rad = m_spheres.size() -1;
+  m_spheres[std::min( radius, max_rad )]->forEachRun( pos, shape, [&]( const size_t begin, const size_t length )
   {
-    rad = rad +min_it;
-    small_rad = std::min( rad, small_radius +min_it );
-    //std::cout << min_it << ": " << rad <<  std::endl;
-  }
+    std::fill_n( &m_output[begin], length, 1.f );
+  } );
+  m_spheres[std::min( small_radius, max_rad )]->forEachRun( pos, shape, [&]( const size_t begin, const size_t length )
   {
-    //std::cout << "Pos: " << pos << ", Rad: " << rad << ", " << m_spheres.size() << std::endl;
-    if( min_it < 0 )
-      rad = radius +min_it;
-    size_t diameter = rad *2 +1;
-    Volume& sphere = m_spheres[rad];
-    for( size_t z=0; z <= rad ; ++z )
-      for( size_t y=0; y <= rad ; ++y )
-        for( size_t x=0; x <= rad ; ++x )
-        {
-          if( sphere( x,y,z ) > 0.0 )
-          {
-            utils::Coordinate anchor = utils::Coordinate( pos[0]-rad,pos[1]-rad,pos[2]-rad );
-            const size_t c_x = diameter -x -1;
-            const size_t c_y = diameter -y -1;
-            const size_t c_z = diameter -z -1;
-            //std::cout << "rad:" << rad << ": " << anchor << "->" << x << "," << y << "," << z << " ; ";
-            fillOutput( anchor, utils::Coordinate( x, y, z ) );
-            fillOutput( anchor, utils::Coordinate( x, y, c_z ) );
-            fillOutput( anchor, utils::Coordinate( x, c_y, z ) );
-            fillOutput( anchor, utils::Coordinate( x, c_y, c_z ) );
-            fillOutput( anchor, utils::Coordinate( c_x, y, z ) );
-            fillOutput( anchor, utils::Coordinate( c_x, y, c_z ) );
-            fillOutput( anchor, utils::Coordinate( c_x, c_y, z ) );
-            fillOutput( anchor, utils::Coordinate( c_x, c_y, c_z ) );
-          }
-        }
-  }
-  {
-    size_t diameter = small_rad*2+1;
-    Volume& sphere = m_spheres[small_rad];
-    for( size_t z=0; z <= small_rad ; ++z )
-      for( size_t y=0; y <= small_rad ; ++y )
-        for( size_t x=0; x <= small_rad ; ++x )
-        {
-          if( sphere( x,y,z ) > 0.0 )
-          {
-            utils::Coordinate anchor = utils::Coordinate( pos[0]-small_rad,pos[1]-small_rad,pos[2]-small_rad );
-            const size_t c_x = diameter -x -1;
-            const size_t c_y = diameter -y -1;
-            const size_t c_z = diameter -z -1;
-            fillPosition( node, anchor, utils::Coordinate( x, y, z ) );
-            fillPosition( node, anchor, utils::Coordinate( x, y, c_z ) );
-            fillPosition( node, anchor, utils::Coordinate( x, c_y, z ) );
-            fillPosition( node, anchor, utils::Coordinate( x, c_y, c_z ) );
-            fillPosition( node, anchor, utils::Coordinate( c_x, y, z ) );
-            fillPosition( node, anchor, utils::Coordinate( c_x, y, c_z ) );
-            fillPosition( node, anchor, utils::Coordinate( c_x, c_y, z ) );
-            fillPosition( node, anchor, utils::Coordinate( c_x, c_y, c_z ) );
-          }
-        }
-  }
-}
-
-void GraphExtractor::fillOutput( const utils::Coordinate& pos, const utils::Coordinate& sp_pos )
-{
-  utils::Coordinate vol_pos( pos[0] +sp_pos[0], pos[1] +sp_pos[1], pos[2] +sp_pos[2] );
-  m_output( vol_pos ) = 1;
-}
-
-void GraphExtractor::fillPosition( const Graph::NodePtr& node, const utils::Coordinate& pos, const utils::Coordinate& sp_pos )
-{
-  utils::Coordinate vol_pos( pos[0] +sp_pos[0], pos[1] +sp_pos[1], pos[2] +sp_pos[2] );
-  m_nodes_in_graph( vol_pos ) = node;
+    for( size_t it=begin; it < begin +length ; ++it )
+      m_nodes_in_graph[it] = node;
+  } );
 }
 
 
@@ -307,31 +265,33 @@ void GraphExtractor::getPathRadius( const utils::Coordinate& pos, Path& path )
 
 void GraphExtractor::getPathRadiusNode( const utils::Coordinate& pos, size_t& it, Path& path  )
 {
-  const float& cur_rad = m_cost_map_1( pos );
-  ++path.length;
-  utils::Coordinate pred_pos = m_neighbor->operator()( pos, m_pred_map_1( pos ) );
-  if( pos != pred_pos && m_output( pos ) < 1.0 )
+  utils::Coordinate cur_pos = pos;
+  while( true )
   {
+    const float& cur_rad = m_cost_map_1( cur_pos );
+    ++path.length;
+    const utils::Coordinate pred_pos = m_neighbor->operator()( cur_pos, m_pred_map_1( cur_pos ) );
+    if( cur_pos == pred_pos || m_output( cur_pos ) >= 1.0 )
+      return;
     if( cur_rad > 1.0 )
     {
       ++it;
       path.avg_radius += cur_rad;
-      getPathRadiusNode( pred_pos, it, path );
     }
-    else getPathRadiusNode( pred_pos, it, path );
+    cur_pos = pred_pos;
   }
 }
 
 
 extern "C" GraphExtractor::Graph* extractGraph( float* input, float* cost_map_1, float* cost_map_2,
-                             int* pred_map_1, int* pred_map_2, float* output,
+                             int8_t* pred_map_1, int8_t* pred_map_2, float* output,
                              int x_dim, int y_dim, int z_dim, int* start_pos,
                              double int_threshold, double cost_cutoff,
-                             bool save_grp, char* path )
+                             bool save_grp, char* path, int64_t* settled, int64_t num_settled, void* progress )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor(start_pos);
   const Volume v_input( input, shape ), v_cost_1( cost_map_1, shape ), v_cost_2( cost_map_2, shape );
-  const VolumeI v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
+  const VolumeI8 v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
   Volume out_arr( output, shape );
   //std::cout << path << std::endl;
   std::string tpath( path  );
@@ -343,7 +303,17 @@ extern "C" GraphExtractor::Graph* extractGraph( float* input, float* cost_map_1,
   //std::cout << "Temp File: " << tpath << std::endl;
   GraphExtractor gex( v_input, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, out_arr );
   std::cout << "Inp: " << v_input.min() << " < " << v_input.max() << std::endl;
-  GraphExtractor::Graph* graph_ptr = gex.extractGraph( st_coor, int_threshold, cost_cutoff );
+  gex.setProgress( progress );
+  GraphExtractor::Graph* graph_ptr = nullptr;
+  try
+  {
+    graph_ptr = gex.extractGraph( st_coor, int_threshold, cost_cutoff, settled, num_settled );
+  }
+  catch( const utils::Cancelled& )
+  {
+    gex.deleteGraph();
+    return nullptr;
+  }
   //std::cout << reinterpret_cast<GraphExtractor::Graph*>( graph_ptr )->toXml()  << std::endl;
 
   //if( save_grp )
@@ -354,15 +324,16 @@ extern "C" GraphExtractor::Graph* extractGraph( float* input, float* cost_map_1,
 
 
 extern "C" void* extractSkeleton( float* input, float* cost_map_1, float* cost_map_2,
-                                  int* pred_map_1, int* pred_map_2, float* output,
+                                  int8_t* pred_map_1, int8_t* pred_map_2, float* output,
                                   int x_dim, int y_dim, int z_dim, int* start_pos,
                                   float* dim_mults, double min_cmb, int dil_sum, int cut_axis, int z_cut, double qp_min_dist,
-                                  char* path, void* old_graph_vp = nullptr, bool seed_from_graph= false
+                                  char* path, void* old_graph_vp = nullptr, bool seed_from_graph= false,
+                                  void* progress = nullptr
                                 )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor( start_pos );
   const Volume v_input( input, shape ), v_cost_1( cost_map_1, shape ), v_cost_2( cost_map_2, shape );
-  const VolumeI v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
+  const VolumeI8 v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
   Volume out_arr( output, shape );
   utils::CoordinateF c_dim_mults( dim_mults );
   GraphExtractor::Graph* old_graph = reinterpret_cast<GraphExtractor::Graph*>(old_graph_vp);
@@ -378,7 +349,17 @@ extern "C" void* extractSkeleton( float* input, float* cost_map_1, float* cost_m
   std::cout << "init" << std::endl;
   GraphExtractor gex( v_input, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, out_arr );
   //std::cout << "gex" << std::endl;
-  GraphExtractor::Graph* graph_ptr = gex.curveSkeletonization( st_coor, z_cutoff, qp_min_dist, c_dim_mults, min_cmb, dil_sum, old_graph, seed_from_graph );
+  gex.setProgress( progress );
+  GraphExtractor::Graph* graph_ptr = nullptr;
+  try
+  {
+    graph_ptr = gex.curveSkeletonization( st_coor, z_cutoff, qp_min_dist, c_dim_mults, min_cmb, dil_sum, old_graph, seed_from_graph );
+  }
+  catch( const utils::Cancelled& )
+  {
+    gex.deleteGraph();
+    return nullptr;
+  }
   //std::cout << reinterpret_cast<GraphExtractor::Graph*>( graph_ptr )->toXml()  << std::endl;
 
   //graph_ptr->saveToFile(tpath);
@@ -37,6 +37,7 @@ def getLib( path ):
         
 import os
 import lib_path
+import c_progress
 __run_lib_path = lib_path.lib_folder
 __run_lib_name = __run_lib_path +"/" +lib_name 
 try:
@@ -59,8 +60,10 @@ def skeletonization( radius_map ):
                                     out_arr.ctypes.data_as(ctypes.POINTER( ctypes.c_float ) ),
                                     ctypes.c_int( radius_map.shape[2] ),
                                     ctypes.c_int( radius_map.shape[1] ),
-                                    ctypes.c_int( radius_map.shape[0] )
+                                    ctypes.c_int( radius_map.shape[0] ),
+                                    c_progress.getHandle()
                                   )
+    c_progress.checkCancelled()
     return out_arr
 
 
@@ -71,7 +74,9 @@ def grassFire( radius_map ):
                                     ctypes.c_int( radius_map.shape[2] ),
                                     ctypes.c_int( radius_map.shape[1] ),
                                     ctypes.c_int( radius_map.shape[0] ),
+                                    c_progress.getHandle()
                                   )
+    c_progress.checkCancelled()
     return out_arr
 
 
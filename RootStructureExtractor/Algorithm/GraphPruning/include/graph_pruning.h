@@ -8,6 +8,7 @@
 
 #include "root_graph.h"
 #include "volume.h"
+#include "progress.h"
 
 typedef utils::RootGraph Graph;
 
@@ -31,12 +32,15 @@ class Skeletonization
 public:
   Skeletonization( const Volume& extracted_map, Volume& output );
   void operator()();
+  /// Report progress to a utils::ProgressHandle, throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress = progress; }
 
 private:
   float evaluatePosition( const utils::Coordinate& pos );
 
   const Volume& m_extracted_map;
   Volume& m_skeleton;
+  void* m_progress = nullptr;
 };
 
 
@@ -45,12 +49,15 @@ class GrassFire
 public:
   GrassFire( const Volume& extracted_map, Volume& output );
   Graph* operator()();
+  /// Report progress to a utils::ProgressHandle, throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress = progress; }
 
 private:
   float evaluatePosition( const utils::Coordinate& pos );
 
   const Volume& m_extracted_map;
   Volume& m_skeleton;
+  void* m_progress = nullptr;
 };
 
 
@@ -41,13 +41,18 @@ void Skeletonization::operator()( )
   utils::Coordinate shape = m_extracted_map.getShape();
 
   float cutoff = 21;
+  utils::Progress progress( m_progress, "Skeletonization", shape[2]-2 );
   for( size_t z=1; z < shape[2]-1 ; ++z )
+  {
     for( size_t y=1; y < shape[1]-1 ; ++y )
       for( size_t x=1; x < shape[0]-1 ; ++x )
       {
         float val = evaluatePosition( utils::Coordinate( x,y,z ) );
         m_skeleton( x,y,z ) = val;
       }
+    progress.update( z );
+  }
+  progress.finish();
 }
 
 
@@ -92,14 +97,19 @@ float Skeletonization::evaluatePosition( const utils::Coordinate& pos )
   return sum;
 }
 
-extern "C" void skeletonization( float* radius_arr, float* output, int x_dim, int y_dim, int z_dim )
+extern "C" void skeletonization( float* radius_arr, float* output, int x_dim, int y_dim, int z_dim, void* progress )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim );
   Volume v_rad( radius_arr, shape ), v_out( output, shape );
 
   std::cout << "Max radius: " << v_rad.max() << std::endl;
   Skeletonization skel( v_rad, v_out );
-  skel();
+  skel.setProgress( progress );
+  try
+  {
+    skel();
+  }
+  catch( const utils::Cancelled& ) {}
 }
 
 
@@ -118,9 +128,10 @@ Graph* GrassFire::operator()()
   bool finished = false;
   while( !finished )
   {
-    std::cout << "Iter " << std::endl;
+    utils::Progress progress( m_progress, "Grass fire iteration", shape[2]-2 );
     finished = true;
     for( size_t z=1; z < shape[2]-1 ; ++z )
+    {
       for( size_t y=1; y < shape[1]-1 ; ++y )
         for( size_t x=1; x < shape[0]-1 ; ++x )
         {
@@ -133,6 +144,9 @@ Graph* GrassFire::operator()()
             else
               m_skeleton( x,y,z ) = 1;
         }
+      progress.update( z );
+    }
+    progress.finish();
   }
 
   return graph;
@@ -166,14 +180,19 @@ float  GrassFire::evaluatePosition( const utils::Coordinate& pos )
 }
 
 
-extern "C" void grassFire( float* radius_arr, float* output, int x_dim, int y_dim, int z_dim )
+extern "C" void grassFire( float* radius_arr, float* output, int x_dim, int y_dim, int z_dim, void* progress )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim );
   Volume v_rad( radius_arr, shape ), v_out( output, shape );
 
   std::cout << v_rad.max() << std::endl;
   GrassFire skel( v_rad, v_out );
-  skel();
+  skel.setProgress( progress );
+  try
+  {
+    skel();
+  }
+  catch( const utils::Cancelled& ) {}
 }
 
 
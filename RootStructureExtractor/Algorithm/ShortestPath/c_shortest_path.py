@@ -37,6 +37,7 @@ def getLib( path ):
         
 import os
 import lib_path
+import c_progress
 __run_lib_path = lib_path.lib_folder
 __run_lib_name = __run_lib_path +"/" +lib_name 
 try:
@@ -51,110 +52,506 @@ except:
         print( "Failed to compile {0}: {1}.".format( __run_lib_name, e ) )
         raise( RuntimeError( "Cannot load or compile {0}".format( lib_name ) ) )
     
+# Resumable search, returns a handle. Module level alias, as __names are mangled within classes
+sp_lib = __sp_run_lib
+sp_lib.djikstraCreate.restype = ctypes.c_void_p
+sp_lib.djikstraContinue.argtypes = [ ctypes.c_void_p, ctypes.c_float, ctypes.c_void_p ]
+sp_lib.djikstraDelete.argtypes = [ ctypes.c_void_p ]
+sp_lib.settledCreate.restype = ctypes.c_void_p
+sp_lib.settledSize.argtypes = [ ctypes.c_void_p ]
+sp_lib.settledSize.restype = ctypes.c_int64
+sp_lib.settledCopy.argtypes = [ ctypes.c_void_p, ctypes.POINTER( ctypes.c_int64 ) ]
+sp_lib.settledDelete.argtypes = [ ctypes.c_void_p ]
 
-def shortestPath( inp_arr, start_pt, idd, cost_cutoff, dim_mults ):
+queue_types = { "heap" : 0, "radix" : 1 }
+
+def arrayPointer( arr, c_type ):
+    """
+    ctypes pointer to the data of arr
+
+    :param arr: np.array or None
+    :param c_type: ctypes type of the elements
+    :return: ctypes pointer, NULL if arr is None
+    """
+    if arr is None:
+        return None
+    return arr.ctypes.data_as( ctypes.POINTER( c_type ) )
+
+
+def getSeeds( start_pt ):
+    """
+    Start positions as contiguous array of int32 positions
+
+    :param start_pt: 3-tuple or (N,3) array, start position(s)
+    :return: np.array (N,3), number of seeds N
+    """
+    seeds = np.ascontiguousarray( np.atleast_2d( start_pt ), dtype=np.int32 )
+    if seeds.ndim != 2 or seeds.shape[1] != 3:
+        raise( RuntimeError( "Start points need shape (3,) or (N,3), got {0}".format( np.shape( start_pt ) ) ) )
+    return seeds, seeds.shape[0]
+
+
+class SettledList:
+    """
+    Linear indices of the voxels settled by a search, in the order they were settled.
+    Every voxel comes after its predecessor.
+    """
+    def __init__( self ):
+        self.handle = ctypes.c_void_p( sp_lib.settledCreate() )
+
+    def __del__( self ):
+        sp_lib.settledDelete( self.handle )
+
+    def toArray( self ):
+        """
+        :return: np.array of np.int64 indices into the flattened volume
+        """
+        settled = np.empty( sp_lib.settledSize( self.handle ), dtype=np.int64 )
+        sp_lib.settledCopy( self.handle, settled.ctypes.data_as( ctypes.POINTER( ctypes.c_int64 ) ) )
+        return settled
+
+
+def getQueueType( queue ):
+    """
+    Map queue name to the enum used by the library
+
+    :param queue: String, "heap" (binary heap) or "radix" (monotone radix heap)
+    :return: ctypes.c_int
+    """
+    if queue not in queue_types:
+        raise( RuntimeError( "Unknown queue type {0}, use one of {1}".format( queue, list( queue_types.keys() ) ) ) )
+    return ctypes.c_int( queue_types[queue] )
+
+
+def shortestPath( inp_arr, start_pt, idd, cost_cutoff, dim_mults, queue="heap", second_best=True, return_seeds=False,
+                  num_threads=1, return_settled=False ):
     """
     Given a 3D cost map, return the per voxel shortest path and second shortest path.
     Uses Dijkstra shortest path.
 
     :param inp_arr: np.array, 3D cost map
-    :param start_pt: 3-tuple, starting position
+    :param start_pt: 3-tuple or (N,3) array, starting position(s)
     :param idd: Int, Neighborhood definition for node expansion
     :param cost_cutoff: Maximum path cost to evaluate
     :param dim_mults: 3-tuple, ratio of voxel edge-length
-    :return: Cost/Predecessor map for 1st and 2nd shortest path
+    :param queue: String, priority queue of the unvisited nodes, "heap" or "radix". The radix heap is faster,
+                  but settles voxels of equal path cost in a different order, so tied predecessors can differ
+    :param second_best: Bool, compute 2nd shortest path, else its maps are None
+    :param return_seeds: Bool, additionally return map of the start point index claiming each voxel, -1 if unreached
+    :param num_threads: Int, max number of threads used. More than 1 uses parallel delta-stepping,
+                        maps are identical to queue "heap"
+    :param return_settled: Bool, additionally return the np.int64 indices of all reached voxels in settle order,
+                           always searches on one thread
+    :return: Cost/Predecessor map for 1st and 2nd shortest path, predecessors as np.int8 direction codes
     """
     cost_map_1 = np.zeros_like( inp_arr, dtype=np.float32 )
-    pred_map_1 = np.zeros_like( inp_arr, dtype=np.int32 )
-    cost_map_2 = np.zeros_like( inp_arr, dtype=np.float32 )
-    pred_map_2 = np.zeros_like( inp_arr, dtype=np.int32 )
+    pred_map_1 = np.zeros_like( inp_arr, dtype=np.int8 )
+    cost_map_2, pred_map_2 = None, None
+    if second_best:
+        cost_map_2 = np.zeros_like( inp_arr, dtype=np.float32 )
+        pred_map_2 = np.zeros_like( inp_arr, dtype=np.int8 )
+    seeds, num_seeds = getSeeds( start_pt )
+    seed_map = np.empty_like( inp_arr, dtype=np.int32 ) if return_seeds else None
+    settled = SettledList() if return_settled else None
     #dim_mults = np.flip( dim_mults, 0 ).astype( np.float32 )
     __sp_run_lib.djikstraShortestPath( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        cost_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       cost_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
-                                       pred_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       arrayPointer( cost_map_2, ctypes.c_float ),
+                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                       arrayPointer( pred_map_2, ctypes.c_int8 ),
+                                       arrayPointer( seed_map, ctypes.c_int ),
+                                       None if settled is None else settled.handle,
                                        ctypes.c_int( inp_arr.shape[2] ),
                                        ctypes.c_int( inp_arr.shape[1] ),
                                        ctypes.c_int( inp_arr.shape[0] ),
-                                       start_pt.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       seeds.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       ctypes.c_int( num_seeds ),
                                        ctypes.c_int( idd ),
                                        ctypes.c_float( cost_cutoff ),
-                                       dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) )
+                                       dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                       getQueueType( queue ),
+                                       ctypes.c_int( num_threads ),
+                                       c_progress.getHandle()
                                       )
-    return cost_map_1, cost_map_2, pred_map_1, pred_map_2
+    c_progress.checkCancelled()
+    maps = ( cost_map_1, cost_map_2, pred_map_1, pred_map_2 )
+    if return_seeds:
+        maps += ( seed_map, )
+    if return_settled:
+        maps += ( settled.toArray(), )
+    return maps
 
 
-def shortestPathDirPenalty( inp_arr, rad_arr, start_pt, idd, cost_cutoff, dim_mults, dir_pen ):
+def shortestPathDirPenalty( inp_arr, rad_arr, start_pt, idd, cost_cutoff, dim_mults, dir_pen, queue="heap", second_best=True, return_seeds=False ):
     """
     Given a 3D cost map, return the per voxel shortest path and second shortest path.
     Uses Dijkstra shortest path with direction penalty based on predecessor direction.
 
     :param inp_arr: np.array, 3D cost map
-    :param start_pt: 3-tuple, starting position
+    :param start_pt: 3-tuple or (N,3) array, starting position(s)
     :param idd: Int, Neighborhood definition for node expansion
     :param cost_cutoff: Maximum path cost to evaluate
     :param dim_mults: 3-tuple, ratio of voxel edge-length
     :param dir_pen: Cost multiplier for incongruent direction
-    :return: Cost/Predecessor map for 1st and 2nd shortest path
+    :param queue: String, priority queue of the unvisited nodes, "heap" or "radix". The radix heap is faster,
+                  but settles voxels of equal path cost in a different order, so tied predecessors can differ
+    :param second_best: Bool, compute 2nd shortest path, else its maps are None
+    :param return_seeds: Bool, additionally return map of the start point index claiming each voxel, -1 if unreached
+    :return: Cost/Predecessor map for 1st and 2nd shortest path, predecessors as np.int8 direction codes
     """
     cost_map_1 = np.zeros_like( inp_arr, dtype=np.float32 )
-    pred_map_1 = np.zeros_like( inp_arr, dtype=np.int32 )
-    cost_map_2 = np.zeros_like( inp_arr, dtype=np.float32 )
-    pred_map_2 = np.zeros_like( inp_arr, dtype=np.int32 )
+    pred_map_1 = np.zeros_like( inp_arr, dtype=np.int8 )
+    cost_map_2, pred_map_2 = None, None
+    if second_best:
+        cost_map_2 = np.zeros_like( inp_arr, dtype=np.float32 )
+        pred_map_2 = np.zeros_like( inp_arr, dtype=np.int8 )
+    seeds, num_seeds = getSeeds( start_pt )
+    seed_map = np.empty_like( inp_arr, dtype=np.int32 ) if return_seeds else None
     #dim_mults = np.flip( dim_mults, 0 ).astype( np.float32 )
     __sp_run_lib.djikstraShortestPathDirection( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                                 rad_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                                 cost_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                                cost_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                                pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
-                                                pred_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                arrayPointer( cost_map_2, ctypes.c_float ),
+                                                pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                                arrayPointer( pred_map_2, ctypes.c_int8 ),
+                                                arrayPointer( seed_map, ctypes.c_int ),
                                                 ctypes.c_int( inp_arr.shape[2] ),
                                                 ctypes.c_int( inp_arr.shape[1] ),
                                                 ctypes.c_int( inp_arr.shape[0] ),
-                                                start_pt.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                seeds.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                ctypes.c_int( num_seeds ),
                                                 ctypes.c_int( idd ),
                                                 ctypes.c_float( cost_cutoff ),
                                                 dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                                ctypes.c_float( dir_pen )
+                                                ctypes.c_float( dir_pen ),
+                                                getQueueType( queue ),
+                                                c_progress.getHandle()
                                                )
+    c_progress.checkCancelled()
+    if return_seeds:
+        return cost_map_1, cost_map_2, pred_map_1, pred_map_2, seed_map
     return cost_map_1, cost_map_2, pred_map_1, pred_map_2
 
 
-def shortestPathGapClosing( inp_arr, start_pt, idd, cost_cutoff, dim_mults, gap_per, gap_length ):
+def shortestPathGapClosing( inp_arr, start_pt, idd, cost_cutoff, dim_mults, gap_per, gap_length, queue="heap", second_best=True, return_seeds=False,
+                            return_settled=False ):
     """
     Given a 3D cost map, return the per voxel shortest path and second shortest path.
     Uses Dijkstra shortest path with gap closing modification.
 
     :param inp_arr: np.array, 3D cost map
-    :param start_pt: 3-tuple, starting position
+    :param start_pt: 3-tuple or (N,3) array, starting position(s)
     :param idd: Int, Neighborhood definition for node expansion
     :param cost_cutoff: Maximum path cost to evaluate
     :param dim_mults: 3-tuple, ratio of voxel edge-length
     :param gap_per: Float, minimum cost percentage to be considered gap
     :param gap_length: Int, maximum gap length to bridge
-    :return: Cost/Predecessor map for 1st and 2nd shortest path, 3D volume holding all gaps
+    :param queue: String, priority queue of the unvisited nodes, "radix" or "heap".
+                  Gap reevaluation can lower costs below the last visited node, which the radix heap clamps
+    :param second_best: Bool, compute 2nd shortest path, else its maps are None
+    :param return_seeds: Bool, additionally return map of the start point index claiming each voxel, -1 if unreached
+    :param return_settled: Bool, additionally return the np.int64 indices of all reached voxels in settle order
+    :return: Cost/Predecessor map for 1st and 2nd shortest path, predecessors as np.int8 direction codes,
+             3D volume holding all gaps
     """
     cost_map_1 = np.zeros_like( inp_arr, dtype=np.float32 )
-    pred_map_1 = np.zeros_like( inp_arr, dtype=np.int32 )
-    cost_map_2 = np.zeros_like( inp_arr, dtype=np.float32 )
-    pred_map_2 = np.zeros_like( inp_arr, dtype=np.int32 )
+    pred_map_1 = np.zeros_like( inp_arr, dtype=np.int8 )
+    cost_map_2, pred_map_2 = None, None
+    if second_best:
+        cost_map_2 = np.zeros_like( inp_arr, dtype=np.float32 )
+        pred_map_2 = np.zeros_like( inp_arr, dtype=np.int8 )
+    seeds, num_seeds = getSeeds( start_pt )
+    seed_map = np.empty_like( inp_arr, dtype=np.int32 ) if return_seeds else None
     gap_map = np.full_like( inp_arr, -1, dtype=np.int32 )
+    settled = SettledList() if return_settled else None
     #dim_mults = np.flip( dim_mults, 0 ).astype( np.float32 )
     __sp_run_lib.djikstraGapClosing( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        cost_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       cost_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
-                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
-                                       pred_map_2.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       arrayPointer( cost_map_2, ctypes.c_float ),
+                                       pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                       arrayPointer( pred_map_2, ctypes.c_int8 ),
                                        gap_map.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       arrayPointer( seed_map, ctypes.c_int ),
+                                       None if settled is None else settled.handle,
                                        ctypes.c_int( inp_arr.shape[2] ),
                                        ctypes.c_int( inp_arr.shape[1] ),
                                        ctypes.c_int( inp_arr.shape[0] ),
-                                       start_pt.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       seeds.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                       ctypes.c_int( num_seeds ),
                                        ctypes.c_int( idd ),
                                        ctypes.c_float( cost_cutoff ),
                                        dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
                                        ctypes.c_double( gap_per ),
-                                       ctypes.c_int( gap_length )
+                                       ctypes.c_int( gap_length ),
+                                       getQueueType( queue ),
+                                       c_progress.getHandle()
                                       )
-    return cost_map_1, cost_map_2, pred_map_1, pred_map_2, gap_map
+    c_progress.checkCancelled()
+    maps = ( cost_map_1, cost_map_2, pred_map_1, pred_map_2, gap_map )
+    if return_seeds:
+        maps += ( seed_map, )
+    if return_settled:
+        maps += ( settled.toArray(), )
+    return maps
+
+
+class ShortestPathSearch:
+    """
+    Resumable shortest path, see shortestPath and shortestPathDirPenalty.
+    Keeps the relaxations beyond the cost cutoff, so continueTo can raise the cutoff
+    doing only the additional work. With queue "heap" maps are identical to a new search with the raised cutoff,
+    with "radix" up to the order of equal costs.
+    Maps are updated in place, input arrays are referenced until the search is deleted.
+    """
+    def __init__( self, inp_arr, start_pt, idd, cost_cutoff, dim_mults, rad_arr=None, dir_pen=2.0, queue="heap",
+                  second_best=True, return_seeds=False, record_settled=False ):
+        """
+        :param inp_arr: np.array, 3D cost map
+        :param start_pt: 3-tuple or (N,3) array, starting position(s)
+        :param idd: Int, Neighborhood definition for node expansion
+        :param cost_cutoff: Maximum path cost to evaluate
+        :param dim_mults: 3-tuple, ratio of voxel edge-length
+        :param rad_arr: np.array, 3D radius map for the direction penalty, None for plain shortest path
+        :param dir_pen: Cost multiplier for direction changes, only used with rad_arr
+        :param queue: String, priority queue of the unvisited nodes, "heap" or "radix". The radix heap is faster,
+                      but settles voxels of equal path cost in a different order, so tied predecessors can differ
+        :param second_best: Bool, compute 2nd shortest path, else its maps are None
+        :param return_seeds: Bool, record map of the start point index claiming each voxel, -1 if unreached
+        :param record_settled: Bool, record the settle order of the voxels, see getSettled
+        """
+        self.handle = None
+        self.inp_arr = inp_arr
+        self.rad_arr = rad_arr
+        # Cutoff the maps are complete to, only set once the search was not cancelled
+        self.cost_cutoff = None
+        self.cost_1 = np.zeros_like( inp_arr, dtype=np.float32 )
+        self.pred_1 = np.zeros_like( inp_arr, dtype=np.int8 )
+        self.cost_2, self.pred_2 = None, None
+        if second_best:
+            self.cost_2 = np.zeros_like( inp_arr, dtype=np.float32 )
+            self.pred_2 = np.zeros_like( inp_arr, dtype=np.int8 )
+        self.seed_map = np.empty_like( inp_arr, dtype=np.int32 ) if return_seeds else None
+        self.settled = SettledList() if record_settled else None
+        seeds, num_seeds = getSeeds( start_pt )
+        self.handle = sp_lib.djikstraCreate( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                             arrayPointer( rad_arr, ctypes.c_float ),
+                                             self.cost_1.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                             arrayPointer( self.cost_2, ctypes.c_float ),
+                                             self.pred_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                             arrayPointer( self.pred_2, ctypes.c_int8 ),
+                                             arrayPointer( self.seed_map, ctypes.c_int ),
+                                             None if self.settled is None else self.settled.handle,
+                                             ctypes.c_int( inp_arr.shape[2] ),
+                                             ctypes.c_int( inp_arr.shape[1] ),
+                                             ctypes.c_int( inp_arr.shape[0] ),
+                                             seeds.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                             ctypes.c_int( num_seeds ),
+                                             ctypes.c_int( idd ),
+                                             ctypes.c_float( cost_cutoff ),
+                                             dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                             ctypes.c_float( dir_pen ),
+                                             getQueueType( queue ),
+                                             c_progress.getHandle()
+                                            )
+        c_progress.checkCancelled()
+        self.cost_cutoff = cost_cutoff
+
+    def __del__( self ):
+        if self.handle is not None:
+            sp_lib.djikstraDelete( self.handle )
+            self.handle = None
+
+    def continueTo( self, cost_cutoff ):
+        """
+        Extend the maps to a higher cost cutoff.
+        If cancelled, continuing to the same cutoff finishes the search.
+
+        :param cost_cutoff: New maximum path cost, not lower than the current one
+        """
+        if sp_lib.djikstraContinue( self.handle, cost_cutoff, c_progress.getHandle() ) == -1:
+            raise( RuntimeError( "Cannot continue search from cutoff {0} to lower cutoff {1}".format( self.cost_cutoff, cost_cutoff ) ) )
+        c_progress.checkCancelled()
+        self.cost_cutoff = cost_cutoff
+
+    def getMaps( self ):
+        """
+        :return: Cost/Predecessor map for 1st and 2nd shortest path, as returned by shortestPath
+        """
+        if self.seed_map is not None:
+            return self.cost_1, self.cost_2, self.pred_1, self.pred_2, self.seed_map
+        return self.cost_1, self.cost_2, self.pred_1, self.pred_2
+
+    def getSettled( self ):
+        """
+        :return: np.array, np.int64 indices of all reached voxels in settle order, continued searches appended
+        """
+        if self.settled is None:
+            raise( RuntimeError( "Search was created without record_settled" ) )
+        return self.settled.toArray()
+
+
+class SparsePaths:
+    """
+    Shortest path result restricted to the active voxels of a volume.
+    Cost/Predecessor arrays are compact, holding one entry per active voxel in order of active.
+    """
+    def __init__( self, shape, active, cost_1, cost_2, pred_1, pred_2, seed=None ):
+        self.shape = shape
+        self.active = active
+        self.cost_1 = cost_1
+        self.cost_2 = cost_2
+        self.pred_1 = pred_1
+        self.pred_2 = pred_2
+        self.seed = seed
+
+    def scatter( self, values, fill ):
+        """
+        Scatter compact values to a dense volume
+
+        :param values: np.array, one value per active voxel or None
+        :param fill: Value of inactive voxels
+        :return: np.array of self.shape, None if values is None
+        """
+        if values is None:
+            return None
+        out = np.full( self.shape, fill, dtype=values.dtype )
+        out.reshape( -1 )[self.active] = values
+        return out
+
+    def getCostMap( self, second=False ):
+        """
+        :param second: Bool, return cost map of the 2nd shortest path
+        :return: Dense cost map, inactive voxels hold float max as unreached voxels do
+        """
+        return self.scatter( self.cost_2 if second else self.cost_1, np.finfo( np.float32 ).max )
+
+    def getPredMap( self, second=False ):
+        """
+        :param second: Bool, return predecessor map of the 2nd shortest path
+        :return: Dense predecessor map, inactive voxels hold 0
+        """
+        return self.scatter( self.pred_2 if second else self.pred_1, 0 )
+
+    def getSeedMap( self ):
+        """
+        :return: Dense map of the start point index claiming each voxel, -1 if unreached or inactive, None if not recorded
+        """
+        return self.scatter( self.seed, -1 )
+
+    def toDense( self ):
+        """
+        :return: Dense Cost/Predecessor map for 1st and 2nd shortest path, as returned by shortestPath
+        """
+        return self.getCostMap(), self.getCostMap( True ), self.getPredMap(), self.getPredMap( True )
+
+
+def shortestPathSparse( inp_arr, start_pt, idd, cost_cutoff, dim_mults, threshold=None, rad_arr=None, dir_pen=2.0, queue="heap", second_best=True, return_seeds=False ):
+    """
+    Given a 3D cost map, return the shortest path and second shortest path of all voxels with cost below threshold.
+    Uses Dijkstra shortest path on a compact index of the active voxels, no dense maps are allocated.
+    If rad_arr is given, applies the direction penalty of shortestPathDirPenalty.
+
+    :param inp_arr: np.array, 3D cost map
+    :param start_pt: 3-tuple or (N,3) array, starting position(s)
+    :param idd: Int, Neighborhood definition for node expansion
+    :param cost_cutoff: Maximum path cost to evaluate
+    :param dim_mults: 3-tuple, ratio of voxel edge-length
+    :param threshold: Voxels with cost >= threshold are excluded from the search, defaults to cost_cutoff
+    :param rad_arr: np.array, 3D radius map for direction penalty or None
+    :param dir_pen: Cost multiplier for incongruent direction, only used with rad_arr
+    :param queue: String, priority queue of the unvisited nodes, "heap" or "radix". The radix heap is faster,
+                  but settles voxels of equal path cost in a different order, so tied predecessors can differ
+    :param second_best: Bool, compute 2nd shortest path, else its maps are None
+    :param return_seeds: Bool, record the start point index claiming each active voxel
+    :return: SparsePaths
+    """
+    if threshold is None:
+        threshold = cost_cutoff
+    inp_arr = np.ascontiguousarray( inp_arr, dtype=np.float32 )
+    active = np.flatnonzero( inp_arr < threshold ).astype( np.int64 )
+    cost_map_1 = np.empty( active.size, dtype=np.float32 )
+    pred_map_1 = np.empty( active.size, dtype=np.int8 )
+    cost_map_2, pred_map_2 = None, None
+    if second_best:
+        cost_map_2 = np.empty( active.size, dtype=np.float32 )
+        pred_map_2 = np.empty( active.size, dtype=np.int8 )
+    seeds, num_seeds = getSeeds( start_pt )
+    seed_map = np.empty( active.size, dtype=np.int32 ) if return_seeds else None
+    if rad_arr is not None:
+        rad_arr = np.ascontiguousarray( rad_arr, dtype=np.float32 )
+        rad_ptr = rad_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) )
+    else:
+        rad_ptr = None
+    res = __sp_run_lib.djikstraShortestPathSparse( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                                   rad_ptr,
+                                                   active.ctypes.data_as( ctypes.POINTER( ctypes.c_int64 ) ),
+                                                   ctypes.c_int64( active.size ),
+                                                   cost_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                                   arrayPointer( cost_map_2, ctypes.c_float ),
+                                                   pred_map_1.ctypes.data_as( ctypes.POINTER( ctypes.c_int8 ) ),
+                                                   arrayPointer( pred_map_2, ctypes.c_int8 ),
+                                                   arrayPointer( seed_map, ctypes.c_int ),
+                                                   ctypes.c_int( inp_arr.shape[2] ),
+                                                   ctypes.c_int( inp_arr.shape[1] ),
+                                                   ctypes.c_int( inp_arr.shape[0] ),
+                                                   seeds.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                   ctypes.c_int( num_seeds ),
+                                                   ctypes.c_int( idd ),
+                                                   ctypes.c_float( cost_cutoff ),
+                                                   dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                                   ctypes.c_float( dir_pen ),
+                                                   getQueueType( queue ),
+                                                   c_progress.getHandle()
+                                                  )
+    c_progress.checkCancelled()
+    if res != 0:
+        raise( RuntimeError( "Start point in {0} has cost >= threshold {1}".format( start_pt, threshold ) ) )
+    return SparsePaths( inp_arr.shape, active, cost_map_1, cost_map_2, pred_map_1, pred_map_2, seed_map )
+
+
+def shortestPathBetween( inp_arr, start_pt, end_pt, idd, cost_cutoff, dim_mults, min_cost=None, queue="heap" ):
+    """
+    Cheapest path between two voxels, with the cost model of shortestPath.
+    Uses goal directed A*, only expanding voxels cheaper than the path found.
+
+    :param inp_arr: np.array, 3D cost map
+    :param start_pt: 3-tuple, starting position
+    :param end_pt: 3-tuple, target position
+    :param idd: Int, Neighborhood definition for node expansion
+    :param cost_cutoff: Maximum path cost to evaluate
+    :param dim_mults: 3-tuple, ratio of voxel edge-length
+    :param min_cost: Lower bound of inp_arr, used by the heuristic. Computed if None, pass it for repeated queries
+    :param queue: String, priority queue of the unvisited nodes, "heap" or "radix". The radix heap is faster,
+                  but settles voxels of equal path cost in a different order, so tied predecessors can differ
+    :return: np.array (N,3) path voxels from start_pt to end_pt, path cost. None, None if not reachable
+    """
+    if min_cost is None:
+        min_cost = float( np.min( inp_arr ) )
+    start = np.ascontiguousarray( start_pt, dtype=np.int32 )
+    end = np.ascontiguousarray( end_pt, dtype=np.int32 )
+    dim_mults = np.ascontiguousarray( dim_mults, dtype=np.float32 )
+    path = np.empty( ( 2 *int( np.sum( np.abs( end -start ) ) ) +64, 3 ), dtype=np.int32 )
+    path_cost = ctypes.c_float( 0 )
+    while True:
+        path_len = __sp_run_lib.aStarShortestPath( inp_arr.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                                   ctypes.c_int( inp_arr.shape[2] ),
+                                                   ctypes.c_int( inp_arr.shape[1] ),
+                                                   ctypes.c_int( inp_arr.shape[0] ),
+                                                   start.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                   end.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                   ctypes.c_int( idd ),
+                                                   ctypes.c_float( cost_cutoff ),
+                                                   dim_mults.ctypes.data_as( ctypes.POINTER( ctypes.c_float ) ),
+                                                   ctypes.c_float( min_cost ),
+                                                   getQueueType( queue ),
+                                                   path.ctypes.data_as( ctypes.POINTER( ctypes.c_int ) ),
+                                                   ctypes.c_int( path.shape[0] ),
+                                                   ctypes.byref( path_cost ),
+                                                   c_progress.getHandle()
+                                                  )
+        c_progress.checkCancelled()
+        if path_len == 0:
+            return None, None
+        if path_len <= path.shape[0]:
+            return path[:path_len], path_cost.value
+        path = np.empty( ( path_len, 3 ), dtype=np.int32 )
@@ -9,116 +9,213 @@
 #include "utils.h"
 #include "volume.h"
 #include "fibonacci_heap.h"
+#include "radix_heap.h"
 #include "neighborhood.h"
+#include "neighbor_table.h"
+#include "progress.h"
+#include "index_map.h"
+#include "path_maps.h"
 #include <functional>
 
 #include <queue>
 
-class DjikstraBase
+class DjikstraBase : public PathMaps<DenseIndex>
 {
 public:
   struct Node
   {
-    utils::Coordinate coor;
-    int pred;
-    double cost;
+    size_t idx;
+    float cost;
 
     Node() {}
-    Node( const int& x, const int& y, const int& z, const int& n_pred ) :
-      coor( utils::Coordinate( x,y,z ) ), pred( n_pred ) {}
-    Node( const utils::Coordinate& n_coor, const int& n_pred ) :
-      coor( n_coor ), pred( n_pred ) {}
-
-    Node( const utils::Coordinate& n_coor, const int& n_pred, const double& n_cost ) :
-      coor( n_coor ), pred( n_pred ), cost( n_cost ) {}
-    Node( const Node& other ) :
-      coor( other.coor ), pred( other.pred ), cost( other.cost ) {}
+    Node( const size_t& n_idx, const float& n_cost ) :
+      idx( n_idx ), cost( n_cost ) {}
+  };
+
+  enum QueueType { BINARY_HEAP = 0, RADIX_HEAP = 1 };
+
+  /**
+   * Priority queue of unvisited nodes.
+   * Dispatches to a binary heap or a monotone radix heap.
+   * Costs are non-negative and settled in increasing order. The binary heap settles equal costs by index,
+   * the radix heap in no fixed order, so tied predecessors can differ between both.
+   */
+  class NodeQueue
+  {
+  public:
+    NodeQueue( const QueueType type ) : m_type( type ) {}
+
+    inline bool empty() const
+    {
+      if( m_type == RADIX_HEAP ) return m_radix.empty();
+      return m_heap.empty();
+    }
+
+    inline void push( const Node& node )
+    {
+      if( m_type == RADIX_HEAP ) m_radix.push( node.cost, node );
+      else m_heap.push( node );
+    }
+
+    inline Node pop()
+    {
+      if( m_type == RADIX_HEAP ) return m_radix.pop();
+      Node node( m_heap.top() );
+      m_heap.pop();
+      return node;
+    }
+
+    inline void clear()
+    {
+      m_heap = decltype( m_heap )();
+      m_radix.clear();
+    }
+
+  private:
+    QueueType m_type;
+    std::priority_queue<Node, std::vector<Node>, std::greater<Node> > m_heap;
+    utils::RadixHeap<Node> m_radix;
   };
 
 public:
   DjikstraBase( const Volume& input,
                 Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map, const int idd,
-                const float cost_cutoff, const utils::CoordinateF& mults );
-  ~DjikstraBase();
+                VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map, const int idd,
+                const float cost_cutoff, const utils::CoordinateF& mults,
+                const QueueType queue_type=BINARY_HEAP );
+  virtual ~DjikstraBase();
   void operator()( const utils::Coordinate& start_node );
+  void operator()( const std::vector<utils::Coordinate>& start_nodes );
   void initShortestPath( const utils::Coordinate& start_node );
+  void initShortestPath( const std::vector<utils::Coordinate>& start_nodes );
   void shortestPath();
 
-protected:
-  inline bool nodeVisited( const Node& node ) const
+  /// Append the index of every settled voxel to settled, in the order they are settled
+  inline void setSettledList( std::vector<int64_t>* settled ) { m_settled = settled; }
+
+  /// Report progress to a utils::ProgressHandle, the search throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress = progress; }
+
+  /**
+   * Keep relaxations beyond the cost cutoff, so the search can be continued.
+   * Without second best paths only the cheapest relaxation per voxel is kept.
+   */
+  inline void keepFrontier( const bool keep ) { m_keep_frontier = keep; }
+
+  /**
+   * Continue a search run with keepFrontier to a higher cost cutoff.
+   * With the binary heap maps are identical to a new search with that cutoff, with the radix heap up to the order
+   * of equal costs. False if cost_cutoff is lower than the current one.
+   * A cancelled search stays consistent and is resumed by continuing to the same cutoff.
+   */
+  bool continueTo( const float cost_cutoff );
+  inline float getCostCutoff() const { return m_cost_cutoff; }
+  /// Number of relaxations kept beyond the cost cutoff
+  inline size_t getFrontierSize() const { return m_frontier.size(); }
+
+  /// Start nodes from num_seeds numpy ordered (z,y,x) positions
+  static inline std::vector<utils::Coordinate> seedCoordinates( const int* start_pos, const int num_seeds )
   {
-    return nodeVisited( node.coor );
+    std::vector<utils::Coordinate> seeds;
+    for( int it=0 ; it < num_seeds ; ++it )
+      seeds.push_back( utils::Coordinate( start_pos +3*it ) );
+    return seeds;
   }
-  inline bool nodeVisited( const utils::Coordinate& coor ) const
+
+protected:
+  /// Relaxation rejected by the cost cutoff, with the start node of its origin
+  struct FrontierNode
+  {
+    FrontierNode( const size_t& n_idx, const float& n_cost, const int& n_pred, const int& n_seed )
+      : idx( n_idx ), cost( n_cost ), pred( n_pred ), seed( n_seed ) {}
+
+    size_t idx;
+    float cost;
+    int pred, seed;
+  };
+
+  inline bool nodeVisited( const size_t& idx ) const
   {
-    return m_pred_map_1( coor ) > 0 ;
+    return m_visited[idx];
   }
 
-  inline void visitNode( const utils::Coordinate& coor )
+  inline void visitNode( const size_t& idx )
   {
-    m_pred_map_1( coor ) *= -1;
-    m_pred_map_2( coor ) *= -1;
+    m_visited[idx] = true;
   }
 
-  virtual void updateNeighborhood( const utils::Coordinate& coor, const float& cost ) {};
+  virtual void updateNeighborhood( const size_t& idx, const float& cost ) = 0;
 
 
-  inline void updateNeighbor( const utils::Coordinate& coor, const float& cost, const float& cost_mult, const int& pred )
+  inline void updateNeighbor( const size_t& idx, const float& cost, const float& cost_mult, const int& pred )
   {
-    if( nodeVisited( coor ) )
+    if( nodeVisited( idx ) )
       return;
-    float new_cost = cost + ( m_input( coor ) *cost_mult );
+    float new_cost = cost + ( m_input_data[idx] *cost_mult );
     if( new_cost > m_cost_cutoff )
+    {
+      if( m_keep_frontier )
+        keepRelaxation( idx, new_cost, pred );
       return;
-    //new_cost = coor[0];
-    updateCostMaps( coor, new_cost, pred );
+    }
+    updateCostMaps( idx, new_cost, pred );
   }
 
-  inline void updateCostMaps( const utils::Coordinate& coor, const float& new_cost, const int& pred  )
+  /// Store a relaxation beyond the cutoff, a cheaper one replaces the kept one if only first paths are computed
+  inline void keepRelaxation( const size_t& idx, const float& new_cost, const int& pred )
   {
-    float& cost_2 = m_cost_map_2( coor );
-    float& cost_1 = m_cost_map_1( coor );
-    int& pred_2 = m_pred_map_2( coor );
-    int& pred_1 = m_pred_map_1( coor );
-    if( cost_2 > new_cost )
+    if( m_second_best )
     {
-      if( cost_1 > new_cost )
-      {
-        cost_2 = cost_1;
-        cost_1 = new_cost;
-        pred_2 = pred_1;
-        pred_1 = pred;
-        //m_unvisited_nodes.insert( new_cost, Node( coor, pred ) );
-        m_unvisited_nodes.push( Node( coor, pred, new_cost ) );
-      }
-      else
-      {
-        cost_2 = new_cost;
-        pred_2 = pred;
-      }
+      m_frontier.push_back( FrontierNode( idx, new_cost, pred, m_cur_seed ) );
+      return;
     }
+    size_t& pos = m_frontier_pos[idx];
+    if( pos == 0 )
+    {
+      m_frontier.push_back( FrontierNode( idx, new_cost, pred, m_cur_seed ) );
+      pos = m_frontier.size();
+    }
+    else if( m_frontier[pos-1].cost > new_cost )
+      m_frontier[pos-1] = FrontierNode( idx, new_cost, pred, m_cur_seed );
+  }
+
+  inline void updateCostMaps( const size_t& idx, const float& new_cost, const int& pred  )
+  {
+    if( relax( idx, new_cost, pred ) )
+      m_unvisited_nodes.push( Node( idx, new_cost ) );
   }
 
-  inline void updateNode( const utils::Coordinate& coor, const float& cost )
+  inline void updateNode( const size_t& idx, const float& cost )
   {
-    visitNode( coor );
-    updateNeighborhood( coor, cost );
+    visitNode( idx );
+    if( m_settled != nullptr ) m_settled->push_back( idx );
+    settleSeed( idx );
+    updateNeighborhood( idx, cost );
   }
 
   const Volume &m_input;
   Volume &m_cost_map_1, &m_cost_map_2;
-  VolumeI &m_pred_map_1, &m_pred_map_2;
+  VolumeI8 &m_pred_map_1, &m_pred_map_2;
+  const float* m_input_data;
+  std::vector<bool> m_visited;
+  std::vector<int64_t>* m_settled = nullptr;
+  void* m_progress = nullptr;
+  bool m_keep_frontier = false;
+  std::vector<FrontierNode> m_frontier;
+  /// Position +1 of the kept relaxation of a voxel in m_frontier, only used without second best paths
+  utils::IndexMap<size_t> m_frontier_pos;
   utils::Coordinate m_shape;
-  //utils::FibonacciHeap<Node> m_unvisited_nodes;
-  std::priority_queue<Node, std::vector<Node>, std::greater<Node> > m_unvisited_nodes;
-  size_t m_num_elems;
+  NodeQueue m_unvisited_nodes;
   float m_cost_cutoff;
   utils::NeighborhoodBase* m_neighbor;
-  std::vector<utils::NeighborhoodBase::ModifyNode> m_mod_nodes;
+  utils::NeighborTable* m_table;
 };
 
-inline bool operator>( const DjikstraBase::Node& n1, const DjikstraBase::Node& n2 ) { return n1.cost > n2.cost; }
+/// Equal costs are ordered by index, so the binary heap settles ties in a fixed order
+inline bool operator>( const DjikstraBase::Node& n1, const DjikstraBase::Node& n2 )
+{
+  return n1.cost > n2.cost || ( n1.cost == n2.cost && n1.idx > n2.idx );
+}
 
 
 
@@ -128,18 +225,16 @@ class AdaptedDjikstra : public DjikstraBase
 public:
   AdaptedDjikstra( const Volume& input,
                    Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                   VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map, const int idd,
-                   const float cost_cutoff, const utils::CoordinateF& mults );
+                   VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map, const int idd,
+                   const float cost_cutoff, const utils::CoordinateF& mults,
+                   const QueueType queue_type=BINARY_HEAP );
 
 protected:
-  void updateNeighborhood( const utils::Coordinate& coor, const float& cost ) override
+  void updateNeighborhood( const size_t& idx, const float& cost ) override
   {
-    const size_t vec_size = (*m_neighbor)( coor, m_mod_nodes );
-    for( size_t it=0; it < vec_size ; ++it )
-    {
-      utils::NeighborhoodBase::ModifyNode& cur = m_mod_nodes[it];
-      updateNeighbor( cur.pos, cost, cur.mult, cur.pred );
-    }
+    const utils::NeighborTable::Entry* end = m_table->end( idx );
+    for( const utils::NeighborTable::Entry* cur = m_table->begin( idx ) ; cur != end ; ++cur )
+      updateNeighbor( idx +cur->delta, cost, cur->mult, cur->pred );
   }//TODO reweigh cost based on distance
 };
 
@@ -150,44 +245,21 @@ class AdaptedDjikstraDirectionCost : public DjikstraBase
 public:
   AdaptedDjikstraDirectionCost( const Volume& input, const Volume& rad_map,
                                 Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                                VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map, const int idd,
+                                VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map, const int idd,
                                 const float cost_cutoff, const utils::CoordinateF& mults,
-                                const float dir_penalty_mult );
+                                const float dir_penalty_mult, const QueueType queue_type=BINARY_HEAP );
 
 protected:
-  double compareGradient( const int& cur_pred, const utils::Coordinate& coor ) const
-  {
-    const utils::CoordinateD& cur_grad = m_rad_grads( coor );
-    utils::CoordinateD cur_dir = m_neighbor->getVector( cur_pred );
-    cur_dir.normalize();
-    double w = cur_grad.dotProduct( cur_dir );
-    //if( cur_grad != utils::CoordinateD(0.0,0.0,0.0) ) std::cout << "w=" << w << ", dir=" << cur_dir << ", grad=" << cur_grad << std::endl;
-    return std::abs( std::min( 0.0, w ) );
-  }
-
-
-  double compareDirection( const int& cur_pred, const int& neighbor_pred ) const
-  {
-    const int dot_prod = m_neighbor->comparePredecessors( cur_pred, neighbor_pred );
-    if ( dot_prod < 0 ) return m_dir_penalty_mult;
-    else return 1.0;
-  }
-
-  void updateNeighborhood( const utils::Coordinate& coor, const float& cost ) override
+  /// Nodes are settled once, so the gradient is computed on demand instead of for the whole volume
+  void updateNeighborhood( const size_t& idx, const float& cost ) override
   {
-    const size_t vec_size = (*m_neighbor)( coor, m_mod_nodes );
-    for( size_t it=0; it < vec_size ; ++it )
-    {
-      utils::NeighborhoodBase::ModifyNode& cur = m_mod_nodes[it];
-      double mod = compareDirection( m_pred_map_1( coor ), cur.pred );
-      mod += compareGradient( cur.pred, coor );
-      updateNeighbor( cur.pos, cost *mod, cur.mult, cur.pred );
-    }
+    const utils::CoordinateD cur_grad = m_dir_cost.radiusGradient( idx ).toType<double>();
+    const utils::NeighborTable::Entry* end = m_table->end( idx );
+    for( const utils::NeighborTable::Entry* cur = m_table->begin( idx ) ; cur != end ; ++cur )
+      updateNeighbor( idx +cur->delta, cost *m_dir_cost( m_pred_1[idx], cur->pred, cur_grad ), cur->mult, cur->pred );
   }
 
-  const Volume m_rad_map;
-  float m_dir_penalty_mult;
-  Volume3D m_rad_grads;
+  DirectionCost m_dir_cost;
 };
 
 
@@ -198,78 +270,108 @@ class DjikstraWithGapClosing : public DjikstraBase
 public:
   DjikstraWithGapClosing( const Volume& cost_input,
                           Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                          VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map,
+                          VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map,
                           VolumeI& n_gap_ident, const int idd,
                           const float cost_cutoff, const utils::CoordinateF& mults,
-                          const double cost_part, const int max_gap_length );
+                          const double cost_part, const int max_gap_length,
+                          const QueueType queue_type=BINARY_HEAP );
 
 protected:
-  void updateNeighborhood( const utils::Coordinate& coor, const float& cost ) override
+  void updateNeighborhood( const size_t& idx, const float& cost ) override
   {
-    const size_t vec_size = (*m_neighbor)( coor, m_mod_nodes );
-    for( size_t it=0; it < vec_size ; ++it )
-    {
-      utils::NeighborhoodBase::ModifyNode& cur = m_mod_nodes[it];
-      updateNeighbor( cur.pos, cost, cur.mult, cur.pred, m_gap_range( coor ) );
-    }
+    const int gap_length = m_gap_range[idx];
+    const utils::NeighborTable::Entry* end = m_table->end( idx );
+    for( const utils::NeighborTable::Entry* cur = m_table->begin( idx ) ; cur != end ; ++cur )
+      updateNeighbor( idx +cur->delta, cost, cur->mult, cur->pred, gap_length );
   }
 
 
-  inline void updateNeighbor( const utils::Coordinate& coor, const float& cost, const float& cost_mult, const int& pred, const int& gap_length )
+  inline void updateNeighbor( const size_t& idx, const float& cost, const float& cost_mult, const int& pred, const int& gap_length )
   {
-    if( nodeVisited( coor ) )
+    if( nodeVisited( idx ) )
       return;
-    const float& cur_cost = m_input( coor );
+    const float& cur_cost = m_input_data[idx];
     float edge_cost = cur_cost *cost_mult;
     float new_cost = cost +edge_cost;
-    //std::cout << coor << ": Cost=" << new_cost << ", Coor=" << cur_cost << ", Gap=" << gap_length << std::endl;
+    //std::cout << idx << ": Cost=" << new_cost << ", Coor=" << cur_cost << ", Gap=" << gap_length << std::endl;
     if( cur_cost < m_part_cost )
     {
       if( gap_length > 0 && gap_length <= m_gap_length )
       {
-        m_gap_range( coor ) = gap_length +cost_mult;
-        new_cost = reevaluateGap( coor, cur_cost, pred );
+        m_gap_range[idx] = gap_length +cost_mult;
+        new_cost = reevaluateGap( idx, cur_cost, pred );
         if( new_cost < m_cost_cutoff )
         {
-          m_gap_range( coor ) = 0;
-          updateCostMaps( coor, new_cost, pred );
-          //updateCostMaps( coor, new_cost -(m_part_cost *gap_length), pred );
+          m_gap_range[idx] = 0;
+          updateCostMaps( idx, new_cost, pred );
+          //updateCostMaps( idx, new_cost -(m_part_cost *gap_length), pred );
         }
       }
       else if( new_cost < m_cost_cutoff )
       {
-        m_gap_range( coor ) = 0;
-        updateCostMaps( coor, new_cost, pred );
+        m_gap_range[idx] = 0;
+        updateCostMaps( idx, new_cost, pred );
       }
     }
     else if( gap_length < m_gap_length )
     {
-      const float& gap_r = m_gap_range( coor );
+      const float& gap_r = m_gap_range[idx];
       if( gap_r > gap_length || gap_r == 0 )
-        m_gap_range( coor ) = gap_length +cost_mult;
-      updateCostMaps( coor, new_cost, pred );
+        m_gap_range[idx] = gap_length +cost_mult;
+      updateCostMaps( idx, new_cost, pred );
     }
   }
 
 
-  inline float reevaluateGap( const utils::Coordinate& coor, const float& cost, const int& pred )
+  /// Cost of idx closing a gap: Base cost in front of the gap plus cost for each voxel of the gap
+  inline float reevaluateGap( const size_t& idx, const float& cost, const int& pred )
   {
-    if( m_gap_range(coor) > 0 )
+    if( m_gap_range[idx] <= 0 )
     {
-      const utils::Coordinate pred_coor = (*m_neighbor)( coor, std::abs(pred) );
-      float new_cost = reevaluateGap( pred_coor, cost, m_pred_map_1( pred_coor ) ) +cost;
-      //m_cost_map_1( coor ) = new_cost;
-      m_gap_ident( coor ) = m_gap_ident( pred_coor );
-      return new_cost;
+      if( m_gap_ident[idx] == -1 )
+      {
+        m_gap_ident[idx] = m_gap_it;
+        ++m_gap_it;
+      }
+      return m_cost_1[idx];
     }
-    else
+    const size_t pred_idx = m_table->predecessor( idx, std::abs(pred) );
+    resolveGap( pred_idx );
+    m_gap_ident[idx] = m_gap_ident[pred_idx];
+    return m_gap_base[pred_idx] +cost *float( m_gap_depth[pred_idx] +1 );
+  }
+
+
+  /**
+   * Walks back from idx along the 1st predecessors to the first voxel outside of a gap.
+   * Visited voxels do not change anymore, so base cost, gap depth and gap id are stored
+   * for each voxel on the way and every gap is only walked once.
+   */
+  inline void resolveGap( const size_t& idx )
+  {
+    size_t cur_idx = idx;
+    m_gap_chain.clear();
+    while( m_gap_depth[cur_idx] < 0 && m_gap_range[cur_idx] > 0 )
     {
-      if( m_gap_ident( coor ) == -1 )
+      m_gap_chain.push_back( cur_idx );
+      cur_idx = m_table->predecessor( cur_idx, std::abs( m_pred_1[cur_idx] ) );
+    }
+    if( m_gap_depth[cur_idx] < 0 )
+    {
+      if( m_gap_ident[cur_idx] == -1 )
       {
-        m_gap_ident( coor ) = m_gap_it;
+        m_gap_ident[cur_idx] = m_gap_it;
         ++m_gap_it;
       }
-      return m_cost_map_1( coor );
+      m_gap_depth[cur_idx] = 0;
+      m_gap_base[cur_idx] = m_cost_1[cur_idx];
+    }
+    for( auto it = m_gap_chain.rbegin() ; it != m_gap_chain.rend() ; ++it )
+    {
+      m_gap_depth[*it] = m_gap_depth[cur_idx] +1;
+      m_gap_base[*it] = m_gap_base[cur_idx];
+      m_gap_ident[*it] = m_gap_ident[cur_idx];
+      cur_idx = *it;
     }
   }
 
@@ -280,6 +382,10 @@ protected:
 
   int m_gap_it = 0;
   VolumeI &m_gap_ident;
+  // Resolved gaps of visited voxels, depth -1 if not resolved yet
+  VolumeI m_gap_depth;
+  Volume m_gap_base;
+  std::vector<size_t> m_gap_chain;
 };
 
 
@@ -289,12 +395,12 @@ class DjikstraWithVelocity : public DjikstraBase
 public:
   DjikstraWithVelocity( const Volume& cost_input,
                         Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                        VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map,
+                        VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map,
                         const int idd, const float cost_cutoff, const utils::CoordinateF& mults,
                         const double cost_part, const int max_gap_length );
 
 protected:
-  void updateNeighborhood( const utils::Coordinate& coor, const float& cost ) override;
+  void updateNeighborhood( const size_t& idx, const float& cost ) override;
 
 };
 
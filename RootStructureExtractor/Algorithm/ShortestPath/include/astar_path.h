@@ -0,0 +1,69 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef ASTAR_PATH_H__
+#define ASTAR_PATH_H__
+
+#include "adapted_djikstra.h"
+#include <algorithm>
+#include <cstdint>
+
+/**
+ * Point to point shortest path with the cost model of AdaptedDjikstra.
+ * Goal directed A* search, labels are only reset for the voxels touched by the previous query.
+ * The heuristic bounds the remaining cost per axis: reaching the goal needs at least |d_a| steps along axis a,
+ * each costing at least min_cost times the smallest step multiplier moving along a.
+ * The maximum over the axes is consistent, so every node is settled once.
+ */
+class AStarPath
+{
+public:
+  typedef DjikstraBase::Node Node;
+
+  AStarPath( const Volume& input, const int idd, const float cost_cutoff,
+             const utils::CoordinateF& mults, const float min_cost,
+             const DjikstraBase::QueueType queue_type=DjikstraBase::BINARY_HEAP );
+  ~AStarPath();
+
+  /// Report progress to a utils::ProgressHandle, the search throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress = progress; }
+
+  /// False if goal is not reachable within the cost cutoff
+  bool operator()( const utils::Coordinate& start, const utils::Coordinate& goal );
+
+  /// Path from start to goal of the last successful search
+  inline const std::vector<utils::Coordinate>& getPath() const { return m_path; }
+  inline float getCost() const { return m_cost; }
+  /// Number of settled nodes of the last search
+  inline size_t getNumSettled() const { return m_num_settled; }
+
+protected:
+  inline float heuristic( const utils::Coordinate& pos ) const
+  {
+    float h = 0.f;
+    for( size_t axis=0 ; axis < 3 ; ++axis )
+      h = std::max( h, std::abs( m_goal[axis] -pos[axis] ) *m_axis_cost[axis] );
+    return h;
+  }
+
+  void tracePath( const size_t& start_idx, const size_t& goal_idx );
+
+  const float* m_input_data;
+  utils::Coordinate m_shape, m_goal;
+  float m_cost_cutoff, m_cost;
+  std::array<float, 3> m_axis_cost;
+  DjikstraBase::NodeQueue m_unvisited_nodes;
+  std::vector<float> m_cost_map;
+  std::vector<int8_t> m_pred_map;
+  std::vector<bool> m_visited;
+  std::vector<size_t> m_touched;
+  std::vector<utils::Coordinate> m_path;
+  size_t m_num_settled;
+  void* m_progress = nullptr;
+  utils::NeighborhoodBase* m_neighbor;
+  utils::NeighborTable* m_table;
+};
+
+#endif // ASTAR_PATH_H__
@@ -0,0 +1,143 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef PARALLEL_DJIKSTRA_H__
+#define PARALLEL_DJIKSTRA_H__
+
+#include "adapted_djikstra.h"
+#include <atomic>
+#include <condition_variable>
+#include <map>
+#include <mutex>
+#include <thread>
+
+/**
+ * Multithreaded version of AdaptedDjikstra using delta-stepping.
+ * Costs are settled bucket by bucket, bucket i holding costs in [i*delta, (i+1)*delta),
+ * the nodes of a bucket are relaxed in parallel until it stays empty.
+ * Relaxations are label correcting, so the cost map converges to the same floats as the sequential search.
+ * Predecessors and 2nd shortest paths are assigned afterwards, emulating the settle order
+ * of the sequential search with binary heap: By cost, equal costs ordered by index.
+ * Costs holding nodes only reachable over equal cost nodes are replayed in the order the sequential search discovers them.
+ */
+class ParallelDjikstra
+{
+public:
+  ParallelDjikstra( const Volume& input,
+                    float* cost_1, float* cost_2, int8_t* pred_1, int8_t* pred_2,
+                    const int idd, const float cost_cutoff, const utils::CoordinateF& mults,
+                    const size_t num_threads );
+  ~ParallelDjikstra();
+  void operator()( const std::vector<utils::Coordinate>& start_nodes );
+
+  /// Record per voxel the index of the start node claiming it, -1 if unreached
+  inline void setSeedMap( int* seed_map ) { m_seed_map = seed_map; }
+
+  /// Report progress to a utils::ProgressHandle, throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress_handle = progress; }
+
+protected:
+  struct Entry
+  {
+    Entry( const size_t& n_idx, const float& n_cost ) : idx( n_idx ), cost( n_cost ) {}
+    size_t idx;
+    float cost;
+  };
+
+  /// Reusable barrier for the worker threads
+  class Barrier
+  {
+  public:
+    Barrier( const size_t num_threads ) : m_num_threads( num_threads ) {}
+
+    inline void wait()
+    {
+      std::unique_lock<std::mutex> lock( m_mutex );
+      const size_t generation = m_generation;
+      if( ++m_waiting == m_num_threads )
+      {
+        m_waiting = 0;
+        ++m_generation;
+        m_cond.notify_all();
+        return;
+      }
+      m_cond.wait( lock, [this, generation]{ return generation != m_generation; } );
+    }
+
+  private:
+    std::mutex m_mutex;
+    std::condition_variable m_cond;
+    size_t m_num_threads, m_waiting = 0, m_generation = 0;
+  };
+
+  /// Lower cost of idx to new_cost, true if it was higher
+  static inline bool atomicMin( float* cost, const float& new_cost )
+  {
+    float cur;
+    __atomic_load( cost, &cur, __ATOMIC_RELAXED );
+    while( new_cost < cur )
+      if( __atomic_compare_exchange( cost, &cur, const_cast<float*>( &new_cost ), true, __ATOMIC_RELAXED, __ATOMIC_RELAXED ) )
+        return true;
+    return false;
+  }
+
+  inline size_t bucketId( const float& cost ) const
+  {
+    return size_t( std::min( double( cost ) /m_delta, 1e18 ) );
+  }
+
+  /// Settle order of the sequential search
+  inline bool settledBefore( const size_t& u_idx, const size_t& v_idx ) const
+  {
+    const float d_u = m_cost_1[u_idx], d_v = m_cost_1[v_idx];
+    if( d_u != d_v ) return d_u < d_v;
+    if( !m_plateau_rank.empty() && m_plateau_rank[u_idx] != m_plateau_rank[v_idx] ) return m_plateau_rank[u_idx] < m_plateau_rank[v_idx];
+    return u_idx < v_idx;
+  }
+
+  static inline float atomicLoad( float* cost )
+  {
+    float cur;
+    __atomic_load( cost, &cur, __ATOMIC_RELAXED );
+    return cur;
+  }
+
+  void worker( const size_t t_id );
+  void relaxNode( const size_t t_id, const Entry& node );
+  bool collectFrontier();
+  void buildInEntries();
+  void assignPredecessors( const size_t z_begin, const size_t z_end );
+  void computePlateauOrder();
+  void assignSeeds();
+
+  const float* m_input_data;
+  float *m_cost_1, *m_cost_2;
+  int8_t *m_pred_1, *m_pred_2;
+  bool m_second_best;
+  int* m_seed_map = nullptr;
+  void* m_progress_handle = nullptr;
+  utils::Progress* m_progress = nullptr;
+  utils::Coordinate m_shape;
+  size_t m_num_elems, m_num_threads;
+  float m_cost_cutoff;
+  double m_delta;
+  utils::NeighborhoodBase* m_neighbor;
+  utils::NeighborTable* m_table;
+
+  // Delta stepping state
+  Barrier m_barrier;
+  std::vector<std::map<size_t, std::vector<Entry>>> m_buckets;
+  std::vector<Entry> m_frontier;
+  std::atomic<size_t> m_frontier_pos;
+  size_t m_cur_bucket;
+  bool m_done;
+
+  // Predecessor assignment state
+  std::array<std::vector<const utils::NeighborTable::Entry*>, 64*27> m_in_entries;
+  std::vector<uint8_t> m_resolved;
+  std::vector<uint32_t> m_plateau_rank;
+};
+
+#endif // PARALLEL_DJIKSTRA_H__
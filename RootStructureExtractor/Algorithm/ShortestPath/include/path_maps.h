@@ -0,0 +1,206 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef PATH_MAPS_H__
+#define PATH_MAPS_H__
+
+#include "utils.h"
+#include "volume.h"
+#include "neighborhood.h"
+#include "neighbor_table.h"
+#include <algorithm>
+#include <cstdint>
+#include <limits>
+#include <utility>
+#include <vector>
+
+/// Index mapping of dense maps, every voxel is its own entry
+class DenseIndex
+{
+public:
+  DenseIndex( const size_t& num_elems ) : m_num_elems( num_elems ) {}
+
+  inline long find( const size_t& idx ) const { return long( idx ); }
+  inline size_t size() const { return m_num_elems; }
+
+private:
+  size_t m_num_elems;
+};
+
+
+/**
+ * Cost and predecessor maps of a shortest path search, with the relaxation shared by the dense and sparse searches.
+ * Entries are addressed by id, _Index::find gives the id of a linear voxel index or -1 if the voxel has no entry,
+ * _Index::size the number of entries.
+ * The maps of the 2nd shortest path are only used if both are given.
+ */
+template<class _Index>
+class PathMaps
+{
+public:
+  PathMaps( _Index index, float* cost_1, float* cost_2, int8_t* pred_1, int8_t* pred_2 )
+    : m_index( std::move( index ) ), m_num_entries( m_index.size() ),
+      m_cost_1( cost_1 ), m_cost_2( cost_2 ),
+      m_pred_1( pred_1 ), m_pred_2( pred_2 ),
+      m_second_best( cost_2 != nullptr && pred_2 != nullptr )
+  {
+  }
+
+  /// Record per entry the index of the start node claiming it, -1 if unreached
+  inline void setSeedMap( int* seed_map ) { m_seed_map = seed_map; }
+
+protected:
+  /// Reset all entries to unreached
+  void resetMaps()
+  {
+    std::fill_n( m_cost_1, m_num_entries, std::numeric_limits<float>::max() );
+    std::fill_n( m_pred_1, m_num_entries, 0 );
+    if( m_second_best )
+    {
+      std::fill_n( m_cost_2, m_num_entries, std::numeric_limits<float>::max() );
+      std::fill_n( m_pred_2, m_num_entries, 0 );
+    }
+    if( m_seed_map != nullptr )
+      std::fill_n( m_seed_map, m_num_entries, -1 );
+  }
+
+  /**
+   * Set the entries of the start nodes to cost 0, a voxel given twice stays with its first start node.
+   * Appends the ids to queue to start_ids, false if a start node has no entry.
+   */
+  bool initStartNodes( const std::vector<utils::Coordinate>& start_nodes, const utils::NeighborTable& table,
+                       std::vector<size_t>& start_ids )
+  {
+    for( size_t seed_it=0 ; seed_it < start_nodes.size() ; ++seed_it )
+    {
+      const long start_id = m_index.find( table.getIndex( start_nodes[seed_it] ) );
+      if( start_id < 0 )
+        return false;
+      if( m_pred_1[start_id] == 70 ) // Duplicate seed
+        continue;
+      start_ids.push_back( start_id );
+      m_pred_1[start_id] = 70;
+      m_cost_1[start_id] = 0;
+      if( m_second_best )
+      {
+        m_pred_2[start_id] = 70;
+        m_cost_2[start_id] = 0;
+      }
+      if( m_seed_map != nullptr )
+        m_seed_map[start_id] = seed_it;
+    }
+    return true;
+  }
+
+  /// Take over the start node of entry id for the relaxations of its neighbors
+  inline void settleSeed( const size_t& id )
+  {
+    if( m_seed_map != nullptr ) m_cur_seed = m_seed_map[id];
+  }
+
+  /**
+   * Relax entry id to new_cost, reached in neighbor direction pred.
+   * True if its 1st path improved, the entry then has to be queued.
+   */
+  inline bool relax( const size_t& id, const float& new_cost, const int& pred )
+  {
+    float& cost_1 = m_cost_1[id];
+    if( !m_second_best )
+    {
+      if( cost_1 <= new_cost )
+        return false;
+      cost_1 = new_cost;
+      m_pred_1[id] = -pred;
+      if( m_seed_map != nullptr ) m_seed_map[id] = m_cur_seed;
+      return true;
+    }
+    float& cost_2 = m_cost_2[id];
+    int8_t& pred_2 = m_pred_2[id];
+    int8_t& pred_1 = m_pred_1[id];
+    if( cost_2 <= new_cost )
+      return false;
+    if( cost_1 > new_cost )
+    {
+      cost_2 = cost_1;
+      cost_1 = new_cost;
+      pred_2 = pred_1;
+      pred_1 = -pred;
+      if( m_seed_map != nullptr ) m_seed_map[id] = m_cur_seed;
+      return true;
+    }
+    cost_2 = new_cost;
+    pred_2 = -pred;
+    return false;
+  }
+
+  _Index m_index;
+  size_t m_num_entries;
+  float *m_cost_1, *m_cost_2;
+  int8_t *m_pred_1, *m_pred_2;
+  bool m_second_best;
+  int* m_seed_map = nullptr;
+  int m_cur_seed = -1;
+};
+
+
+/**
+ * Direction cost of AdaptedDjikstraDirectionCost, shared by the dense and sparse searches.
+ * Steps turning back against the predecessor direction are weighted by the direction penalty,
+ * steps against the radius gradient additionally by its component along the step.
+ */
+class DirectionCost
+{
+public:
+  DirectionCost( const Volume& rad_map, const utils::NeighborhoodBase& neighbor, const utils::NeighborTable& table,
+                 const float dir_penalty_mult )
+    : m_rad_map( rad_map ), m_neighbor( neighbor ), m_table( table ),
+      m_shape( rad_map.getShape() ), m_dir_penalty_mult( dir_penalty_mult )
+  {
+  }
+
+  /// Central difference of the radius map at idx, zero at the volume border
+  inline utils::CoordinateF radiusGradient( const size_t& idx ) const
+  {
+    const utils::Coordinate pos = m_table.getCoordinate( idx );
+    for( size_t axis=0 ; axis < 3 ; ++axis )
+      if( pos[axis] < 1 || pos[axis] >= m_shape[axis]-1 )
+        return utils::CoordinateF( 0.f,0.f,0.f );
+    const float* rad = m_rad_map.getData();
+    const size_t y_step = m_shape[0], z_step = y_step *m_shape[1];
+    return utils::CoordinateF( 0.5f*( rad[idx+1] -rad[idx-1] ),
+                               0.5f*( rad[idx+y_step] -rad[idx-y_step] ),
+                               0.5f*( rad[idx+z_step] -rad[idx-z_step] ) );
+  }
+
+  /// Cost factor of a step in direction neighbor_pred, from a voxel reached by cur_pred with radius gradient cur_grad
+  inline double operator()( const int& cur_pred, const int& neighbor_pred, const utils::CoordinateD& cur_grad ) const
+  {
+    return compareDirection( cur_pred, neighbor_pred ) +compareGradient( neighbor_pred, cur_grad );
+  }
+
+private:
+  inline double compareGradient( const int& cur_pred, const utils::CoordinateD& cur_grad ) const
+  {
+    utils::CoordinateD cur_dir = m_neighbor.getVector( cur_pred );
+    cur_dir.normalize();
+    double w = cur_grad.dotProduct( cur_dir );
+    return std::abs( std::min( 0.0, w ) );
+  }
+
+  inline double compareDirection( const int& cur_pred, const int& neighbor_pred ) const
+  {
+    const int dot_prod = m_neighbor.comparePredecessors( cur_pred, neighbor_pred );
+    if ( dot_prod < 0 ) return m_dir_penalty_mult;
+    else return 1.0;
+  }
+
+  const Volume& m_rad_map;
+  const utils::NeighborhoodBase& m_neighbor;
+  const utils::NeighborTable& m_table;
+  utils::Coordinate m_shape;
+  float m_dir_penalty_mult;
+};
+
+#endif // PATH_MAPS_H__
@@ -0,0 +1,101 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef RADIX_HEAP_H__
+#define RADIX_HEAP_H__
+
+#include <array>
+#include <vector>
+#include <cstdint>
+#include <cstring>
+
+namespace utils {
+
+/**
+ * Monotone radix heap for non-negative float keys.
+ * Positive IEEE floats keep their order when compared as unsigned bit patterns,
+ * so entries are bucketed by the highest bit differing from the last extracted key.
+ * Each entry is moved at most 32 times, independent of the number of entries.
+ * Keys below the last extracted key are clamped to it, i.e. extracted next.
+ */
+template<class _Tp>
+class RadixHeap
+{
+public:
+  RadixHeap() : m_last( 0 ), m_size( 0 ) {}
+
+  inline bool empty() const { return m_size == 0; }
+  inline size_t size() const { return m_size; }
+
+  inline void push( const float key, const _Tp& val )
+  {
+    uint32_t bits = toBits( key );
+    if( bits < m_last ) bits = m_last;
+    m_buckets[bucketId( bits )].push_back( Entry( bits, val ) );
+    ++m_size;
+  }
+
+  inline _Tp pop()
+  {
+    if( m_buckets[0].empty() )
+      redistribute();
+    _Tp val = m_buckets[0].back().val;
+    m_buckets[0].pop_back();
+    --m_size;
+    return val;
+  }
+
+  inline void clear()
+  {
+    for( std::vector<Entry>& bucket : m_buckets )
+      bucket.clear();
+    m_last = 0;
+    m_size = 0;
+  }
+
+private:
+  struct Entry
+  {
+    Entry( const uint32_t& n_key, const _Tp& n_val ) : key( n_key ), val( n_val ) {}
+    uint32_t key;
+    _Tp val;
+  };
+
+  static inline uint32_t toBits( const float key )
+  {
+    if( !( key > 0.f ) ) return 0;
+    uint32_t bits;
+    std::memcpy( &bits, &key, sizeof( bits ) );
+    return bits;
+  }
+
+  inline size_t bucketId( const uint32_t bits ) const
+  {
+    if( bits == m_last ) return 0;
+    return 32 -__builtin_clz( bits ^m_last );
+  }
+
+  inline void redistribute()
+  {
+    size_t b_it = 1;
+    while( m_buckets[b_it].empty() ) ++b_it;
+    std::vector<Entry>& bucket = m_buckets[b_it];
+    uint32_t new_last = bucket[0].key;
+    for( const Entry& entry : bucket )
+      if( entry.key < new_last ) new_last = entry.key;
+    m_last = new_last;
+    for( const Entry& entry : bucket )
+      m_buckets[bucketId( entry.key )].push_back( entry );
+    bucket.clear();
+  }
+
+  std::array<std::vector<Entry>, 33> m_buckets;
+  uint32_t m_last;
+  size_t m_size;
+};
+
+}
+
+#endif // RADIX_HEAP_H__
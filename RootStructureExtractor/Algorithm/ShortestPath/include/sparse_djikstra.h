@@ -0,0 +1,101 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef SPARSE_DJIKSTRA_H__
+#define SPARSE_DJIKSTRA_H__
+
+#include "adapted_djikstra.h"
+#include <cstdint>
+#include <algorithm>
+
+/**
+ * Compact index of the active voxels of a volume.
+ * Active voxels are given as sorted linear indices, rows along x are indexed by (y,z),
+ * so finding the compact id of a voxel is a binary search within its row.
+ */
+class ActiveIndex
+{
+public:
+  ActiveIndex( const int64_t* active, const size_t& num_active, const utils::Coordinate& shape )
+    : m_active( active ), m_num_active( num_active ), m_x_dim( shape[0] ),
+      m_row_start( size_t( shape[1] ) *shape[2] +1, 0 )
+  {
+    for( size_t it=0 ; it < num_active ; ++it )
+      ++m_row_start[active[it] /m_x_dim +1];
+    for( size_t row=1 ; row < m_row_start.size() ; ++row )
+      m_row_start[row] += m_row_start[row-1];
+  }
+
+  /// Compact id of linear index idx, -1 if idx is not active
+  inline long find( const size_t& idx ) const
+  {
+    const size_t row = idx /m_x_dim;
+    const int64_t* begin = m_active +m_row_start[row];
+    const int64_t* end = m_active +m_row_start[row+1];
+    const int64_t* it = std::lower_bound( begin, end, int64_t( idx ) );
+    if( it == end || *it != int64_t( idx ) ) return -1;
+    return it -m_active;
+  }
+
+  inline size_t operator[]( const size_t& c_id ) const { return m_active[c_id]; }
+  inline size_t size() const { return m_num_active; }
+
+private:
+  const int64_t* m_active;
+  size_t m_num_active, m_x_dim;
+  std::vector<size_t> m_row_start;
+};
+
+
+/**
+ * Dijkstra restricted to the active voxels of a volume.
+ * Cost and predecessor maps are compact, one entry per active voxel. The maps of the 2nd shortest path may be nullptr.
+ * Optionally applies the direction cost of AdaptedDjikstraDirectionCost, if a radius map is given.
+ */
+class SparseDjikstra : public PathMaps<ActiveIndex>
+{
+public:
+  typedef DjikstraBase::Node Node;
+
+  SparseDjikstra( const Volume& input, ActiveIndex active,
+                  float* cost_1, float* cost_2, int8_t* pred_1, int8_t* pred_2,
+                  const int idd, const float cost_cutoff, const utils::CoordinateF& mults,
+                  const DjikstraBase::QueueType queue_type=DjikstraBase::BINARY_HEAP,
+                  const Volume* rad_map=nullptr, const float dir_penalty_mult=1.0 );
+  ~SparseDjikstra();
+  /// False if a start node is not active
+  bool operator()( const std::vector<utils::Coordinate>& start_nodes );
+
+  /// Report progress to a utils::ProgressHandle, the search throws utils::Cancelled if cancelled
+  inline void setProgress( void* progress ) { m_progress = progress; }
+
+protected:
+  inline bool nodeVisited( const size_t& c_id ) const { return m_visited[c_id]; }
+
+  inline void visitNode( const size_t& c_id ) { m_visited[c_id] = true; }
+
+  void updateNeighborhood( const size_t& c_id, const float& cost );
+
+  inline void updateNeighbor( const size_t& c_id, const size_t& idx, const float& cost, const float& cost_mult, const int& pred )
+  {
+    if( nodeVisited( c_id ) )
+      return;
+    float new_cost = cost + ( m_input_data[idx] *cost_mult );
+    if( new_cost <= m_cost_cutoff && relax( c_id, new_cost, pred ) )
+      m_unvisited_nodes.push( Node( c_id, new_cost ) );
+  }
+
+  const float* m_input_data;
+  std::vector<bool> m_visited;
+  void* m_progress = nullptr;
+  utils::Coordinate m_shape;
+  DjikstraBase::NodeQueue m_unvisited_nodes;
+  float m_cost_cutoff;
+  utils::NeighborhoodBase* m_neighbor;
+  utils::NeighborTable* m_table;
+  DirectionCost* m_dir_cost = nullptr;
+};
+
+#endif // SPARSE_DJIKSTRA_H__
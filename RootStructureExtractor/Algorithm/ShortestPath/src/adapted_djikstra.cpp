@@ -4,26 +4,32 @@
  */
 
 #include "adapted_djikstra.h"
+#include "parallel_djikstra.h"
 #include <vector>
 
 DjikstraBase::DjikstraBase( const Volume& input,
                                   Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                                  VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map, const int idd,
-                                  const float cost_cutoff, const utils::CoordinateF& mults )
-: m_input( input ),
+                                  VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map, const int idd,
+                                  const float cost_cutoff, const utils::CoordinateF& mults,
+                                  const QueueType queue_type )
+: PathMaps<DenseIndex>( DenseIndex( input.getSize() ),
+                         n_1st_cost_map.getData(), n_2nd_cost_map.getData(),
+                         n_1st_pred_map.getData(), n_2nd_pred_map.getData() ),
+  m_input( input ),
   m_cost_map_1( n_1st_cost_map ), m_cost_map_2( n_2nd_cost_map ),
   m_pred_map_1( n_1st_pred_map ), m_pred_map_2( n_2nd_pred_map ),
+  m_input_data( input.getData() ),
+  m_unvisited_nodes( queue_type ),
   m_cost_cutoff( cost_cutoff )
 {
   m_shape = m_input.getShape();
-  m_num_elems = m_input.getSize();
   if( idd == 1 ) m_neighbor = new utils::NeighborhoodID1( m_shape, mults );
   else if( idd == 2 ) m_neighbor = new utils::NeighborhoodID2( m_shape, mults );
   else if( idd == 3 ) m_neighbor = new utils::NeighborhoodID3( m_shape, mults );
-  m_mod_nodes.resize( m_neighbor->getMaxSize() ); // TODO
+  m_table = new utils::NeighborTable( *m_neighbor, m_shape );
 }
 
-DjikstraBase::~DjikstraBase() { delete m_neighbor; }
+DjikstraBase::~DjikstraBase() { delete m_table; delete m_neighbor; }
 
 
 void DjikstraBase::operator()( const utils::Coordinate& start_node )
@@ -32,69 +38,132 @@ void DjikstraBase::operator()( const utils::Coordinate& start_node )
   shortestPath();
 }
 
+void DjikstraBase::operator()( const std::vector<utils::Coordinate>& start_nodes )
+{
+  initShortestPath( start_nodes );
+  shortestPath();
+}
+
 void DjikstraBase::initShortestPath( const utils::Coordinate& start_node )
 {
-  m_cost_map_1.fill( std::numeric_limits<float>::max() );
-  m_cost_map_2.fill( std::numeric_limits<float>::max() );
-  m_pred_map_1.fill( 0 );
-  m_pred_map_2.fill( 0 );
+  initShortestPath( std::vector<utils::Coordinate>( 1, start_node ) );
+}
 
-  //m_unvisited_nodes.insert( 0, Node( start_node, 0 ) );
-  m_unvisited_nodes.push( Node( start_node, 0, 0 ) );
-  m_pred_map_1( start_node ) = -70;
-  m_pred_map_2( start_node ) = -70;
-  m_cost_map_1( start_node ) = 0;
-  m_cost_map_2( start_node ) = 0;
+void DjikstraBase::initShortestPath( const std::vector<utils::Coordinate>& start_nodes )
+{
+  resetMaps();
+  m_visited.assign( m_num_entries, false );
+  m_frontier.clear();
+  m_frontier_pos = utils::IndexMap<size_t>();
+  std::vector<size_t> start_ids;
+  initStartNodes( start_nodes, *m_table, start_ids );
+  for( const size_t& start_id : start_ids )
+    m_unvisited_nodes.push( Node( start_id, 0 ) );
 }
 
 
 void DjikstraBase::shortestPath()
 {
-  int run_it = 0, step_s = m_num_elems/1000;
-  std::cout << "0" << "/" << m_num_elems;
+  size_t run_it = 0;
+  utils::Progress progress( m_progress, "Shortest path", m_num_entries );
   //while( !m_unvisited_nodes.isEmpty() )
   while( !m_unvisited_nodes.empty() )
   {
-    Node curr_node( m_unvisited_nodes.top() );
     //float cost = m_unvisited_nodes.extractMin( curr_node );
-    m_unvisited_nodes.pop();
-    if( !nodeVisited( curr_node ) )
+    Node curr_node( m_unvisited_nodes.pop() );
+    if( !nodeVisited( curr_node.idx ) )
     {
-      updateNode( curr_node.coor, curr_node.cost );
-      ++run_it;
-      if( (run_it % step_s) == 0 )
-        std::cout << "\r" << run_it << "/" << m_num_elems;
+      updateNode( curr_node.idx, curr_node.cost );
+      progress.update( ++run_it );
     }
   }
-  std::cout << "\r" << m_num_elems << "/" << m_num_elems << std::endl;
+  progress.finish();
+}
+
+
+bool DjikstraBase::continueTo( const float cost_cutoff )
+{
+  if( cost_cutoff < m_cost_cutoff )
+    return false;
+  m_cost_cutoff = cost_cutoff;
+  // All settled nodes are cheaper than the kept relaxations, apply these in their original order
+  std::vector<FrontierNode> remaining;
+  for( const FrontierNode& node : m_frontier )
+  {
+    if( node.cost > m_cost_cutoff )
+      remaining.push_back( node );
+    else
+    {
+      m_cur_seed = node.seed;
+      updateCostMaps( node.idx, node.cost, node.pred );
+    }
+  }
+  m_frontier.swap( remaining );
+  m_frontier_pos = utils::IndexMap<size_t>( m_second_best ? 0 : m_frontier.size() );
+  if( !m_second_best )
+    for( size_t f_it=0; f_it < m_frontier.size() ; ++f_it )
+      m_frontier_pos[m_frontier[f_it].idx] = f_it +1;
+  shortestPath();
+  return true;
 }
 
 
 AdaptedDjikstra::AdaptedDjikstra( const Volume& input,
                                   Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                                  VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map, const int idd,
-                                  const float cost_cutoff, const utils::CoordinateF& mults )
+                                  VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map, const int idd,
+                                  const float cost_cutoff, const utils::CoordinateF& mults,
+                                  const QueueType queue_type )
 : DjikstraBase( input, n_1st_cost_map, n_2nd_cost_map,
                 n_1st_pred_map, n_2nd_pred_map,
-                idd, cost_cutoff, mults )
+                idd, cost_cutoff, mults, queue_type )
 {
 }
 
 
 extern "C" int djikstraShortestPath( float* input, float* cost_map_1, float* cost_map_2,
-                                     int* pred_map_1, int* pred_map_2,
-                                     int x_dim, int y_dim, int z_dim, int* start_pos, int idd,
-                                     float cost_cutoff, float* dim_mults )
+                                     int8_t* pred_map_1, int8_t* pred_map_2, int* seed_map, void* settled,
+                                     int x_dim, int y_dim, int z_dim, int* start_pos, int num_seeds, int idd,
+                                     float cost_cutoff, float* dim_mults, int queue_type, int num_threads,
+                                     void* progress )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor(start_pos);
+  const std::vector<utils::Coordinate> seeds = DjikstraBase::seedCoordinates( start_pos, num_seeds );
   Volume v_input( input, shape ), v_cost_1( cost_map_1, shape ), v_cost_2( cost_map_2, shape );
-  VolumeI v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
+  VolumeI8 v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
 
   std::cout << "Input shape: " << shape << std::endl;
-  std::cout << "Starting at " << st_coor << std::endl;
+  std::cout << "Starting at " << st_coor << ", seeds: " << num_seeds << std::endl;
   std::cout << "Dim Mults: " << utils::CoordinateF( dim_mults ) << std::endl;
-  AdaptedDjikstra djikstra( v_input, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, idd, cost_cutoff, utils::CoordinateF( dim_mults ) );
-  djikstra( st_coor );
+  // Delta-stepping settles buckets in parallel, without a settle order
+  if( num_threads > 1 && settled == nullptr )
+  {
+    ParallelDjikstra djikstra( v_input, cost_map_1, cost_map_2, pred_map_1, pred_map_2, idd, cost_cutoff,
+                               utils::CoordinateF( dim_mults ), num_threads );
+    djikstra.setSeedMap( seed_map );
+    djikstra.setProgress( progress );
+    try
+    {
+      djikstra( seeds );
+    }
+    catch( const utils::Cancelled& )
+    {
+      return utils::Cancelled::CODE;
+    }
+    return 0;
+  }
+  AdaptedDjikstra djikstra( v_input, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, idd, cost_cutoff, utils::CoordinateF( dim_mults ),
+                            DjikstraBase::QueueType( queue_type ) );
+  djikstra.setSeedMap( seed_map );
+  djikstra.setSettledList( static_cast<std::vector<int64_t>*>( settled ) );
+  djikstra.setProgress( progress );
+  try
+  {
+    djikstra( seeds );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
   return 0;
 }
 
@@ -103,35 +172,42 @@ extern "C" int djikstraShortestPath( float* input, float* cost_map_1, float* cos
 
 AdaptedDjikstraDirectionCost::AdaptedDjikstraDirectionCost( const Volume& input, const Volume& rad_map,
                                                             Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                                                            VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map, const int idd,
+                                                            VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map, const int idd,
                                                             const float cost_cutoff, const utils::CoordinateF& mults,
-                                                            const float dir_penalty_mult )
+                                                            const float dir_penalty_mult, const QueueType queue_type )
 : DjikstraBase( input, n_1st_cost_map, n_2nd_cost_map,
                 n_1st_pred_map, n_2nd_pred_map,
-                idd, cost_cutoff, mults ),
-  m_dir_penalty_mult( dir_penalty_mult ),
-  m_rad_map( rad_map )
-{
-  m_rad_grads = Volume3D( input.getShape(), utils::CoordinateD( 0.0,0.0,0.0 ) );
-  m_rad_map.getGradField( m_rad_grads );
-}
+                idd, cost_cutoff, mults, queue_type ),
+  m_dir_cost( rad_map, *m_neighbor, *m_table, dir_penalty_mult )
+{}
 
 extern "C" int djikstraShortestPathDirection( float* input, float* rad_map, float* cost_map_1, float* cost_map_2,
-                                     int* pred_map_1, int* pred_map_2,
-                                     int x_dim, int y_dim, int z_dim, int* start_pos, int idd,
+                                     int8_t* pred_map_1, int8_t* pred_map_2, int* seed_map,
+                                     int x_dim, int y_dim, int z_dim, int* start_pos, int num_seeds, int idd,
                                      float cost_cutoff, float* dim_mults,
-                                     float dir_pen )
+                                     float dir_pen, int queue_type, void* progress )
 {
   utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor(start_pos);
+  const std::vector<utils::Coordinate> seeds = DjikstraBase::seedCoordinates( start_pos, num_seeds );
   Volume v_input( input, shape ), v_rad( rad_map, shape ), v_cost_1( cost_map_1, shape ), v_cost_2( cost_map_2, shape );
-  VolumeI v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
+  VolumeI8 v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
 
   std::cout << "Input shape: " << shape << std::endl;
-  std::cout << "Starting at " << st_coor << std::endl;
+  std::cout << "Starting at " << st_coor << ", seeds: " << num_seeds << std::endl;
   std::cout << "Dim Mults: " << utils::CoordinateF( dim_mults ) << std::endl;
   std::cout << "Dir Penalty: " << dir_pen << std::endl;
-  AdaptedDjikstraDirectionCost djikstra( v_input, v_rad, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, idd, cost_cutoff, utils::CoordinateF( dim_mults ), dir_pen );
-  djikstra( st_coor );
+  AdaptedDjikstraDirectionCost djikstra( v_input, v_rad, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, idd, cost_cutoff, utils::CoordinateF( dim_mults ), dir_pen,
+                                         DjikstraBase::QueueType( queue_type ) );
+  djikstra.setSeedMap( seed_map );
+  djikstra.setProgress( progress );
+  try
+  {
+    djikstra( seeds );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
   return 0;
 }
 
@@ -141,16 +217,19 @@ extern "C" int djikstraShortestPathDirection( float* input, float* rad_map, floa
 
 DjikstraWithGapClosing::DjikstraWithGapClosing( const Volume& cost_input,
                                                 Volume& n_1st_cost_map, Volume& n_2nd_cost_map,
-                                                VolumeI& n_1st_pred_map, VolumeI& n_2nd_pred_map,
+                                                VolumeI8& n_1st_pred_map, VolumeI8& n_2nd_pred_map,
                                                 VolumeI& n_gap_ident, const int idd,
                                                 const float cost_cutoff, const utils::CoordinateF& mults,
-                                                const double cost_part, const int max_gap_length )
+                                                const double cost_part, const int max_gap_length,
+                                                const QueueType queue_type )
 : DjikstraBase( cost_input, n_1st_cost_map, n_2nd_cost_map,
                 n_1st_pred_map, n_2nd_pred_map,
-                idd, cost_cutoff, mults ),
+                idd, cost_cutoff, mults, queue_type ),
   m_gap_range( cost_input.getShape(), 0 ),
+  m_gap_length( max_gap_length ),
   m_gap_ident( n_gap_ident ),
-  m_gap_length( max_gap_length )
+  m_gap_depth( cost_input.getShape(), -1 ),
+  m_gap_base( cost_input.getShape(), 0.f )
 {
   m_part_cost = m_input.max() *cost_part;
   std::cout << "Min gap cost: " << m_part_cost << std::endl;
@@ -159,21 +238,137 @@ DjikstraWithGapClosing::DjikstraWithGapClosing( const Volume& cost_input,
 
 
 extern "C" int djikstraGapClosing( float* input, float* cost_map_1, float* cost_map_2,
-                                   int* pred_map_1, int* pred_map_2, int* gap_map,
-                                   int x_dim, int y_dim, int z_dim, int* start_pos, int idd,
+                                   int8_t* pred_map_1, int8_t* pred_map_2, int* gap_map, int* seed_map, void* settled,
+                                   int x_dim, int y_dim, int z_dim, int* start_pos, int num_seeds, int idd,
                                    float cost_cutoff, float* dim_mults,
-                                   double cost_per, int gap_length )
+                                   double cost_per, int gap_length, int queue_type, void* progress )
 {
   //TODO djikstra once, search for min gaps missing for connection, fill again, repeat until full connectivity
   utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor(start_pos);
+  const std::vector<utils::Coordinate> seeds = DjikstraBase::seedCoordinates( start_pos, num_seeds );
   Volume v_input( input, shape ), v_cost_1( cost_map_1, shape ), v_cost_2( cost_map_2, shape );
-  VolumeI v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape ), v_gap_map( gap_map, shape );
+  VolumeI8 v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape );
+  VolumeI v_gap_map( gap_map, shape );
 
   std::cout << "Input shape: " << shape << std::endl;
-  std::cout << "Starting at " << st_coor << std::endl;
+  std::cout << "Starting at " << st_coor << ", seeds: " << num_seeds << std::endl;
   std::cout << "Dim Mults: " << utils::CoordinateF( dim_mults ) << std::endl;
   std::cout << "Gap: " << cost_per  << " length=" << gap_length << std::endl;
-  DjikstraWithGapClosing djikstra( v_input, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, v_gap_map, idd, cost_cutoff, utils::CoordinateF( dim_mults ), cost_per, gap_length );
-  djikstra( st_coor );
+  DjikstraWithGapClosing djikstra( v_input, v_cost_1, v_cost_2, v_pred_map_1, v_pred_map_2, v_gap_map, idd, cost_cutoff, utils::CoordinateF( dim_mults ), cost_per, gap_length,
+                                   DjikstraBase::QueueType( queue_type ) );
+  djikstra.setSeedMap( seed_map );
+  djikstra.setSettledList( static_cast<std::vector<int64_t>*>( settled ) );
+  djikstra.setProgress( progress );
+  try
+  {
+    djikstra( seeds );
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
   return 0;
 }
+
+
+
+/// Maps and search of a resumable shortest path, kept between the calls below
+struct DjikstraHandle
+{
+  DjikstraHandle( float* input, float* rad_map, float* cost_map_1, float* cost_map_2,
+                  int8_t* pred_map_1, int8_t* pred_map_2, const utils::Coordinate& shape )
+    : v_input( input, shape ), v_rad( rad_map, shape ),
+      v_cost_1( cost_map_1, shape ), v_cost_2( cost_map_2, shape ),
+      v_pred_map_1( pred_map_1, shape ), v_pred_map_2( pred_map_2, shape ) {}
+  ~DjikstraHandle() { delete djikstra; }
+
+  Volume v_input, v_rad, v_cost_1, v_cost_2;
+  VolumeI8 v_pred_map_1, v_pred_map_2;
+  DjikstraBase* djikstra = nullptr;
+};
+
+
+/**
+ * Shortest path to cost_cutoff, keeping the relaxations beyond it. Uses the direction penalty if rad_map is given.
+ * Input and maps have to stay valid until djikstraDelete. If cancelled, the handle is still returned and
+ * continuing to cost_cutoff finishes the search.
+ */
+extern "C" void* djikstraCreate( float* input, float* rad_map, float* cost_map_1, float* cost_map_2,
+                                 int8_t* pred_map_1, int8_t* pred_map_2, int* seed_map, void* settled,
+                                 int x_dim, int y_dim, int z_dim, int* start_pos, int num_seeds, int idd,
+                                 float cost_cutoff, float* dim_mults,
+                                 float dir_pen, int queue_type, void* progress )
+{
+  utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor(start_pos);
+  const std::vector<utils::Coordinate> seeds = DjikstraBase::seedCoordinates( start_pos, num_seeds );
+  DjikstraHandle* handle = new DjikstraHandle( input, rad_map, cost_map_1, cost_map_2, pred_map_1, pred_map_2, shape );
+
+  std::cout << "Input shape: " << shape << std::endl;
+  std::cout << "Starting at " << st_coor << ", seeds: " << num_seeds << std::endl;
+  std::cout << "Dim Mults: " << utils::CoordinateF( dim_mults ) << std::endl;
+  if( rad_map != nullptr )
+    handle->djikstra = new AdaptedDjikstraDirectionCost( handle->v_input, handle->v_rad, handle->v_cost_1, handle->v_cost_2,
+                                                         handle->v_pred_map_1, handle->v_pred_map_2, idd, cost_cutoff,
+                                                         utils::CoordinateF( dim_mults ), dir_pen, DjikstraBase::QueueType( queue_type ) );
+  else
+    handle->djikstra = new AdaptedDjikstra( handle->v_input, handle->v_cost_1, handle->v_cost_2,
+                                            handle->v_pred_map_1, handle->v_pred_map_2, idd, cost_cutoff,
+                                            utils::CoordinateF( dim_mults ), DjikstraBase::QueueType( queue_type ) );
+  handle->djikstra->setSeedMap( seed_map );
+  handle->djikstra->setSettledList( static_cast<std::vector<int64_t>*>( settled ) );
+  handle->djikstra->keepFrontier( true );
+  handle->djikstra->setProgress( progress );
+  try
+  {
+    ( *handle->djikstra )( seeds );
+  }
+  catch( const utils::Cancelled& ) {}
+  return handle;
+}
+
+
+/// Continue search of handle to a higher cost_cutoff, -1 if cost_cutoff is lower than the current one
+extern "C" int djikstraContinue( void* handle, float cost_cutoff, void* progress )
+{
+  DjikstraBase* djikstra = static_cast<DjikstraHandle*>( handle )->djikstra;
+  std::cout << "Continue from cutoff " << djikstra->getCostCutoff() << " to " << cost_cutoff
+            << ", frontier: " << djikstra->getFrontierSize() << std::endl;
+  djikstra->setProgress( progress );
+  try
+  {
+    return djikstra->continueTo( cost_cutoff ) ? 0 : -1;
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
+}
+
+
+extern "C" void djikstraDelete( void* handle )
+{
+  delete static_cast<DjikstraHandle*>( handle );
+}
+
+
+/// Settled voxel indices, filled by passing the list as settled to the searches above
+extern "C" void* settledCreate()
+{
+  return new std::vector<int64_t>();
+}
+
+extern "C" int64_t settledSize( void* settled )
+{
+  return static_cast<std::vector<int64_t>*>( settled )->size();
+}
+
+extern "C" void settledCopy( void* settled, int64_t* out )
+{
+  const std::vector<int64_t>& list = *static_cast<std::vector<int64_t>*>( settled );
+  std::copy( list.begin(), list.end(), out );
+}
+
+extern "C" void settledDelete( void* settled )
+{
+  delete static_cast<std::vector<int64_t>*>( settled );
+}
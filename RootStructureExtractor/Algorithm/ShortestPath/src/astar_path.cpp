@@ -0,0 +1,147 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#include "astar_path.h"
+
+AStarPath::AStarPath( const Volume& input, const int idd, const float cost_cutoff,
+                      const utils::CoordinateF& mults, const float min_cost,
+                      const DjikstraBase::QueueType queue_type )
+: m_input_data( input.getData() ),
+  m_shape( input.getShape() ),
+  m_cost_cutoff( cost_cutoff ),
+  m_cost( 0 ),
+  m_unvisited_nodes( queue_type ),
+  m_num_settled( 0 )
+{
+  if( idd == 1 ) m_neighbor = new utils::NeighborhoodID1( m_shape, mults );
+  else if( idd == 2 ) m_neighbor = new utils::NeighborhoodID2( m_shape, mults );
+  else m_neighbor = new utils::NeighborhoodID3( m_shape, mults );
+  m_table = new utils::NeighborTable( *m_neighbor, m_shape );
+  m_cost_map.assign( m_table->getSize(), std::numeric_limits<float>::max() );
+  m_pred_map.assign( m_table->getSize(), 0 );
+  m_visited.assign( m_table->getSize(), false );
+
+  // Smallest multiplier of a step moving along each axis, pred bits 5,4: x, 3,2: y, 1,0: z
+  const int axis_bits[3] = { 48, 12, 3 };
+  m_axis_cost.fill( std::numeric_limits<float>::max() );
+  for( const utils::NeighborTable::Entry* cur = m_table->classBegin( 0 ) ; cur != m_table->classEnd( 63 ) ; ++cur )
+    for( size_t axis=0 ; axis < 3 ; ++axis )
+      if( -cur->pred & axis_bits[axis] )
+        m_axis_cost[axis] = std::min( m_axis_cost[axis], cur->mult );
+  for( size_t axis=0 ; axis < 3 ; ++axis )
+  {
+    if( m_axis_cost[axis] == std::numeric_limits<float>::max() ) m_axis_cost[axis] = 0.f;
+    m_axis_cost[axis] *= std::max( min_cost, 0.f );
+  }
+}
+
+AStarPath::~AStarPath() { delete m_table; delete m_neighbor; }
+
+
+bool AStarPath::operator()( const utils::Coordinate& start, const utils::Coordinate& goal )
+{
+  for( const size_t& idx : m_touched )
+  {
+    m_cost_map[idx] = std::numeric_limits<float>::max();
+    m_visited[idx] = false;
+  }
+  m_touched.clear();
+  m_unvisited_nodes.clear();
+  m_path.clear();
+  m_num_settled = 0;
+  m_goal = goal;
+
+  const size_t start_idx = m_table->getIndex( start ), goal_idx = m_table->getIndex( goal );
+  m_cost_map[start_idx] = 0;
+  m_pred_map[start_idx] = 70;
+  m_touched.push_back( start_idx );
+  m_unvisited_nodes.push( Node( start_idx, heuristic( start ) ) );
+  utils::Progress progress( m_progress, "A* path", m_table->getSize(), false );
+  while( !m_unvisited_nodes.empty() )
+  {
+    const size_t idx = m_unvisited_nodes.pop().idx;
+    if( m_visited[idx] )
+      continue;
+    m_visited[idx] = true;
+    progress.update( ++m_num_settled );
+    if( idx == goal_idx )
+    {
+      m_cost = m_cost_map[idx];
+      tracePath( start_idx, goal_idx );
+      progress.finish();
+      return true;
+    }
+
+    const float cost = m_cost_map[idx];
+    const utils::NeighborTable::Entry* end = m_table->end( idx );
+    for( const utils::NeighborTable::Entry* cur = m_table->begin( idx ) ; cur != end ; ++cur )
+    {
+      const size_t n_idx = idx +cur->delta;
+      if( m_visited[n_idx] )
+        continue;
+      const float new_cost = cost + ( m_input_data[n_idx] *cur->mult );
+      float& n_cost = m_cost_map[n_idx];
+      if( new_cost > m_cost_cutoff || n_cost <= new_cost )
+        continue;
+      if( n_cost == std::numeric_limits<float>::max() )
+        m_touched.push_back( n_idx );
+      n_cost = new_cost;
+      m_pred_map[n_idx] = -cur->pred;
+      m_unvisited_nodes.push( Node( n_idx, new_cost +heuristic( m_table->getCoordinate( n_idx ) ) ) );
+    }
+  }
+  progress.finish();
+  return false;
+}
+
+
+void AStarPath::tracePath( const size_t& start_idx, const size_t& goal_idx )
+{
+  size_t idx = goal_idx;
+  m_path.push_back( m_table->getCoordinate( idx ) );
+  while( idx != start_idx )
+  {
+    idx = m_table->predecessor( idx, m_pred_map[idx] );
+    m_path.push_back( m_table->getCoordinate( idx ) );
+  }
+  std::reverse( m_path.begin(), m_path.end() );
+}
+
+
+/**
+ * Returns the number of path voxels, 0 if goal is not reachable.
+ * Path is written as numpy ordered (z,y,x) positions, only if it fits into max_path_len.
+ */
+extern "C" int aStarShortestPath( float* input, int x_dim, int y_dim, int z_dim,
+                                  int* start_pos, int* goal_pos, int idd, float cost_cutoff,
+                                  float* dim_mults, float min_cost, int queue_type,
+                                  int* path, int max_path_len, float* path_cost, void* progress )
+{
+  utils::Coordinate shape( x_dim, y_dim, z_dim ), start( start_pos ), goal( goal_pos );
+  Volume v_input( input, shape );
+  AStarPath a_star( v_input, idd, cost_cutoff, utils::CoordinateF( dim_mults ), min_cost,
+                    DjikstraBase::QueueType( queue_type ) );
+  a_star.setProgress( progress );
+  try
+  {
+    if( !a_star( start, goal ) )
+      return 0;
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
+
+  const std::vector<utils::Coordinate>& res = a_star.getPath();
+  *path_cost = a_star.getCost();
+  if( int( res.size() ) <= max_path_len )
+    for( size_t it=0 ; it < res.size() ; ++it )
+    {
+      path[3*it] = res[it][2];
+      path[3*it+1] = res[it][1];
+      path[3*it+2] = res[it][0];
+    }
+  return res.size();
+}
@@ -0,0 +1,341 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#include "parallel_djikstra.h"
+#include <queue>
+
+ParallelDjikstra::ParallelDjikstra( const Volume& input,
+                                    float* cost_1, float* cost_2, int8_t* pred_1, int8_t* pred_2,
+                                    const int idd, const float cost_cutoff, const utils::CoordinateF& mults,
+                                    const size_t num_threads )
+: m_input_data( input.getData() ),
+  m_cost_1( cost_1 ), m_cost_2( cost_2 ),
+  m_pred_1( pred_1 ), m_pred_2( pred_2 ),
+  m_second_best( cost_2 != nullptr && pred_2 != nullptr ),
+  m_shape( input.getShape() ),
+  m_num_elems( input.getSize() ),
+  m_num_threads( std::max( num_threads, size_t( 1 ) ) ),
+  m_cost_cutoff( cost_cutoff ),
+  m_barrier( m_num_threads ),
+  m_buckets( m_num_threads )
+{
+  if( idd == 1 ) m_neighbor = new utils::NeighborhoodID1( m_shape, mults );
+  else if( idd == 2 ) m_neighbor = new utils::NeighborhoodID2( m_shape, mults );
+  else m_neighbor = new utils::NeighborhoodID3( m_shape, mults );
+  m_table = new utils::NeighborTable( *m_neighbor, m_shape );
+
+  // Bucket width of about one average edge
+  double mean_cost = 0.0, mean_mult = 0.0;
+  for( size_t it=0 ; it < m_num_elems ; ++it )
+    mean_cost += m_input_data[it];
+  mean_cost /= std::max( m_num_elems, size_t( 1 ) );
+  size_t num_entries = 0;
+  for( const utils::NeighborTable::Entry* cur = m_table->classBegin( 0 ) ; cur != m_table->classEnd( 63 ) ; ++cur, ++num_entries )
+    mean_mult += cur->mult;
+  mean_mult /= std::max( num_entries, size_t( 1 ) );
+  m_delta = mean_cost *mean_mult;
+  if( !( m_delta > 0.0 ) ) m_delta = 1.0;
+}
+
+ParallelDjikstra::~ParallelDjikstra() { delete m_table; delete m_neighbor; }
+
+
+void ParallelDjikstra::operator()( const std::vector<utils::Coordinate>& start_nodes )
+{
+  std::fill_n( m_cost_1, m_num_elems, std::numeric_limits<float>::max() );
+  std::fill_n( m_pred_1, m_num_elems, 0 );
+  if( m_second_best )
+  {
+    std::fill_n( m_cost_2, m_num_elems, std::numeric_limits<float>::max() );
+    std::fill_n( m_pred_2, m_num_elems, 0 );
+  }
+  if( m_seed_map != nullptr )
+    std::fill_n( m_seed_map, m_num_elems, -1 );
+
+  for( std::map<size_t, std::vector<Entry>>& buckets : m_buckets )
+    buckets.clear();
+  for( size_t seed_it=0 ; seed_it < start_nodes.size() ; ++seed_it )
+  {
+    const size_t start_idx = m_table->getIndex( start_nodes[seed_it] );
+    if( m_pred_1[start_idx] == 70 ) // Duplicate seed
+      continue;
+    m_buckets[0][0].push_back( Entry( start_idx, 0 ) );
+    m_pred_1[start_idx] = 70;
+    m_cost_1[start_idx] = 0;
+    if( m_second_best )
+    {
+      m_pred_2[start_idx] = 70;
+      m_cost_2[start_idx] = 0;
+    }
+    if( m_seed_map != nullptr )
+      m_seed_map[start_idx] = seed_it;
+  }
+
+  std::cout << "Delta stepping, delta=" << m_delta << ", threads: " << m_num_threads << std::endl;
+  utils::Progress progress( m_progress_handle, "Shortest path", m_num_elems );
+  m_progress = &progress;
+  m_cur_bucket = 0;
+  m_done = !collectFrontier();
+  std::vector<std::thread> threads;
+  for( size_t t_it=1; t_it < m_num_threads ; ++t_it )
+    threads.push_back( std::thread( &ParallelDjikstra::worker, this, t_it ) );
+  worker( 0 );
+  for( size_t t_it=0; t_it < threads.size() ; ++t_it )
+    threads[t_it].join();
+  m_progress = nullptr;
+  progress.check();
+  progress.finish();
+
+  buildInEntries();
+  m_resolved.assign( m_num_elems, 0 );
+  m_plateau_rank.clear();
+  const size_t z_dim = m_shape[2], slab = ( z_dim +m_num_threads -1 ) /m_num_threads;
+  for( size_t pass=0 ; pass < 2 ; ++pass )
+  {
+    threads.clear();
+    for( size_t z_it=0 ; z_it < z_dim ; z_it += slab )
+      threads.push_back( std::thread( &ParallelDjikstra::assignPredecessors, this, z_it, std::min( z_it +slab, z_dim ) ) );
+    for( size_t t_it=0; t_it < threads.size() ; ++t_it )
+      threads[t_it].join();
+    // Nodes only reachable over equal cost nodes need the settle order within the plateau
+    if( pass > 0 || std::find_if( m_resolved.begin(), m_resolved.end(), []( const uint8_t& res ){ return res >= 2; } ) == m_resolved.end() )
+      break;
+    computePlateauOrder();
+  }
+  m_resolved.clear();
+  m_plateau_rank.clear();
+  if( m_seed_map != nullptr )
+    assignSeeds();
+}
+
+
+void ParallelDjikstra::worker( const size_t t_id )
+{
+  while( true )
+  {
+    m_barrier.wait();
+    if( m_done )
+      return;
+    const size_t chunk = 256;
+    for( size_t pos = m_frontier_pos.fetch_add( chunk ) ; pos < m_frontier.size() ; pos = m_frontier_pos.fetch_add( chunk ) )
+    {
+      const size_t end = std::min( pos +chunk, m_frontier.size() );
+      for( size_t it=pos ; it < end ; ++it )
+        relaxNode( t_id, m_frontier[it] );
+      m_progress->add( end -pos );
+    }
+    m_barrier.wait();
+    // Cancellation stops at the next bucket, all threads leave after the barrier
+    if( t_id == 0 )
+      m_done = !collectFrontier() || m_progress->cancelled();
+  }
+}
+
+
+void ParallelDjikstra::relaxNode( const size_t t_id, const Entry& node )
+{
+  if( atomicLoad( &m_cost_1[node.idx] ) < node.cost ) // Lowered since, queued again
+    return;
+  std::map<size_t, std::vector<Entry>>& buckets = m_buckets[t_id];
+  const utils::NeighborTable::Entry* end = m_table->end( node.idx );
+  for( const utils::NeighborTable::Entry* cur = m_table->begin( node.idx ) ; cur != end ; ++cur )
+  {
+    const size_t n_idx = node.idx +cur->delta;
+    const float new_cost = node.cost + ( m_input_data[n_idx] *cur->mult );
+    if( new_cost > m_cost_cutoff )
+      continue;
+    if( atomicMin( &m_cost_1[n_idx], new_cost ) )
+      buckets[std::max( bucketId( new_cost ), m_cur_bucket )].push_back( Entry( n_idx, new_cost ) );
+  }
+}
+
+
+bool ParallelDjikstra::collectFrontier()
+{
+  m_frontier.clear();
+  m_frontier_pos = 0;
+  while( true )
+  {
+    for( std::map<size_t, std::vector<Entry>>& buckets : m_buckets )
+    {
+      std::map<size_t, std::vector<Entry>>::iterator bucket = buckets.find( m_cur_bucket );
+      if( bucket == buckets.end() )
+        continue;
+      for( const Entry& node : bucket->second )
+        if( m_cost_1[node.idx] == node.cost ) // Skip outdated entries
+          m_frontier.push_back( node );
+      buckets.erase( bucket );
+    }
+    if( !m_frontier.empty() )
+      return true;
+
+    size_t next_bucket = std::numeric_limits<size_t>::max();
+    for( const std::map<size_t, std::vector<Entry>>& buckets : m_buckets )
+      if( !buckets.empty() )
+        next_bucket = std::min( next_bucket, buckets.begin()->first );
+    if( next_bucket == std::numeric_limits<size_t>::max() )
+      return false;
+    m_cur_bucket = next_bucket;
+  }
+}
+
+
+void ParallelDjikstra::buildInEntries()
+{
+  // Entries of a border class leading to a node at offset -off, indexed by class*27 +offset id
+  for( std::vector<const utils::NeighborTable::Entry*>& entries : m_in_entries )
+    entries.clear();
+  for( size_t b_class=0 ; b_class < 64 ; ++b_class )
+    for( const utils::NeighborTable::Entry* cur = m_table->classBegin( b_class ) ; cur != m_table->classEnd( b_class ) ; ++cur )
+    {
+      // Stored predecessor code of the neighbor points back to this node
+      utils::NeighborhoodBase::IntBits code( -cur->pred );
+      const int dx = code[5] ? 1 : ( code[4] ? -1 : 0 );
+      const int dy = code[3] ? 1 : ( code[2] ? -1 : 0 );
+      const int dz = code[1] ? 1 : ( code[0] ? -1 : 0 );
+      m_in_entries[b_class*27 +( dx+1 ) +3*( dy+1 ) +9*( dz+1 )].push_back( cur );
+    }
+}
+
+
+void ParallelDjikstra::assignPredecessors( const size_t z_begin, const size_t z_end )
+{
+  const long x_dim = m_shape[0], y_dim = m_shape[1], z_dim = m_shape[2];
+  const long y_step = x_dim, z_step = x_dim *y_dim;
+  auto axisClass = []( const long pos, const long size ) { return size_t( pos == 0 ) | ( size_t( pos == size -1 ) << 1 ); };
+  for( long z=z_begin ; z < long( z_end ) ; ++z )
+    for( long y=0 ; y < y_dim ; ++y )
+      for( long x=0 ; x < x_dim ; ++x )
+      {
+        const size_t v_idx = z *z_step +y *y_step +x;
+        const float d_v = m_cost_1[v_idx];
+        if( d_v == std::numeric_limits<float>::max() || m_pred_1[v_idx] == 70 )
+          continue;
+        const float v_cost = m_input_data[v_idx];
+        float cost_1 = std::numeric_limits<float>::max(), cost_2 = cost_1;
+        int pred_1 = 0, pred_2 = 0;
+        bool strict = false;
+        for( long dz=-1 ; dz <= 1 ; ++dz )
+        {
+          if( z +dz < 0 || z +dz >= z_dim ) continue;
+          for( long dy=-1 ; dy <= 1 ; ++dy )
+          {
+            if( y +dy < 0 || y +dy >= y_dim ) continue;
+            for( long dx=-1 ; dx <= 1 ; ++dx )
+            {
+              if( x +dx < 0 || x +dx >= x_dim || ( dx == 0 && dy == 0 && dz == 0 ) ) continue;
+              const size_t u_idx = v_idx +dz *z_step +dy *y_step +dx;
+              const float d_u = m_cost_1[u_idx];
+              if( d_u == std::numeric_limits<float>::max() || !settledBefore( u_idx, v_idx ) )
+                continue;
+              const size_t u_class = axisClass( x+dx, x_dim ) | ( axisClass( y+dy, y_dim ) << 2 ) | ( axisClass( z+dz, z_dim ) << 4 );
+              // Candidates arrive in settle order, so ties keep the earlier candidate as in the sequential search
+              for( const utils::NeighborTable::Entry* cur : m_in_entries[u_class*27 +( dx+1 ) +3*( dy+1 ) +9*( dz+1 )] )
+              {
+                const float new_cost = d_u + ( v_cost *cur->mult );
+                if( new_cost > m_cost_cutoff )
+                  continue;
+                if( new_cost == d_v && d_u < d_v )
+                  strict = true;
+                if( new_cost < cost_1 || ( new_cost == cost_1 && pred_1 != 0 && settledBefore( u_idx, m_table->predecessor( v_idx, pred_1 ) ) ) )
+                {
+                  cost_2 = cost_1;
+                  pred_2 = pred_1;
+                  cost_1 = new_cost;
+                  pred_1 = -cur->pred;
+                }
+                else if( new_cost < cost_2 || ( new_cost == cost_2 && pred_2 != 0 && settledBefore( u_idx, m_table->predecessor( v_idx, pred_2 ) ) ) )
+                {
+                  cost_2 = new_cost;
+                  pred_2 = -cur->pred;
+                }
+              }
+            }
+          }
+        }
+        m_pred_1[v_idx] = pred_1;
+        if( m_second_best )
+        {
+          m_cost_2[v_idx] = cost_2;
+          m_pred_2[v_idx] = pred_2;
+        }
+        m_resolved[v_idx] = strict ? 1 : ( cost_1 == d_v ? 3 : 2 );
+      }
+}
+
+
+void ParallelDjikstra::computePlateauOrder()
+{
+  // Costs holding a node without predecessor of lower cost
+  std::vector<float> plateau_costs;
+  for( size_t idx=0 ; idx < m_num_elems ; ++idx )
+    if( m_resolved[idx] >= 2 )
+      plateau_costs.push_back( m_cost_1[idx] );
+  std::sort( plateau_costs.begin(), plateau_costs.end() );
+  plateau_costs.erase( std::unique( plateau_costs.begin(), plateau_costs.end() ), plateau_costs.end() );
+
+  std::vector<size_t> nodes;
+  for( size_t idx=0 ; idx < m_num_elems ; ++idx )
+    if( m_cost_1[idx] != std::numeric_limits<float>::max()
+        && std::binary_search( plateau_costs.begin(), plateau_costs.end(), m_cost_1[idx] ) )
+      nodes.push_back( idx );
+  std::stable_sort( nodes.begin(), nodes.end(), [this]( const size_t& a, const size_t& b ){ return m_cost_1[a] < m_cost_1[b]; } );
+
+  // Replay the binary heap per cost: Nodes reached from lower costs are queued when the cost is reached,
+  // the others once an equal cost neighbor settles
+  m_plateau_rank.assign( m_num_elems, 0 );
+  std::vector<bool> queued( m_num_elems, false );
+  std::priority_queue<size_t, std::vector<size_t>, std::greater<size_t> > queue;
+  for( size_t n_begin=0, n_end=0 ; n_begin < nodes.size() ; n_begin = n_end )
+  {
+    const float d_u = m_cost_1[nodes[n_begin]];
+    for( n_end=n_begin ; n_end < nodes.size() && m_cost_1[nodes[n_end]] == d_u ; ++n_end )
+      if( m_resolved[nodes[n_end]] == 1 || m_pred_1[nodes[n_end]] == 70 )
+      {
+        queued[nodes[n_end]] = true;
+        queue.push( nodes[n_end] );
+      }
+    uint32_t rank = 0;
+    while( !queue.empty() )
+    {
+      const size_t u_idx = queue.top();
+      queue.pop();
+      m_plateau_rank[u_idx] = rank++;
+      const utils::NeighborTable::Entry* end = m_table->end( u_idx );
+      for( const utils::NeighborTable::Entry* cur = m_table->begin( u_idx ) ; cur != end ; ++cur )
+      {
+        const size_t v_idx = u_idx +cur->delta;
+        if( queued[v_idx] || m_cost_1[v_idx] != d_u )
+          continue;
+        const float new_cost = d_u + ( m_input_data[v_idx] *cur->mult );
+        if( new_cost != d_u || new_cost > m_cost_cutoff )
+          continue;
+        queued[v_idx] = true;
+        queue.push( v_idx );
+      }
+    }
+  }
+}
+
+
+void ParallelDjikstra::assignSeeds()
+{
+  // Seed of a node is the seed of its 1st predecessor, resolve chains iteratively
+  std::vector<size_t> chain;
+  for( size_t idx=0 ; idx < m_num_elems ; ++idx )
+  {
+    if( m_seed_map[idx] != -1 || m_cost_1[idx] == std::numeric_limits<float>::max() )
+      continue;
+    size_t cur = idx;
+    while( m_seed_map[cur] == -1 )
+    {
+      chain.push_back( cur );
+      cur = m_table->predecessor( cur, m_pred_1[cur] );
+    }
+    for( const size_t& c_idx : chain )
+      m_seed_map[c_idx] = m_seed_map[cur];
+    chain.clear();
+  }
+}
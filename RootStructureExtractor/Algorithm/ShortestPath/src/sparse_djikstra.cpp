@@ -0,0 +1,127 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#include "sparse_djikstra.h"
+
+SparseDjikstra::SparseDjikstra( const Volume& input, ActiveIndex active,
+                                float* cost_1, float* cost_2, int8_t* pred_1, int8_t* pred_2,
+                                const int idd, const float cost_cutoff, const utils::CoordinateF& mults,
+                                const DjikstraBase::QueueType queue_type,
+                                const Volume* rad_map, const float dir_penalty_mult )
+: PathMaps<ActiveIndex>( std::move( active ), cost_1, cost_2, pred_1, pred_2 ),
+  m_input_data( input.getData() ),
+  m_shape( input.getShape() ),
+  m_unvisited_nodes( queue_type ),
+  m_cost_cutoff( cost_cutoff )
+{
+  if( idd == 1 ) m_neighbor = new utils::NeighborhoodID1( m_shape, mults );
+  else if( idd == 2 ) m_neighbor = new utils::NeighborhoodID2( m_shape, mults );
+  else m_neighbor = new utils::NeighborhoodID3( m_shape, mults );
+  m_table = new utils::NeighborTable( *m_neighbor, m_shape );
+  if( rad_map != nullptr )
+    m_dir_cost = new DirectionCost( *rad_map, *m_neighbor, *m_table, dir_penalty_mult );
+}
+
+SparseDjikstra::~SparseDjikstra() { delete m_dir_cost; delete m_table; delete m_neighbor; }
+
+
+bool SparseDjikstra::operator()( const std::vector<utils::Coordinate>& start_nodes )
+{
+  resetMaps();
+  m_visited.assign( m_num_entries, false );
+  std::vector<size_t> start_ids;
+  if( !initStartNodes( start_nodes, *m_table, start_ids ) )
+    return false;
+  for( const size_t& start_id : start_ids )
+    m_unvisited_nodes.push( Node( start_id, 0 ) );
+
+  size_t run_it = 0;
+  utils::Progress progress( m_progress, "Shortest path", m_num_entries );
+  while( !m_unvisited_nodes.empty() )
+  {
+    Node curr_node( m_unvisited_nodes.pop() );
+    if( !nodeVisited( curr_node.idx ) )
+    {
+      visitNode( curr_node.idx );
+      settleSeed( curr_node.idx );
+      updateNeighborhood( curr_node.idx, curr_node.cost );
+      progress.update( ++run_it );
+    }
+  }
+  progress.finish();
+  return true;
+}
+
+
+void SparseDjikstra::updateNeighborhood( const size_t& c_id, const float& cost )
+{
+  const size_t idx = m_index[c_id];
+  const utils::NeighborTable::Entry* end = m_table->end( idx );
+  if( m_dir_cost == nullptr )
+  {
+    for( const utils::NeighborTable::Entry* cur = m_table->begin( idx ) ; cur != end ; ++cur )
+    {
+      const long n_id = m_index.find( idx +cur->delta );
+      if( n_id >= 0 )
+        updateNeighbor( n_id, idx +cur->delta, cost, cur->mult, cur->pred );
+    }
+    return;
+  }
+
+  const utils::CoordinateD cur_grad = m_dir_cost->radiusGradient( idx ).toType<double>();
+  for( const utils::NeighborTable::Entry* cur = m_table->begin( idx ) ; cur != end ; ++cur )
+  {
+    const long n_id = m_index.find( idx +cur->delta );
+    if( n_id >= 0 )
+      updateNeighbor( n_id, idx +cur->delta, cost *( *m_dir_cost )( m_pred_1[c_id], cur->pred, cur_grad ), cur->mult, cur->pred );
+  }
+}
+
+
+extern "C" int djikstraShortestPathSparse( float* input, float* rad_map, int64_t* active, int64_t num_active,
+                                           float* cost_map_1, float* cost_map_2,
+                                           int8_t* pred_map_1, int8_t* pred_map_2, int* seed_map,
+                                           int x_dim, int y_dim, int z_dim, int* start_pos, int num_seeds, int idd,
+                                           float cost_cutoff, float* dim_mults,
+                                           float dir_pen, int queue_type, void* progress )
+{
+  utils::Coordinate shape( x_dim, y_dim, z_dim ), st_coor(start_pos);
+  const std::vector<utils::Coordinate> seeds = DjikstraBase::seedCoordinates( start_pos, num_seeds );
+  Volume v_input( input, shape );
+  ActiveIndex active_index( active, num_active, shape );
+
+  std::cout << "Input shape: " << shape << ", active voxels: " << num_active << std::endl;
+  std::cout << "Starting at " << st_coor << ", seeds: " << num_seeds << std::endl;
+  std::cout << "Dim Mults: " << utils::CoordinateF( dim_mults ) << std::endl;
+  if( rad_map != nullptr )
+  {
+    std::cout << "Dir Penalty: " << dir_pen << std::endl;
+    Volume v_rad( rad_map, shape );
+    SparseDjikstra djikstra( v_input, std::move( active_index ), cost_map_1, cost_map_2, pred_map_1, pred_map_2, idd, cost_cutoff,
+                             utils::CoordinateF( dim_mults ), DjikstraBase::QueueType( queue_type ), &v_rad, dir_pen );
+    djikstra.setSeedMap( seed_map );
+    djikstra.setProgress( progress );
+    try
+    {
+      return djikstra( seeds ) ? 0 : -1;
+    }
+    catch( const utils::Cancelled& )
+    {
+      return utils::Cancelled::CODE;
+    }
+  }
+  SparseDjikstra djikstra( v_input, std::move( active_index ), cost_map_1, cost_map_2, pred_map_1, pred_map_2, idd, cost_cutoff,
+                           utils::CoordinateF( dim_mults ), DjikstraBase::QueueType( queue_type ) );
+  djikstra.setSeedMap( seed_map );
+  djikstra.setProgress( progress );
+  try
+  {
+    return djikstra( seeds ) ? 0 : -1;
+  }
+  catch( const utils::Cancelled& )
+  {
+    return utils::Cancelled::CODE;
+  }
+}
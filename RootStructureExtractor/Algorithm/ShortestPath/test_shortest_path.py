@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from c_shortest_path import *
+
+
+def tiedVolume( seed, shape=(17,9,23) ):
+    """Costs in steps of 0.25 with zero cost plateaus, so many paths cost exactly the same"""
+    rng = np.random.default_rng( seed )
+    return ( rng.integers( 0, 8, shape ) *0.25 ).astype( np.float32 )
+
+
+class TestParallelDjikstra(unittest.TestCase):
+    """Test shortestPath with num_threads > 1"""
+
+    def test_tied_costs(self):
+        """All maps equal the sequential search with binary heap, also where costs tie"""
+        dim_mults = np.array( [1., 1., 1.], dtype=np.float32 )
+        seeds = np.array( [[3, 4, 5], [15, 2, 20]] )
+        for seed in range( 3 ):
+            inp_arr = tiedVolume( seed )
+            expected = shortestPath( inp_arr, seeds, 3, 6.0, dim_mults, queue="heap", return_seeds=True )
+            for num_threads in ( 2, 4 ):
+                maps = shortestPath( inp_arr, seeds, 3, 6.0, dim_mults, return_seeds=True, num_threads=num_threads )
+                for exp_map, par_map in zip( expected, maps ):
+                    np.testing.assert_array_equal( exp_map, par_map )
+
+
+
+class TestShortestPathSearch(unittest.TestCase):
+    """Test ShortestPathSearch"""
+
+    def test_continue_tied_costs(self):
+        """Continuing over several cutoffs equals a new search, also where costs tie"""
+        dim_mults = np.array( [1., 1., 1.], dtype=np.float32 )
+        seeds = np.array( [[3, 4, 5], [15, 2, 20]] )
+        for seed in range( 3 ):
+            inp_arr = tiedVolume( seed )
+            rad_arr = np.floor( inp_arr *4 ) %3
+            for rad, second_best in ( ( None, True ), ( None, False ), ( rad_arr, True ) ):
+                search = ShortestPathSearch( inp_arr, seeds, 3, 1.0, dim_mults, rad_arr=rad, second_best=second_best,
+                                             return_seeds=True )
+                for cost_cutoff in ( 1.5, 3.0, 6.0 ):
+                    search.continueTo( cost_cutoff )
+                    expected = ShortestPathSearch( inp_arr, seeds, 3, cost_cutoff, dim_mults, rad_arr=rad,
+                                                   second_best=second_best, return_seeds=True ).getMaps()
+                    for exp_map, cont_map in zip( expected, search.getMaps() ):
+                        np.testing.assert_array_equal( exp_map, cont_map )
+
+if __name__ == '__main__':
+    unittest.main()
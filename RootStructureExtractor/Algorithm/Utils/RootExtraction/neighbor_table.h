@@ -0,0 +1,134 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef NEIGHBOR_TABLE_H__
+#define NEIGHBOR_TABLE_H__
+
+#include <vector>
+#include <array>
+#include "utils.h"
+#include "neighborhood.h"
+
+namespace utils
+{
+
+/**
+ * Flat index version of a NeighborhoodBase.
+ * The neighbors a NeighborhoodBase yields only depend on which volume borders a voxel touches,
+ * encoded as 2 bits per axis ( pos == 0, pos == shape-1 ). The neighborhood is evaluated once
+ * for every border class present in the volume and stored as linear index deltas.
+ */
+class NeighborTable
+{
+public:
+  struct Entry
+  {
+    Entry( const long& n_delta, const float& n_mult, const int& n_pred )
+      : delta( n_delta ), mult( n_mult ), pred( n_pred ) {}
+
+    long delta;
+    float mult;
+    int pred;
+  };
+
+  NeighborTable( NeighborhoodBase& neighbor, const Coordinate& shape )
+    : m_shape( shape ), m_z_step( size_t( shape[0] ) *shape[1] )
+  {
+    NeighborhoodBase::NodeVector nodes( neighbor.getMaxSize() );
+    m_offsets[0] = 0;
+    for( size_t b_class=0 ; b_class < 64 ; ++b_class )
+    {
+      Coordinate pos;
+      if( classPosition( b_class, pos ) )
+      {
+        const long pos_idx = getIndex( pos );
+        const size_t vec_size = neighbor( pos, nodes );
+        for( size_t it=0 ; it < vec_size ; ++it )
+        {
+          const long delta = long( getIndex( nodes[it].pos ) ) -pos_idx;
+          if( delta != 0 ) // Node itself, always visited
+            m_entries.push_back( Entry( delta, nodes[it].mult, nodes[it].pred ) );
+        }
+      }
+      m_offsets[b_class+1] = m_entries.size();
+    }
+
+    for( int code=0 ; code < 64 ; ++code )
+    {
+      NeighborhoodBase::IntBits pred_bit( code );
+      Coordinate step( 0,0,0 );
+      if( pred_bit[5] ) step[0] = 1;
+      else if( pred_bit[4] ) step[0] = -1;
+      if( pred_bit[3] ) step[1] = 1;
+      else if( pred_bit[2] ) step[1] = -1;
+      if( pred_bit[1] ) step[2] = 1;
+      else if( pred_bit[0] ) step[2] = -1;
+      m_pred_delta[code] = step[0] +long( m_shape[0] ) *step[1] +long( m_z_step ) *step[2];
+    }
+  }
+
+  inline size_t getIndex( const Coordinate& pos ) const
+  {
+    return m_z_step *pos[2] +size_t( m_shape[0] ) *pos[1] +pos[0];
+  }
+
+  inline Coordinate getCoordinate( const size_t& idx ) const
+  {
+    const size_t rem = idx %m_z_step;
+    return Coordinate( rem %m_shape[0], rem /m_shape[0], idx /m_z_step );
+  }
+
+  inline size_t getClass( const size_t& idx ) const
+  {
+    const size_t z = idx /m_z_step, rem = idx -z *m_z_step;
+    const size_t y = rem /m_shape[0], x = rem -y *m_shape[0];
+    return axisClass( x, 0 ) | ( axisClass( y, 1 ) << 2 ) | ( axisClass( z, 2 ) << 4 );
+  }
+
+  /// Neighbors of idx are [begin( idx ), end( idx ))
+  inline const Entry* begin( const size_t& idx ) const { return m_entries.data() +m_offsets[getClass( idx )]; }
+  inline const Entry* end( const size_t& idx ) const { return m_entries.data() +m_offsets[getClass( idx )+1]; }
+  inline const Entry* classBegin( const size_t& b_class ) const { return m_entries.data() +m_offsets[b_class]; }
+  inline const Entry* classEnd( const size_t& b_class ) const { return m_entries.data() +m_offsets[b_class+1]; }
+
+  /// Index of the predecessor encoded by a (positive) predecessor code
+  inline size_t predecessor( const size_t& idx, const int& pred_code ) const
+  {
+    return idx +m_pred_delta[pred_code & 63];
+  }
+
+  inline const Coordinate& getShape() const { return m_shape; }
+  inline size_t getSize() const { return m_z_step *m_shape[2]; }
+
+private:
+  inline size_t axisClass( const size_t& pos, const size_t& axis ) const
+  {
+    return size_t( pos == 0 ) | ( size_t( pos == size_t( m_shape[axis] -1 ) ) << 1 );
+  }
+
+  /// Representative position of a border class, false if the class does not occur in the volume
+  inline bool classPosition( const size_t& b_class, Coordinate& pos ) const
+  {
+    for( size_t axis=0 ; axis < 3 ; ++axis )
+    {
+      const bool low = ( b_class >> ( 2*axis ) ) & 1, high = ( b_class >> ( 2*axis+1 ) ) & 1;
+      const int size = m_shape[axis];
+      if( low && high ) { if( size != 1 ) return false; pos[axis] = 0; }
+      else if( low ) { if( size < 2 ) return false; pos[axis] = 0; }
+      else if( high ) { if( size < 2 ) return false; pos[axis] = size -1; }
+      else { if( size < 3 ) return false; pos[axis] = 1; }
+    }
+    return true;
+  }
+
+  Coordinate m_shape;
+  size_t m_z_step;
+  std::vector<Entry> m_entries;
+  std::array<size_t, 65> m_offsets;
+  std::array<long, 64> m_pred_delta;
+};
+
+}
+#endif // NEIGHBOR_TABLE_H__
@@ -55,6 +55,8 @@ public:
   typedef std::bitset<sizeof(int)*8> IntBits;
 
   NeighborhoodBase( const Coordinate& shape, const CoordinateF& mults, const size_t& max_size ) : m_shape( shape ), m_mults( mults ), m_max_size( max_size ) {};
+  /// Neighborhoods are owned and deleted through base pointers
+  virtual ~NeighborhoodBase() = default;
   virtual inline size_t operator()( const Coordinate& pos, NodeVector& out ) = 0;
   virtual inline Coordinate operator()( const Coordinate& pos, const int& pred_code ) const = 0;
   inline size_t getMaxSize() const { return m_max_size; }
@@ -70,7 +72,7 @@ public:
 
   inline utils::CoordinateD getVector( const int& pred ) const
   {
-    utils::CoordinateD vec;
+    utils::CoordinateD vec( 0.0,0.0,0.0 );
     vecFromBitSet( IntBits( pred ), vec );
     return vec;
   }
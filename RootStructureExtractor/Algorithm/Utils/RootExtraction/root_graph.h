@@ -46,42 +46,21 @@ struct RootNode
   }
 
   template<typename _Tp>
-  void fillVolume( VolumeBase<_Tp>& out, const std::vector<Volume>& spheres, const _Tp& val, const double& rrate ) const
+  void fillVolume( VolumeBase<_Tp>& out, const std::vector<SphereMaskPtr>& spheres, const _Tp& val, const double& rrate ) const
   {
     int radius = int( round( rad *rrate ) );
     const int min_it = pos.min() -radius;
-    const int max_it = (out.getShape() +(pos +radius).scale(-1)).min();
+    const int max_it = (out.getShape() +(pos +radius +1).scale(-1)).min();
     int border = std::min( min_it, max_it );
     if( border < 0 )
       radius += border;
+    if( radius < 0 )
+      return;
 
-    //std::cout << "shape: " << out.getShape() << ", other: " << (pos +radius).scale(-1) << std::endl;
     //std::cout << "Rad: " << rad << ", PosMin: " << pos.min() << ", PosMax: " << pos.max() << std::endl;
     //std::cout << "Min: " << min_it << ", Max: " << max_it << ", outmax: " << out.getShape()[pos.argmax()] << std::endl;
     //std::cout << "Pos: " << pos << ", Radius: " << radius << std::endl;
-    const size_t diameter = radius *2 +1;
-    const Volume& sphere = spheres[radius];
-    for( size_t z=0; z <= radius ; ++z )
-      for( size_t y=0; y <= radius ; ++y )
-        for( size_t x=0; x <= radius ; ++x )
-        {
-          if( sphere( x,y,z ) > 0.0 )
-          {
-            Coordinate anchor = Coordinate( pos[0]-radius,pos[1]-radius,pos[2]-radius );
-            const size_t c_x = diameter -x -1;
-            const size_t c_y = diameter -y -1;
-            const size_t c_z = diameter -z -1;
-            //std::cout << "rad:" << rad << ": " << anchor << "->" << x << "," << y << "," << z << " ; ";
-            fillOutput<_Tp>( out, anchor, Coordinate( x, y, z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( x, y, c_z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( x, c_y, z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( x, c_y, c_z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( c_x, y, z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( c_x, y, c_z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( c_x, c_y, z ), val );
-            fillOutput<_Tp>( out, anchor, Coordinate( c_x, c_y, c_z ), val );
-          }
-        }
+    spheres[radius]->fill( out, pos, val );
   }
 
   template<typename _Tp>
@@ -271,15 +250,7 @@ public:
   void fillVolume( Volume& out, const CoordinateD& dim_facs, const float& val=0.f, const double& rrate=1.0 ) const
   {
     //std::cout << "Entered" << std::endl;
-    float max_rad = getMaxRad();
-    std::vector<Volume> spheres;
-    spheres.reserve( max_rad+1 );
-    for( size_t r_it=0; r_it <= max_rad; ++r_it )
-    {
-      Volume sphere;
-      sphereMask( sphere, r_it, dim_facs );
-      spheres.push_back( std::move( sphere ) );
-    }
+    const std::vector<SphereMaskPtr> spheres = SphereMask::getRange( std::max( 0.0, round( getMaxRad() *rrate ) ), dim_facs );
     //std::cout << "Node it" << std::endl;
     fillVolumeNode( m_root, spheres, out, val, rrate );
   }
@@ -347,7 +318,7 @@ private:
     }
   }
 
-  void fillVolumeNode( const NodePtr& cur_node, const std::vector<Volume>& spheres,
+  void fillVolumeNode( const NodePtr& cur_node, const std::vector<SphereMaskPtr>& spheres,
                        Volume& out, const float& val=0.f, const double& rrate=1.0 ) const
   {
     cur_node->getVal().fillVolume<float>( out, spheres, val, rrate );
@@ -355,7 +326,7 @@ private:
       fillVolumeNode( cur_node->getChild(c_it), spheres, out, val, rrate );
   }
 
-  void fillVolumeWithPtr( const NodePtr& cur_node, const std::vector<Volume>& spheres,
+  void fillVolumeWithPtr( const NodePtr& cur_node, const std::vector<SphereMaskPtr>& spheres,
                           VolumeBase<void*>& out, const double& rrate=1.0 ) const
   {
     cur_node->getVal().fillVolume<void*>( out, spheres, reinterpret_cast<void*>( cur_node ), rrate );
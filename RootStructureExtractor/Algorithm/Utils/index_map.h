@@ -0,0 +1,120 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef INDEX_MAP_H__
+#define INDEX_MAP_H__
+
+#include <cstdint>
+#include <limits>
+#include <vector>
+
+namespace utils
+{
+
+/**
+ * Map from linear voxel indices to values, for sparse data over large volumes.
+ * Open addressing with linear probing in one array, the table doubles once half full.
+ * Entries cannot be removed, unset keys read as the default value.
+ */
+template<class _Tp>
+class IndexMap
+{
+public:
+  IndexMap( const size_t capacity=1024 ) : m_size( 0 )
+  {
+    size_t n_cap = 16;
+    while( n_cap < 2*capacity )
+      n_cap *= 2;
+    m_entries.assign( n_cap, Entry{ EMPTY, _Tp() } );
+    m_mask = n_cap -1;
+  }
+
+  inline size_t size() const { return m_size; }
+  inline size_t capacity() const { return m_entries.size(); }
+
+  /// Value at key, default if unset
+  inline _Tp get( const size_t key ) const
+  {
+    for( size_t slot=hash( key ) ; ; slot = ( slot+1 ) &m_mask )
+    {
+      const Entry& entry = m_entries[slot];
+      if( entry.key == key )
+        return entry.val;
+      if( entry.key == EMPTY )
+        return _Tp();
+    }
+  }
+
+  inline bool contains( const size_t key ) const
+  {
+    for( size_t slot=hash( key ) ; ; slot = ( slot+1 ) &m_mask )
+    {
+      if( m_entries[slot].key == key )
+        return true;
+      if( m_entries[slot].key == EMPTY )
+        return false;
+    }
+  }
+
+  /// Value at key, inserted as default if unset
+  inline _Tp& operator[]( const size_t key )
+  {
+    if( 2*( m_size+1 ) > m_entries.size() )
+      grow();
+    size_t slot = hash( key );
+    while( m_entries[slot].key != key && m_entries[slot].key != EMPTY )
+      slot = ( slot+1 ) &m_mask;
+    Entry& entry = m_entries[slot];
+    if( entry.key == EMPTY )
+    {
+      entry.key = key;
+      ++m_size;
+    }
+    return entry.val;
+  }
+
+  inline void clear()
+  {
+    m_entries.assign( m_entries.size(), Entry{ EMPTY, _Tp() } );
+    m_size = 0;
+  }
+
+private:
+  struct Entry
+  {
+    size_t key;
+    _Tp val;
+  };
+
+  static constexpr size_t EMPTY = std::numeric_limits<size_t>::max();
+
+  /// Fibonacci hashing, neighboring voxels end up in distant slots
+  inline size_t hash( const size_t key ) const
+  {
+    return size_t( ( uint64_t( key ) *11400714819323198485ull ) >> 32 ) &m_mask;
+  }
+
+  void grow()
+  {
+    std::vector<Entry> old_entries( 2*m_entries.size(), Entry{ EMPTY, _Tp() } );
+    old_entries.swap( m_entries );
+    m_mask = m_entries.size() -1;
+    for( const Entry& entry : old_entries )
+      if( entry.key != EMPTY )
+      {
+        size_t slot = hash( entry.key );
+        while( m_entries[slot].key != EMPTY )
+          slot = ( slot+1 ) &m_mask;
+        m_entries[slot] = entry;
+      }
+  }
+
+  std::vector<Entry> m_entries;
+  size_t m_mask, m_size;
+};
+
+}
+
+#endif // INDEX_MAP_H__
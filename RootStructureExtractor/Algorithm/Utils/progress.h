@@ -0,0 +1,134 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef PROGRESS_H__
+#define PROGRESS_H__
+
+#include <algorithm>
+#include <atomic>
+#include <cstdint>
+#include <iostream>
+#include <mutex>
+#include <stdexcept>
+
+namespace utils
+{
+
+/// Called with the name of the running step, finished and total work units
+typedef void (*ProgressCallback)( const char* step, int64_t done, int64_t total );
+
+/**
+ * Progress and cancellation shared with the caller of an extern "C" function,
+ * Python counterpart is ProgressHandle in c_progress.py.
+ * cancel is set by the caller from any thread while the function runs.
+ */
+struct ProgressHandle
+{
+  ProgressCallback callback;
+  int32_t cancel;
+};
+
+
+/// Thrown once the caller requested cancellation, caught at the extern "C" functions
+class Cancelled : public std::runtime_error
+{
+public:
+  Cancelled() : std::runtime_error( "Cancelled" ) {}
+
+  /// Returned by extern "C" functions with an int result when cancelled
+  static const int CODE = -2;
+};
+
+
+/**
+ * Progress of one step of a computation.
+ * Reports go to the callback of the handle, to std::cout if there is none and console is set,
+ * about every 1/1000 of the total. Cancellation is polled at least every 1024 work units.
+ */
+class Progress
+{
+public:
+  Progress( void* handle, const char* step, const int64_t total, const bool console=true )
+  : m_handle( reinterpret_cast<ProgressHandle*>( handle ) ),
+    m_step( step ),
+    m_console( console ),
+    m_total( std::max( total, int64_t( 1 ) ) ),
+    m_report_step( std::max( total/1000, int64_t( 1 ) ) ),
+    m_check_step( std::min( m_report_step, int64_t( 1024 ) ) ),
+    m_next_report( m_report_step ),
+    m_done( 0 )
+  {
+    report( 0 );
+  }
+
+  inline bool cancelled() const
+  {
+    return m_handle != nullptr && __atomic_load_n( &m_handle->cancel, __ATOMIC_RELAXED ) != 0;
+  }
+
+  /// Throws Cancelled if the caller requested cancellation
+  inline void check() const
+  {
+    if( cancelled() ) throw Cancelled();
+  }
+
+  /// Sets the finished work units of a single threaded loop, throws Cancelled if requested
+  inline void update( const int64_t done )
+  {
+    if( done < m_next_check )
+      return;
+    m_next_check = done +m_check_step;
+    check();
+    if( done >= m_next_report )
+    {
+      m_next_report = done +m_report_step;
+      report( done );
+    }
+  }
+
+  /**
+   * Adds finished work units from any thread.
+   * Exceptions must not leave worker threads, so returns false once cancelled instead of throwing.
+   */
+  inline bool add( const int64_t num=1 )
+  {
+    const int64_t done = m_done.fetch_add( num, std::memory_order_relaxed ) +num;
+    if( done /m_report_step != ( done -num ) /m_report_step )
+    {
+      std::lock_guard<std::mutex> lock( m_report_mutex );
+      report( std::min( done, m_total ) );
+    }
+    return !cancelled();
+  }
+
+  /// Reports the completed step
+  inline void finish()
+  {
+    report( m_total );
+    if( m_console && ( m_handle == nullptr || m_handle->callback == nullptr ) )
+      std::cout << std::endl;
+  }
+
+private:
+  inline void report( const int64_t done ) const
+  {
+    if( m_handle != nullptr && m_handle->callback != nullptr )
+      m_handle->callback( m_step, done, m_total );
+    else if( m_console )
+      std::cout << "\r" << m_step << ": " << done << "/" << m_total << std::flush;
+  }
+
+  ProgressHandle* m_handle;
+  const char* m_step;
+  bool m_console;
+  int64_t m_total, m_report_step, m_check_step;
+  int64_t m_next_report, m_next_check = 0;
+  std::atomic<int64_t> m_done;
+  std::mutex m_report_mutex;
+};
+
+}
+
+#endif // PROGRESS_H__
@@ -7,36 +7,124 @@
 #define SPHERE_MASK_H__
 
 #include "volume.h"
+#include <algorithm>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <tuple>
 
-inline void sphereMask( Volume& output, const size_t radius, const utils::CoordinateF& dim_facs )
+/**
+ * Voxels within radius of the center, voxel edges scaled by dim_facs.
+ * Stored as runs along x relative to the center, masks are convex so every row holds one run.
+ * Masks are built once per radius, scale and dimension and shared through get.
+ */
+class SphereMask
 {
-  size_t diameter = radius *2 +1;
-  if( diameter == 0 )
+public:
+  struct Span
+  {
+    int y, z, x_min, x_max; // Max exclusive
+  };
+
+  /// dim=2 only keeps the z=0 plane, the circle mask
+  SphereMask( const size_t radius, const utils::CoordinateF& dim_facs, const size_t dim=3 )
+  : m_radius( radius ), m_size( 0 )
+  {
+    const int rad = radius, z_rad = dim == 2 ? 0 : rad;
+    const double sqrd_rad = std::pow( radius, 2 );
+    const utils::Coordinate center( 0,0,0 );
+    for( int z=-z_rad; z <= z_rad ; ++z )
+      for( int y=-rad; y <= rad ; ++y )
+      {
+        int x = 0;
+        while( x <= rad && center.getSqrdDistance( utils::Coordinate( x,y,z ), dim_facs ) <= sqrd_rad )
+          ++x;
+        if( x == 0 )
+          continue;
+        m_spans.push_back( Span{ y, z, 1-x, x } );
+        m_size += 2*x -1;
+      }
+  }
+
+  inline size_t getRadius() const { return m_radius; }
+  /// Number of voxels
+  inline size_t size() const { return m_size; }
+  inline const std::vector<Span>& getSpans() const { return m_spans; }
+
+  /// Whether the offset from the center is part of the mask
+  inline bool contains( const utils::Coordinate& offset ) const
+  {
+    auto it = std::lower_bound( m_spans.begin(), m_spans.end(), offset,
+                                []( const Span& span, const utils::Coordinate& off )
+                                { return span.z < off[2] || ( span.z == off[2] && span.y < off[1] ); } );
+    return it != m_spans.end() && it->z == offset[2] && it->y == offset[1]
+           && offset[0] >= it->x_min && offset[0] < it->x_max;
+  }
+
+  /// Calls func( offset ) for every voxel of the mask
+  template<class _Func>
+  inline void forEach( _Func func ) const
+  {
+    for( const Span& span : m_spans )
+      for( int x=span.x_min; x < span.x_max ; ++x )
+        func( utils::Coordinate( x, span.y, span.z ) );
+  }
+
+  /// Writes val to the mask around center, which has to lie within the volume
+  template<typename _Tp>
+  inline void fill( VolumeBase<_Tp>& vol, const utils::Coordinate& center, const _Tp& val ) const
+  {
+    for( const Span& span : m_spans )
+      std::fill_n( &vol( center[0] +span.x_min, center[1] +span.y, center[2] +span.z ), span.x_max -span.x_min, val );
+  }
+
+  /**
+   * Calls func( begin, length ) for every run of the mask around center, clipped to a volume of shape.
+   * begin is the linear index of the first voxel of the run, so runs can be written contiguously.
+   */
+  template<class _Func>
+  inline void forEachRun( const utils::Coordinate& center, const utils::Coordinate& shape, _Func func ) const
+  {
+    for( const Span& span : m_spans )
+    {
+      const int y = center[1] +span.y, z = center[2] +span.z;
+      if( y < 0 || y >= shape[1] || z < 0 || z >= shape[2] )
+        continue;
+      const int x_min = std::max( center[0] +span.x_min, 0 ), x_max = std::min( center[0] +span.x_max, shape[0] );
+      if( x_min < x_max )
+        func( ( size_t( z ) *shape[1] +y ) *shape[0] +x_min, size_t( x_max -x_min ) );
+    }
+  }
+
+  /// Cached mask, built on first request
+  static std::shared_ptr<const SphereMask> get( const size_t radius, const utils::CoordinateF& dim_facs, const size_t dim=3 )
+  {
+    static std::mutex lock;
+    static std::map<std::tuple<size_t, float, float, float, size_t>, std::shared_ptr<const SphereMask>> cache;
+    const auto key = std::make_tuple( radius, dim_facs[0], dim_facs[1], dim_facs[2], dim );
+    std::lock_guard<std::mutex> guard( lock );
+    std::shared_ptr<const SphereMask>& mask = cache[key];
+    if( !mask )
+      mask = std::make_shared<const SphereMask>( radius, dim_facs, dim );
+    return mask;
+  }
+
+  /// Cached masks of radius 0 to max_radius
+  static std::vector<std::shared_ptr<const SphereMask>> getRange( const size_t max_radius, const utils::CoordinateF& dim_facs,
+                                                                  const size_t dim=3 )
   {
-    output = std::move( Volume( 1,1,1 ) );
-    output( 0,0,0 ) = 1;
-    return;
+    std::vector<std::shared_ptr<const SphereMask>> masks;
+    masks.reserve( max_radius +1 );
+    for( size_t r_it=0; r_it <= max_radius ; ++r_it )
+      masks.push_back( get( r_it, dim_facs, dim ) );
+    return masks;
   }
-  output = std::move( Volume( diameter, diameter, diameter ) );
-  const utils::Coordinate center( radius, radius, radius );
-  const double sqrd_rad = std::pow( radius, 2 );
-  for( size_t x_it=0; x_it < radius +1; ++x_it )
-    for( size_t y_it=0; y_it < radius +1; ++y_it )
-      for( size_t z_it=0; z_it < radius +1; ++z_it )
-        if( center.getSqrdDistance( utils::Coordinate( x_it, y_it, z_it ), dim_facs ) <= sqrd_rad )
-        {
-          const size_t c_x = diameter -x_it -1;
-          const size_t c_y = diameter -y_it -1;
-          const size_t c_z = diameter -z_it -1;
-          output( x_it, y_it, z_it ) = 1.0;
-          output( x_it, y_it, c_z ) = 1.0;
-          output( x_it, c_y, z_it ) = 1.0;
-          output( x_it, c_y, c_z ) = 1.0;
-          output( c_x, y_it, z_it ) = 1.0;
-          output( c_x, y_it, c_z ) = 1.0;
-          output( c_x, c_y, z_it ) = 1.0;
-          output( c_x, c_y, c_z ) = 1.0;
-        }
-}
+
+private:
+  size_t m_radius, m_size;
+  std::vector<Span> m_spans;
+};
+
+typedef std::shared_ptr<const SphereMask> SphereMaskPtr;
 
 #endif // SPHERE_MASK_H__
@@ -0,0 +1,157 @@
+/*Copyright (C) 2019 Jannis Horn - All Rights Reserved
+ *You may use, distribute and modify this code under the
+ *terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+ */
+
+#ifndef TILE_SCHEDULER_H__
+#define TILE_SCHEDULER_H__
+
+#include "utils.h"
+#include <atomic>
+#include <cstdint>
+#include <memory>
+#include <thread>
+#include <vector>
+
+namespace utils
+{
+
+/// Part [mins, maxs) of a volume
+struct Tile
+{
+  Coordinate mins, maxs;
+};
+
+
+/**
+ * Runs a function over the tiles of a volume on a pool of threads.
+ * Tiles are numbered x fastest, then y, then z. Each thread owns a contiguous range of tiles
+ * and works it front to back. A thread out of tiles steals the back half of the largest other range,
+ * so uneven work per tile is balanced without a shared queue.
+ */
+class TileScheduler
+{
+public:
+  /// num_threads < 1 uses all hardware threads, tile_shape is clipped to the volume
+  TileScheduler( const Coordinate& shape, const Coordinate& tile_shape, const int num_threads=0 )
+  : m_shape( shape )
+  {
+    for( size_t it=0; it < 3 ; ++it )
+    {
+      m_tile_shape[it] = std::max( 1, std::min( tile_shape[it], shape[it] ) );
+      m_num_per_axis[it] = ( shape[it] +m_tile_shape[it] -1 ) /m_tile_shape[it];
+    }
+    m_num_tiles = size_t( m_num_per_axis[0] ) *m_num_per_axis[1] *m_num_per_axis[2];
+    m_num_threads = std::max( size_t( 1 ), std::min( threadCount( num_threads ), m_num_tiles ) );
+    m_ranges.reset( new std::atomic<uint64_t>[m_num_threads] );
+  }
+
+  /// Threads used for a requested number, all hardware threads if below 1
+  static inline size_t threadCount( const int num_threads )
+  {
+    if( num_threads > 0 )
+      return num_threads;
+    return std::max( 1u, std::thread::hardware_concurrency() );
+  }
+
+  inline size_t numThreads() const { return m_num_threads; }
+  inline size_t numTiles() const { return m_num_tiles; }
+
+  inline Tile getTile( const size_t it ) const
+  {
+    const Coordinate pos( it %m_num_per_axis[0], ( it /m_num_per_axis[0] ) %m_num_per_axis[1],
+                          it /( size_t( m_num_per_axis[0] ) *m_num_per_axis[1] ) );
+    Tile tile;
+    for( size_t ax=0; ax < 3 ; ++ax )
+    {
+      tile.mins[ax] = pos[ax] *m_tile_shape[ax];
+      tile.maxs[ax] = std::min( tile.mins[ax] +m_tile_shape[ax], m_shape[ax] );
+    }
+    return tile;
+  }
+
+  /**
+   * Calls func( tile, thread_id ) for every tile, thread_id < numThreads().
+   * Tiles of one thread follow each other as long as it does not steal.
+   * A thread stops taking tiles once func returns false.
+   */
+  template<class _Func>
+  void run( _Func func )
+  {
+    for( size_t t_it=0; t_it < m_num_threads ; ++t_it )
+      m_ranges[t_it] = pack( t_it *m_num_tiles /m_num_threads, ( t_it+1 ) *m_num_tiles /m_num_threads );
+    auto worker = [this, &func]( const size_t t_id )
+    {
+      size_t tile;
+      while( next( t_id, tile ) )
+        if( !func( getTile( tile ), t_id ) )
+          return;
+    };
+    std::vector<std::thread> threads;
+    for( size_t t_it=1; t_it < m_num_threads ; ++t_it )
+      threads.push_back( std::thread( worker, t_it ) );
+    worker( 0 );
+    for( size_t t_it=0; t_it < threads.size() ; ++t_it )
+      threads[t_it].join();
+  }
+
+private:
+  // Ranges [begin, end) are packed into one word, so owner and thieves agree by compare and swap
+  static inline uint64_t pack( const uint64_t begin, const uint64_t end ) { return ( begin << 32 ) | end; }
+  static inline size_t begin( const uint64_t range ) { return range >> 32; }
+  static inline size_t end( const uint64_t range ) { return range & 0xffffffff; }
+
+  bool next( const size_t t_id, size_t& tile )
+  {
+    while( true )
+    {
+      uint64_t range = m_ranges[t_id].load();
+      while( begin( range ) < end( range ) )
+        if( m_ranges[t_id].compare_exchange_weak( range, pack( begin( range ) +1, end( range ) ) ) )
+        {
+          tile = begin( range );
+          return true;
+        }
+      if( !steal( t_id ) )
+        return false;
+    }
+  }
+
+  /// Moves the back half of the largest other range to the empty range of t_id
+  bool steal( const size_t t_id )
+  {
+    while( true )
+    {
+      size_t victim = t_id, max_size = 0;
+      for( size_t t_it=0; t_it < m_num_threads ; ++t_it )
+      {
+        const uint64_t range = m_ranges[t_it].load();
+        if( t_it != t_id && begin( range ) < end( range ) && end( range ) -begin( range ) > max_size )
+        {
+          victim = t_it;
+          max_size = end( range ) -begin( range );
+        }
+      }
+      if( victim == t_id )
+        return false;
+      uint64_t range = m_ranges[victim].load();
+      if( begin( range ) >= end( range ) )
+        continue;
+      const size_t split = end( range ) -( end( range ) -begin( range ) +1 ) /2;
+      if( m_ranges[victim].compare_exchange_strong( range, pack( begin( range ), split ) ) )
+      {
+        // Nobody else writes an empty range
+        m_ranges[t_id] = pack( split, end( range ) );
+        return true;
+      }
+    }
+  }
+
+  Coordinate m_shape, m_tile_shape, m_num_per_axis;
+  size_t m_num_tiles, m_num_threads;
+  std::unique_ptr<std::atomic<uint64_t>[]> m_ranges;
+};
+
+}
+
+#endif // TILE_SCHEDULER_H__
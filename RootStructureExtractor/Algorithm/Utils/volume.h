@@ -9,6 +9,7 @@
 
 #include <vector>
 #include <cstring>
+#include <cstdint>
 #include <sstream>
 #include <mutex>
 #include <memory>
@@ -251,12 +252,12 @@ public:
     return m_z_step *z +m_shape[0] *y +x;
   }
 
-  inline utils::Coordinate fromIndex( const size_t& idx )
+  inline utils::Coordinate fromIndex( const size_t& idx ) const
   {
     int z = idx /m_z_step;
     int rem = idx %m_z_step;
-    int y = rem /m_shape[1];
-    int x = rem %m_shape[1];
+    int y = rem /m_shape[0];
+    int x = rem %m_shape[0];
     return utils::Coordinate( x,y,z );
   }
 
@@ -299,6 +300,7 @@ private:
 typedef VolumeBase<float> Volume;
 typedef VolumeBase<double> VolumeD;
 typedef VolumeBase<int> VolumeI;
+typedef VolumeBase<int8_t> VolumeI8;
 typedef VolumeBase<utils::CoordinateD> Volume3D;
 
 template<class _Tp> void voidPtrToVolume( const void* input, const utils::Coordinate& shape, VolumeBase<_Tp>& output )
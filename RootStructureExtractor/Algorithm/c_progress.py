@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2019 Jannis Horn - All Rights Reserved
+You may use, distribute and modify this code under the
+terms of the GNU GENERAL PUBLIC LICENSE Version 3.
+"""
+
+import ctypes
+import threading
+
+ProgressCallback = ctypes.CFUNCTYPE( None, ctypes.c_char_p, ctypes.c_int64, ctypes.c_int64 )
+
+
+class ProgressHandle( ctypes.Structure ):
+    """
+    Mirrors utils::ProgressHandle of Utils/progress.h
+    """
+    _fields_ = [( "callback", ProgressCallback ),
+                ( "cancel", ctypes.c_int32 )]
+
+
+class CancelledError( RuntimeError ):
+    """
+    Raised by the c++ library wrappers after a call was cancelled
+    """
+    pass
+
+
+__active = threading.local()
+
+
+class Progress:
+    """
+    Progress report and cooperative cancellation of the c++ libraries.
+    Entered as context manager, all library calls of the current thread report to it.
+    cancel() can be called from any thread and aborts the running call within milliseconds.
+    """
+    def __init__( self, callback=None ):
+        """
+        :param callback: function( step, done, total ), called from the running library call. None prints to stdout
+        """
+        self.handle = ProgressHandle()
+        self.setCallback( callback )
+        self.__outer = []
+
+    def setCallback( self, callback ):
+        """
+        :param callback: function( step, done, total ) or None
+        """
+        self.callback = callback
+        if callback is None:
+            self.__c_callback = ProgressCallback()
+        else:
+            self.__c_callback = ProgressCallback( lambda step, done, total: callback( step.decode( "utf-8" ), done, total ) )
+        self.handle.callback = self.__c_callback
+
+    def cancel( self ):
+        self.handle.cancel = 1
+
+    def reset( self ):
+        self.handle.cancel = 0
+
+    def isCancelled( self ):
+        return self.handle.cancel != 0
+
+    def __enter__( self ):
+        self.__outer.append( getActive() )
+        setActive( self )
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        setActive( self.__outer.pop() )
+        return False
+
+
+def getActive():
+    """
+    :return: Progress entered in the current thread or None
+    """
+    return getattr( __active, "progress", None )
+
+
+def setActive( progress ):
+    __active.progress = progress
+
+
+def getHandle():
+    """
+    Progress argument for the library calls.
+
+    :return: pointer to the handle of the active progress or None
+    """
+    progress = getActive()
+    if progress is None:
+        return None
+    return ctypes.cast( ctypes.pointer( progress.handle ), ctypes.c_void_p )
+
+
+def checkCancelled():
+    """
+    Raises CancelledError if the active progress was cancelled, called after each library call
+    """
+    progress = getActive()
+    if progress is not None and progress.isCancelled():
+        raise( CancelledError( "Cancelled" ) )
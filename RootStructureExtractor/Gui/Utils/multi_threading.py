@@ -10,10 +10,12 @@ from PyQt5.QtCore import QObject, pyqtSignal
 import threading
 import _thread
 import ctypes
+import c_progress
 
 class Algorithm( threading.Thread ):
     def __init__( self ):
         super().__init__()
+        self.progress = c_progress.Progress()
         
     def setFunction( self, func, *args ):
         self.func = func
@@ -22,8 +24,11 @@ class Algorithm( threading.Thread ):
     def run( self ):
         try:
             self.startedCallback()
-            if len( self.args ) == 0: self.func()
-            else: self.func( self.args ) 
+            with self.progress:
+                if len( self.args ) == 0: self.func()
+                else: self.func( self.args ) 
+        except c_progress.CancelledError:
+            print( "Execution cancelled" )
         except IOError as e:
             raise e
         finally:
@@ -32,6 +37,8 @@ class Algorithm( threading.Thread ):
     
     def raiseException( self ):
         #_thread.exit()
+        # Running c++ calls poll the cancel flag, the exception only interrupts python code
+        self.progress.cancel()
         thread_id = threading.get_ident()
         #res = ctypes.pythonapi.PyThreadState_SetAsyncExc( thread_id, ctypes.py_object(SystemExit) )
         #if res > 1: 
@@ -254,7 +254,8 @@ class REGui( qtw.QMainWindow ):
     def eventFindStPt( self ):
         print("Find st_pt")
         depth = self.data.cfg.st_pt[0]
-        x,y = self.data.findStartPoint( depth )
+        # Thickest section within a few slices below the set depth
+        depth,x,y = self.data.findStartPoint( depth, 8 )
         print("x:{}, y:{}".format(x,y))
         self.st_pt.setValue( (depth, x, y) )
     
@@ -7,7 +7,7 @@ terms of the GNU GENERAL PUBLIC LICENSE Version 3.
 """
 
 import numpy as np
-from CostFuncs import applyCircleCost
+from CostFuncs import applyCircleCostBatch
 import skeletonization as skeletor
 import volume_extraction as vol_extr
 import file_handler as fh
@@ -247,16 +247,23 @@ class DataWrapper:
             
     #TODO add min_int to datacontroller
     #Heuristic find upper bound by upper noise 
-    def findStartPoint( self, depth ):
+    def findStartPoint( self, depth, num_slices=1 ):
+        """
+        Position of the largest fitted circle within slices depth to depth+num_slices
+
+        :param depth: Int, first slice searched
+        :param num_slices: Int, number of slices searched
+        :return: 3-tuple, depth, x, y of the start point
+        """
         max_rad = int(np.ceil(max( self.data.input.shape[1], self.data.input.shape[2] ) /10))
-        print( "Depth:{}".format(depth) )
-        cut = applyCircleCost( self.data.input[depth,:,:], 0.5, 0.75, max_rad, self.cfg.dim_mults )
+        print( "Depth:{}-{}".format( depth, depth +num_slices ) )
+        cut = applyCircleCostBatch( self.data.input[depth:depth+num_slices,:,:], 0.5, 0.75, max_rad, self.cfg.dim_mults )
         #print(cut)
         #cut = c_rad#[depth,:,:]
         #np.savez("/home/jhorn/links/root_extraction/Data/cut.npz", cut)
         #np.savez("/home/jhorn/links/root_extraction/Data/real.npz", self.data.input[depth,:,:])
         st_pt = np.unravel_index( np.argmax(cut), cut.shape )
-        return st_pt[0], st_pt[1]
+        return depth +st_pt[0], st_pt[1], st_pt[2]
     
     
     def extractVolume( self, force_re=False ):
@@ -81,6 +81,8 @@ def runExtractionAndEvaluate( dt_pt, ranges ):
     
     data = data_wrapper.DataWrapper()
     data.load( dt_pt.path )
+    # Runs only change parameters after the shortest path, or raise its cutoff
+    data.extr.keep_search = True
     cutoff = data.extr.cfg.sh_pt_cutoff 
     glength = data.extr.cfg.gap_length
     dil = data.skel.cfg.dil_sum
@@ -102,7 +104,8 @@ def runExtractionAndEvaluate( dt_pt, ranges ):
     #runner( data, cutoff, glength, dil, 1 )
     #output( it, c_runs )
     #it += 1
-    for ct in ct_range:
+    # Increasing cutoffs continue the previous shortest path
+    for ct in sorted( ct_range ):
         runner( data, cutoff *ct, glength, dil, n_it )
         output( it, c_runs )
         it += 1
@@ -134,21 +134,12 @@ class Skeletonization:
         return skel
     
     def getRadius( self, inp, occ ):
-        radius = cf.applySphereCost( inp, 0.5, occ, 50, self.dim_mults, 2 )
-        ext_rad = cf.applyRadiusCost( radius, self.cfg.mask_size, 2 )
-        ext_rad_pr = ext_rad +np.where( inp > 0.5, 5.0, 0.0 )
-        ext_rad_norm = ext_rad_pr /ext_rad_pr.max()
-        return radius, ext_rad_norm
+        radius = cf.applySphereCost( inp, 0.5, occ, 50, self.dim_mults, method="edt" )
+        ext_rad = cf.applyRadiusCost( radius, self.cfg.mask_size )
+        return radius, ext_rad
     
-    def costFunction( self, rad_cost ):
-        offsets = np.where( rad_cost > 0.0, 0.0, self.cost_cutoff )
-        cost = rad_cost *-1
-        #self.cost -= np.where( self.inp > 0.5, 0.01, 0.0 )
-        #self.cost /= self.cost.max()
-        cost += 1
-        cost += offsets
-        cost = cost.astype( np.float32 )
-        return cost
+    def costFunction( self, inp, ext_rad ):
+        return cf.applySkeletonCost( inp, ext_rad, 0.5, 5.0, self.cost_cutoff )
     
     def paramCall( self, idd, dil_sum, st_pos ):
         self.cfg.idd = idd
@@ -167,10 +158,10 @@ class Skeletonization:
         #self.inp = binary_closing( self.inp, iterations = 6 )
         self.dim_mults = dim_mults
         print( "Got Cost Function" )
-        self.radius = cf.applySphereCost(inp, 0.5, 0.75, 50, self.dim_mults, 2)
-        _, self.rad_cost = self.getRadius(self.inp, 0.99 )
+        self.radius = cf.applySphereCost(inp, 0.5, 0.75, 50, self.dim_mults, method="edt")
+        _, ext_rad = self.getRadius(self.inp, 0.99 )
         print( "Got Cmb" )
-        self.cost = self.costFunction( self.rad_cost )
+        self.cost = self.costFunction( self.inp, ext_rad )
         self.cmb_arr = gp.skeletonization( self.cost *-1 )#self.radius)
         if self.cfg.use_old_graph:
             if self.old_graph is None:
@@ -182,7 +173,8 @@ class Skeletonization:
         else:
             graph_ptr = 0
         print( "Got full Cost" )
-        self.cost_1, cost_2, pred_1, pred_2 = sp.shortestPathDirPenalty( self.cost, self.radius, st_pos, self.cfg.idd, self.cost_cutoff, self.dim_mults, 2.0 )
+        self.cost_1, _, pred_1, _ = sp.shortestPathDirPenalty( self.cost, self.radius, st_pos, self.cfg.idd, self.cost_cutoff, self.dim_mults, 2.0,
+                                                               second_best=False )
         print("Got Paths")
         #self.ext_rad = cf.applySphereCost( self.inp, 0.5, 0.75, 50, self.dim_mults, 2 )
         graph_ptr,_ = eg.extractSkeleton( self.cmb_arr, self.radius, pred_1, st_pos, self.dim_mults, 20, self.cfg.dil_sum,
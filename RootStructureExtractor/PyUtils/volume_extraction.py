@@ -10,6 +10,7 @@ import numpy as np
 import CostFuncs as cf
 import ShortestPath as sp
 import ExtractGraph as eg
+import c_progress
 
 class VolumeExtraction:
     """ Wrapper handling parameter and execution for volume extraction """
@@ -79,6 +80,10 @@ class VolumeExtraction:
     def __init__( self ):
         self.cfg = self.Config()
         self.temp_graph = "/temp_graph.xml"
+        self.path_search = None
+        self.path_key = None
+        # Keep the shortest path search over freeIntermidiateData, so raising the cutoff continues it
+        self.keep_search = False
         self.default()
         
     def default( self ):
@@ -93,6 +98,7 @@ class VolumeExtraction:
         self.pred_1 = None
         self.pred_2 = None
         self.gap_map = None
+        self.settled = None
         
     def freeIntermidiateData( self ):
         del self.sphere_cost
@@ -102,6 +108,10 @@ class VolumeExtraction:
         del self.pred_1
         del self.pred_2
         del self.gap_map
+        del self.settled
+        if not self.keep_search:
+            self.path_search = None
+            self.path_key = None
         self.default()
         
         
@@ -128,29 +138,40 @@ class VolumeExtraction:
             
             
         
+    def shortestPath( self, st_pt, dim_mults ):
+        """
+        Shortest path on self.cost up to the configured cutoff.
+        Continues the previous search if only the cutoff was raised. It is kept over freeIntermidiateData if keep_search is set.
+        A cancelled search is dropped, the next call searches again.
+
+        :param st_pt: 3-tuple, starting position
+        :param dim_mults: 3-tuple, ratio of voxel edge-length
+        :return: Cost/Predecessor map for 1st and 2nd shortest path, indices of the reached voxels in settle order
+        """
+        key = ( self.cfg.sh_pt_idd, tuple( np.ravel( st_pt ) ), tuple( np.ravel( dim_mults ) ) )
+        search = self.path_search
+        if( search is None or self.path_key != key or self.cfg.sh_pt_cutoff < search.cost_cutoff
+            or not np.array_equal( search.inp_arr, self.cost ) ):
+            self.path_search, self.path_key = None, None
+            self.path_search = sp.ShortestPathSearch( self.cost, st_pt, self.cfg.sh_pt_idd, self.cfg.sh_pt_cutoff,
+                                                      dim_mults, second_best=False, record_settled=True )
+            self.path_key = key
+        elif self.cfg.sh_pt_cutoff > search.cost_cutoff:
+            print( "Continuing shortest path from cutoff {0}".format( search.cost_cutoff ) )
+            try:
+                search.continueTo( self.cfg.sh_pt_cutoff )
+            except c_progress.CancelledError:
+                self.path_search, self.path_key = None, None
+                raise
+        return self.path_search.getMaps() +( self.path_search.getSettled(), )
+
+
     def costFunction( self, inp_arr, rad_arr, gap_diff ):
         print( "Gap diff for cost func: {0}".format(gap_diff) )
-        inp_arr /= inp_arr.max()
-        rad_arr /= rad_arr.max()
-        i_r_weight = self.cfg.cost_w_rad
-        cost_arr = inp_arr +i_r_weight *rad_arr
-                
-        cost_arr /= cost_arr.max()
-        cost_arr -= 1
-        cost_arr *= -1
-        
-        cost_arr += self.cfg.cost_off
-        cost_arr /= cost_arr.max()
-        
         gap_diff = 1- gap_diff
+        cost_arr = cf.applyExtractionCost( inp_arr, rad_arr, self.cfg.cost_w_rad, self.cfg.cost_off, max( gap_diff, 0.0 ) )
         if( gap_diff > 0.0 ):
-            cost_arr = np.where( cost_arr < gap_diff, cost_arr, cost_arr *10 )
-            #cost_arr /= cost_arr.max()
             print( "Cost arr: {0} < {1}".format( cost_arr.min(), cost_arr.max() ) )
-        
-        #TODO REMOVE TEST
-        #cost_off = np.where( cost_arr > 0.9, 5,1 )
-        #cost_arr *= cost_off
         return cost_arr
     
     
@@ -163,7 +184,7 @@ class VolumeExtraction:
             self.recom_sphere = True
         if( self.recom_sphere ):
             #print(self.sphere_cost.shape)
-            self.sphere_cost = cf.applySphereCost( inp_arr, self.cfg.sh_pt_min_int, self.cfg.sphere_occ, self.cfg.sphere_rad, dim_mults, 2 )
+            self.sphere_cost = cf.applySphereCost( inp_arr, self.cfg.sh_pt_min_int, self.cfg.sphere_occ, self.cfg.sphere_rad, dim_mults, method="edt" )
             print( "Got spheres" )
             self.recom_sphere = False
             self.recom_cost = True
@@ -176,13 +197,13 @@ class VolumeExtraction:
             self.recom_path = True
         if( self.recom_vol ):
             if not self.cfg.gap_closing:
-                self.cost_1, self.cost_2, self.pred_1, self.pred_2 = sp.shortestPath( self.cost, st_pt, self.cfg.sh_pt_idd,
-                                                                                      self.cfg.sh_pt_cutoff, dim_mults )
+                self.cost_1, self.cost_2, self.pred_1, self.pred_2, self.settled = self.shortestPath( st_pt, dim_mults )
             else:
                 off_per = self.cfg.cost_off /self.cost.max()
                 act_per = 1-( off_per +self.cfg.sh_pt_min_int *(1-off_per) )
-                self.cost_1, self.cost_2, self.pred_1, self.pred_2, self.gap_map = sp.shortestPathGapClosing( self.cost, st_pt, self.cfg.sh_pt_idd, self.cfg.sh_pt_cutoff,
-                                                                                                              dim_mults, act_per, self.cfg.gap_length )
+                self.cost_1, self.cost_2, self.pred_1, self.pred_2, self.gap_map, self.settled = sp.shortestPathGapClosing( self.cost, st_pt, self.cfg.sh_pt_idd, self.cfg.sh_pt_cutoff,
+                                                                                                                            dim_mults, act_per, self.cfg.gap_length,
+                                                                                                                            second_best=False, return_settled=True )
                 
                 #path = "/home/jhorn/Documents/Work/DataGeneration/plant-root-MRI-display/root_extraction/"
                 #np.save( path +"gap_map.npy", self.gap_map )
@@ -192,12 +213,13 @@ class VolumeExtraction:
         if( self.recom_vol ):
             if( not self.cfg.fill_graph ):
                 cost_mask = np.where( self.cost_1 <= self.cfg.sh_pt_cutoff, 1, 0 )
-                self.volume = cost_mask *np.where( inp_arr > self.cfg.sh_pt_min_int, 1, 0 )
+                self.volume = cost_mask *np.where( inp_arr /inp_arr.max() > self.cfg.sh_pt_min_int, 1, 0 )
             else:
-                where_arr = np.where( inp_arr > self.cfg.sh_pt_min_int, 1.0, 0 )
+                where_arr = np.where( inp_arr /inp_arr.max() > self.cfg.sh_pt_min_int, 1.0, 0 )
                 where_arr = where_arr.astype( np.float32 )
                 _, self.volume = eg.extractGraph( where_arr, self.cost_1, self.cost_2, self.pred_1, self.pred_2,
-                                                  st_pt, self.cfg.sh_pt_min_int, self.cfg.sh_pt_cutoff +self.cfg.gap_length*1000, False, self.temp_graph )
+                                                  st_pt, self.cfg.sh_pt_min_int, self.cfg.sh_pt_cutoff +self.cfg.gap_length*1000, False, self.temp_graph,
+                                                  settled=self.settled )
                 #np.save( path +"neg_extr.npy", np.where( self.volume -inp_arr > 0, 1, 0 ) )
 
         print( self.sphere_cost.shape )